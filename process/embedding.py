@@ -0,0 +1,318 @@
+"""
+Compact embedding of Plotly figures in generated reports.
+
+Instead of one self-contained HTML fragment per chart, every figure is written as a JSON
+payload in which numeric arrays are base64-encoded typed arrays. Arrays and layout
+templates are stored once in a report-level pool and referenced from the payloads, so
+charts built from the same dataset do not repeat it. A single Plotly runtime, loaded
+from the CDN or inlined for offline use, renders all payloads, either at page load or
+lazily as each chart scrolls into view. Static reports replace every chart with its
+exported image, for mail clients and chat previews that cannot run JavaScript.
+"""
+
+import base64
+import hashlib
+import html
+import io
+import json
+import logging
+import mimetypes
+import os
+
+import numpy as np
+import plotly.offline as po
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+EMBED_MODES = ['cdn', 'shared', 'inline', 'static']
+
+STATIC_IMAGE_FORMATS = ['png', 'webp']
+
+# Arrays shorter than this are left inline, where a reference would not save anything
+MIN_POOLED_ARRAY_LENGTH = 8
+
+POOL_ELEMENT_ID = 'plotly-data-pool'
+
+
+def plotly_runtime_tag(inline=False, defer=False):
+    """
+    Returns the script tag loading the Plotly runtime the figures were built for.
+
+    Args:
+        inline (bool): Embed the minified runtime in the page so the report works offline.
+        defer (bool): Download the runtime without blocking page parsing. Only applies to the CDN runtime.
+    """
+    if inline:
+        return f'<script type="text/javascript">{po.get_plotlyjs()}</script>'
+    defer_attribute = ' defer' if defer else ''
+    return f'<script src="https://cdn.plot.ly/plotly-{po.get_plotlyjs_version()}.min.js"{defer_attribute}></script>'
+
+
+def json_script_text(payload):
+    # '</' would end the script element early, JSON allows it to be written as '<\/'
+    return json.dumps(payload, separators=(',', ':')).replace('</', '<\\/')
+
+
+def json_script_tag(payload, attributes=''):
+    return f'<script type="application/json" {attributes}>{json_script_text(payload)}</script>'
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _typed_array(values):
+    """
+    Converts a list (or a rectangular list of lists) of numbers into a Plotly typed
+    array spec, or returns None if the values are not purely numeric.
+    """
+    rows = values if values and isinstance(values[0], list) else None
+    if rows is not None:
+        if any(not isinstance(row, list) or len(row) != len(rows[0]) for row in rows):
+            return None
+        flat = [item for row in rows for item in row]
+    else:
+        flat = values
+
+    if not all(item is None or _is_number(item) for item in flat):
+        return None
+
+    if flat and all(isinstance(item, int) for item in flat) and -2**31 <= min(flat) and max(flat) < 2**31:
+        dtype = 'i4'
+        array = np.asarray(values, dtype='<i4')
+    else:
+        dtype = 'f8'
+        array = np.asarray([np.nan if item is None else item for item in flat], dtype='<f8')
+        if rows is not None:
+            array = array.reshape(len(rows), len(rows[0]))
+
+    spec = {'dtype': dtype, 'bdata': base64.b64encode(array.tobytes()).decode('ascii')}
+    if array.ndim > 1:
+        spec['shape'] = ','.join(str(dim) for dim in array.shape)
+    return spec
+
+
+class FigurePool:
+    """
+    Report-level store of the arrays and layout templates shared by figure payloads.
+    """
+
+    def __init__(self):
+        self.entries = {}
+
+    def _add(self, value):
+        key = hashlib.sha1(json.dumps(value, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()[:16]
+        self.entries.setdefault(key, value)
+        return {'$ref': key}
+
+    def _encode_value(self, value):
+        if isinstance(value, dict):
+            return {key: self._encode_value(item) for key, item in value.items()}
+
+        if isinstance(value, list):
+            if len(value) >= MIN_POOLED_ARRAY_LENGTH:
+                spec = _typed_array(value)
+                if spec is not None:
+                    return self._add(spec)
+                if all(isinstance(item, str) for item in value):
+                    return self._add(value)
+            return [self._encode_value(item) for item in value]
+
+        return value
+
+    def encode(self, figure_json, config=None):
+        """
+        Converts a figure, as serialized by plotly.io.to_json, into a compact payload
+        whose arrays and layout template are references into the pool.
+        """
+        figure = json.loads(figure_json)
+        layout = dict(figure.get('layout', {}))
+
+        if 'template' in layout:
+            layout['template'] = self._add(layout['template'])
+
+        return {
+            'data': [self._encode_value(trace) for trace in figure.get('data', [])],
+            'layout': layout,
+            'config': config or {'responsive': True}
+        }
+
+    def script_tag(self):
+        return json_script_tag(self.entries, f'id="{POOL_ELEMENT_ID}"')
+
+
+def resolve_references(node, pool):
+    """
+    Replaces the pool references of a payload by the pooled values, as the report bootstrap script does.
+    """
+    if isinstance(node, list):
+        return [resolve_references(item, pool) for item in node]
+    if isinstance(node, dict):
+        if isinstance(node.get('$ref'), str):
+            return pool[node['$ref']]
+        return {key: resolve_references(item, pool) for key, item in node.items()}
+    return node
+
+
+def image_data_uri(image_path):
+    """
+    Returns the image at image_path as a data URI, or None if the file does not exist.
+    """
+    if not image_path or not os.path.exists(image_path):
+        return None
+
+    mime_type = mimetypes.guess_type(image_path)[0] or 'image/png'
+    with open(image_path, 'rb') as file:
+        return bytes_data_uri(file.read(), mime_type)
+
+
+def bytes_data_uri(data, mime_type):
+    return f'data:{mime_type};base64,{base64.b64encode(data).decode("ascii")}'
+
+
+def optimize_image(image_path, image_format='png', max_width=None):
+    """
+    Re-encodes a chart image for the static report, downscaling it first if it is wider than max_width.
+
+    Converting and resizing need Pillow. Without it the exported PNG is returned unchanged.
+
+    Returns:
+        tuple: The image bytes and their format.
+    """
+    if image_format not in STATIC_IMAGE_FORMATS:
+        raise ValueError(f'''Unsupported image format. Supported formats: {STATIC_IMAGE_FORMATS}.''')
+
+    with open(image_path, 'rb') as file:
+        data = file.read()
+
+    if Image is None:
+        if image_format != 'png' or max_width:
+            logging.warning('Pillow is not installed, chart images are used as exported.')
+        return data, 'png'
+
+    with Image.open(io.BytesIO(data)) as image:
+        if max_width and image.width > max_width:
+            image = image.resize((max_width, round(image.height * max_width / image.width)), Image.LANCZOS)
+
+        output = io.BytesIO()
+        if image_format == 'webp':
+            image.save(output, format='WEBP', quality=85, method=6)
+        else:
+            image.save(output, format='PNG', optimize=True)
+
+    return output.getvalue(), image_format
+
+
+def static_image_html(src, title):
+    return f'<img class="chart-image" src="{html.escape(src)}" alt="{html.escape(str(title))}" style="width: 100%; height: auto;">'
+
+
+def chart_payload_html(plot_id, payload, placeholder_image=None):
+    """
+    Returns the placeholder element and the JSON payload for one chart.
+
+    Args:
+        placeholder_image (str): Optional image URI shown until the interactive chart is drawn.
+    """
+    # Without a placeholder, reserve Plotly's default height so lazily drawn charts do not all start in view
+    placeholder = ''
+    style = 'min-height: 450px;'
+    if placeholder_image:
+        placeholder = f'<img class="chart-placeholder" src="{placeholder_image}" alt="" style="width: 100%;">'
+        style = ''
+
+    return f'''<div id="{plot_id}" class="plotly-chart" style="{style}">{placeholder}</div>
+                {json_script_tag(payload, f'class="chart-payload" data-target="{plot_id}"')}'''
+
+
+# Resolves pool references and draws the payloads. Eager reports draw every chart once the
+# page has been parsed. Lazy reports draw a chart when its container comes near the viewport,
+# one at a time in document order, so the charts above the fold are interactive first.
+# Pool entries are copied per use because Plotly may attach decoded data to the spec objects.
+BOOTSTRAP_TEMPLATE = '''
+<script type="text/javascript">
+(function () {
+    var lazy = %(lazy)s;
+
+    function resolve(pool, node) {
+        if (Array.isArray(node)) {
+            return node.map(function (item) { return resolve(pool, item); });
+        }
+        if (node && typeof node === "object") {
+            if (typeof node.$ref === "string") {
+                return JSON.parse(JSON.stringify(pool[node.$ref]));
+            }
+            var result = {};
+            for (var key in node) {
+                result[key] = resolve(pool, node[key]);
+            }
+            return result;
+        }
+        return node;
+    }
+
+    function start() {
+        var poolElement = document.getElementById("%(pool_id)s");
+        var pool = poolElement ? JSON.parse(poolElement.textContent) : {};
+        var payloads = document.querySelectorAll("script.chart-payload");
+        var queue = Promise.resolve();
+
+        function render(payload) {
+            var target = document.getElementById(payload.getAttribute("data-target"));
+            var figure = resolve(pool, JSON.parse(payload.textContent));
+            var placeholder = target.querySelector(".chart-placeholder");
+            if (placeholder) {
+                target.removeChild(placeholder);
+            }
+            return Plotly.newPlot(target, figure.data, figure.layout, figure.config);
+        }
+
+        function enqueue(payload) {
+            queue = queue.then(function () { return render(payload); });
+        }
+
+        if (!lazy || !("IntersectionObserver" in window)) {
+            for (var i = 0; i < payloads.length; i++) {
+                enqueue(payloads[i]);
+            }
+            return;
+        }
+
+        var payloadsByTarget = {};
+        var observer = new IntersectionObserver(function (entries) {
+            entries.forEach(function (entry) {
+                if (entry.isIntersecting) {
+                    observer.unobserve(entry.target);
+                    enqueue(payloadsByTarget[entry.target.id]);
+                }
+            });
+        }, {rootMargin: "200px 0px"});
+
+        for (var j = 0; j < payloads.length; j++) {
+            var targetId = payloads[j].getAttribute("data-target");
+            payloadsByTarget[targetId] = payloads[j];
+            observer.observe(document.getElementById(targetId));
+        }
+    }
+
+    if (document.readyState === "loading") {
+        document.addEventListener("DOMContentLoaded", start);
+    } else {
+        start();
+    }
+})();
+</script>
+'''
+
+
+def bootstrap_script(lazy=False):
+    """
+    Returns the script drawing the chart payloads of a report.
+
+    Args:
+        lazy (bool): Draw each chart only when its container scrolls into view.
+    """
+    return BOOTSTRAP_TEMPLATE % {'pool_id': POOL_ELEMENT_ID, 'lazy': 'true' if lazy else 'false'}
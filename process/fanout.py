@@ -0,0 +1,181 @@
+"""
+Builds the same report for many segments (customers, regions, ...) from one set of
+processed datasets.
+
+The parent process partitions the datasets once, keeping only the row positions of each
+segment. Workers are forked from the parent, so they read the datasets through the
+parent's memory copy-on-write instead of receiving a pickled copy. Forking is only safe
+while the parent runs a single thread: a lock held by another thread, e.g. of a thread
+pool or of the kaleido process reader, would stay locked forever in the workers. When
+other threads are running, or on platforms without fork, workers are started from a
+fresh forkserver or spawn process and the datasets are sent once per worker, never once
+per segment. A failing segment is reported in the results without stopping the others.
+"""
+
+import os, sys
+sys.path.insert(1, '/'.join(os.path.realpath(__file__).split('/')[0:-2]))
+
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import plotly.io as pio
+
+from process.visualizer import *
+from process.generator import *
+from process.workers import process_pool_context
+
+# Set in each worker by _init_worker
+_worker_state = {}
+
+
+def _init_worker(datasets, partitions, options):
+    # A kaleido process started by the parent must not be shared with the forked workers
+    scope = getattr(pio.kaleido, 'scope', None)
+    if scope is not None and getattr(scope, '_proc', None) is not None:
+        scope._proc = None
+
+    _worker_state['datasets'] = datasets
+    _worker_state['partitions'] = partitions
+    _worker_state['options'] = options
+
+
+def segment_slug(segment):
+    return re.sub(r'[^A-Za-z0-9_-]+', '_', str(segment)).strip('_').lower() or 'segment'
+
+
+def segment_slugs(segments):
+    """
+    Returns the file name slug of each segment, keyed by segment. Segments whose slugs collide, e.g. 'A/B'
+    and 'A_B', get a numbered suffix in segment order, so no report overwrites another.
+    """
+    slugs = {}
+    used = set()
+    for segment in segments:
+        slug = base_slug = segment_slug(segment)
+        suffix = 2
+        while slug in used:
+            slug = f'{base_slug}_{suffix}'
+            suffix += 1
+        used.add(slug)
+        slugs[segment] = slug
+    return slugs
+
+
+def _build_segment(segment, slug):
+    datasets = _worker_state['datasets']
+    partitions = _worker_state['partitions']
+    options = _worker_state['options']
+    timings = {}
+    start_time = time.perf_counter()
+
+    # Datasets without the segment column are shared by every segment
+    segment_datasets = {
+        name: dataframe.take(partitions[name][segment]) if name in partitions else dataframe
+        for name, dataframe in datasets.items()
+        if name not in partitions or segment in partitions[name]
+    }
+    timings['partition'] = time.perf_counter() - start_time
+
+    images_dir = os.path.join(options['output_dir'], slug, 'images/')
+    chart_specs = [{'output_dir': images_dir, **spec} if spec.get('kind', 'chart') == 'chart' else spec
+                   for spec in options['chart_specs']]
+
+    start_time = time.perf_counter()
+    visualizer = DataVisualizer(segment_datasets)
+    visualizer.generate_batch(chart_specs, max_workers=options['chart_workers'])
+    timings['charts'] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    report = ReportGenerator(
+        options['report_title'].format(segment=segment), options['author_name'], options['created_date'],
+        visualizer, **options['generator_options']
+    )
+    report_path = os.path.join(options['output_dir'], f'{slug}_report.html')
+    with open(report_path, 'w', encoding='utf-8') as file:
+        report.write_html_report(file, **options['report_sections'])
+    timings['report'] = time.perf_counter() - start_time
+
+    return {'segment': segment, 'path': report_path, 'timings': timings}
+
+
+def fan_out_reports(processor, segment_column, chart_specs, report_title, author_name, created_date, output_dir
+                    , single_chart_titles=None, dual_charts_titles=None, chart_descriptions=None, table_titles=None, table_descriptions=None
+                    , generator_options=None, max_workers=None, chart_workers=1):
+    """
+    Builds one report per segment from the processed datasets of a Processor.
+
+    Args:
+        processor (Processor): Processor whose datasets are already loaded and preprocessed.
+        segment_column (str): Column identifying the segment. Datasets without it are shared by every segment.
+        chart_specs (list of dict): Specs of the charts and summary tables of a report, as taken by DataVisualizer.generate_batch.
+                                    IDs are fixed before the fan-out, so descriptions can be keyed by them for every segment.
+        report_title (str): Title of each report. '{segment}' is replaced by the segment value.
+        output_dir (str): Directory receiving one '<segment>_report.html' file and one images directory per segment.
+                          Segments whose names map to the same file name get a numbered suffix, e.g. 'a_b_2_report.html'.
+        single_chart_titles, dual_charts_titles, chart_descriptions, table_titles, table_descriptions:
+                                    Report sections, as taken by ReportGenerator.generate_html_report.
+        generator_options (dict): Extra ReportGenerator arguments, e.g. {'embed_mode': 'shared'}.
+        max_workers (int): Number of worker processes. Defaults to the number of CPUs.
+        chart_workers (int): Number of chart threads inside each worker.
+
+    Returns:
+        list of dict: Segment, report path and per-step timings of every segment, in segment order.
+                      Segments that failed have no report path and carry the exception under 'error'.
+    """
+    datasets = processor.get_all_processed_datasets()
+
+    partitions = {
+        name: dataframe.groupby(segment_column, sort=True).indices
+        for name, dataframe in datasets.items()
+        if segment_column in dataframe.columns
+    }
+    if not partitions:
+        raise ValueError(f'''No processed dataset has a '{segment_column}' column.''')
+
+    segments = sorted({segment for indices in partitions.values() for segment in indices}, key=str)
+    slugs = segment_slugs(segments)
+
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    options = {
+        'chart_specs': [{**spec, 'id': spec.get('id') or batch_spec_id(index, spec)} for index, spec in enumerate(chart_specs)],
+        'chart_workers': chart_workers,
+        'report_title': report_title,
+        'author_name': author_name,
+        'created_date': created_date,
+        'output_dir': output_dir,
+        'generator_options': generator_options or {},
+        'report_sections': {
+            'single_chart_titles': single_chart_titles,
+            'dual_charts_titles': dual_charts_titles,
+            'chart_descriptions': chart_descriptions or {},
+            'table_titles': table_titles,
+            'table_descriptions': table_descriptions or {}
+        }
+    }
+
+    results = {}
+    start_time = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=process_pool_context()
+                             , initializer=_init_worker, initargs=(datasets, partitions, options)) as executor:
+        futures = {executor.submit(_build_segment, segment, slugs[segment]): segment for segment in segments}
+
+        for done, future in enumerate(as_completed(futures), start=1):
+            segment = futures[future]
+            try:
+                result = future.result()
+            except Exception as error:
+                results[segment] = {'segment': segment, 'path': None, 'timings': {}, 'error': error}
+                print(f'''[{done}/{len(segments)}] Segment '{segment}' failed: {error}''')
+                continue
+            results[segment] = result
+
+            steps = ', '.join(f'{step} {elapsed:.2f}s' for step, elapsed in result['timings'].items())
+            print(f'''[{done}/{len(segments)}] Segment '{segment}' done ({steps})''')
+
+    failed = sum('error' in result for result in results.values())
+    print(f'Built {len(segments) - failed} segment reports in {time.perf_counter() - start_time:.2f}s' + (f', {failed} failed' if failed else ''))
+    return [results[segment] for segment in segments]
@@ -0,0 +1,120 @@
+"""
+Localization of chart labels.
+
+Chart titles, axis and legend titles, annotations, trace names and hover labels live in
+the figure JSON rather than in the report HTML. These helpers list the translatable
+strings of a figure once, and build per-language variants that replace only those
+strings. Everything else, data arrays included, is shared with the source figure.
+"""
+
+import re
+
+import plotly.io as pio
+
+# Labels of plotly.express hover templates, e.g. 'day=%{x}<br>value=%{y}'
+HOVER_LABEL = re.compile(r'(^|<br>)([^=<>%{}]+)=(?=%\{)')
+
+AXIS_KEY = re.compile(r'^(x|y|z)axis\d*$')
+COLOR_AXIS_KEY = re.compile(r'^coloraxis\d*$')
+
+
+def _title_path(container, path):
+    title = container.get('title') if isinstance(container, dict) else None
+    if isinstance(title, dict) and isinstance(title.get('text'), str):
+        return [(path + ('title', 'text'), title['text'])]
+    if isinstance(title, str):
+        return [(path + ('title',), title)]
+    return []
+
+
+def figure_text_fields(figure):
+    """
+    Lists the translatable strings of a figure, as serialized by plotly.io.to_json or FigurePool.encode.
+
+    Returns:
+        list of tuple: (path, text) pairs, where path is the sequence of keys leading to the string.
+                       Hover template labels are listed under the path of their template, once per label.
+    """
+    fields = []
+    layout = figure.get('layout', {})
+
+    fields += _title_path(layout, ('layout',))
+    for key, value in layout.items():
+        if AXIS_KEY.match(key):
+            fields += _title_path(value, ('layout', key))
+        elif COLOR_AXIS_KEY.match(key) and isinstance(value, dict):
+            fields += _title_path(value.get('colorbar'), ('layout', key, 'colorbar'))
+
+    fields += _title_path(layout.get('legend'), ('layout', 'legend'))
+
+    for index, annotation in enumerate(layout.get('annotations') or []):
+        if isinstance(annotation.get('text'), str):
+            fields.append((('layout', 'annotations', index, 'text'), annotation['text']))
+
+    for index, trace in enumerate(figure.get('data', [])):
+        path = ('data', index)
+        if isinstance(trace.get('name'), str):
+            fields.append((path + ('name',), trace['name']))
+        if isinstance(trace.get('hovertemplate'), str):
+            fields += [(path + ('hovertemplate',), match.group(2)) for match in HOVER_LABEL.finditer(trace['hovertemplate'])]
+        fields += _title_path(trace.get('colorbar'), path + ('colorbar',))
+        if isinstance(trace.get('marker'), dict):
+            fields += _title_path(trace['marker'].get('colorbar'), path + ('marker', 'colorbar'))
+
+    return [(path, text) for path, text in fields if text.strip()]
+
+
+def localize_figure(figure, fields, translations):
+    """
+    Returns a variant of figure with translated labels.
+
+    Only the dicts and lists on the way to a translated string are copied. The rest of the
+    variant, including its data arrays, is the source figure itself.
+
+    Args:
+        figure (dict): The source figure.
+        fields (list): Its text fields, as returned by figure_text_fields.
+        translations (dict): Translated text keyed by source text. Missing texts are kept.
+
+    Returns:
+        tuple: The figure variant and whether any label changed.
+    """
+    localized = dict(figure)
+    copies = {(): localized}
+    done = set()
+    changed = False
+
+    for path, text in fields:
+        if text not in translations or path in done:
+            continue
+        done.add(path)
+
+        node = localized
+        for depth in range(1, len(path)):
+            prefix = path[:depth]
+            if prefix not in copies:
+                child = node[path[depth - 1]]
+                copies[prefix] = dict(child) if isinstance(child, dict) else list(child)
+                node[path[depth - 1]] = copies[prefix]
+            node = copies[prefix]
+
+        source = node[path[-1]]
+        if path[-1] == 'hovertemplate':
+            node[path[-1]] = HOVER_LABEL.sub(lambda match: match.group(1) + translations.get(match.group(2), match.group(2)) + '=', source)
+        else:
+            node[path[-1]] = translations[text]
+        changed = changed or node[path[-1]] != source
+
+    return localized, changed
+
+
+def export_figure_images(figures, image_paths, image_format='png'):
+    """
+    Exports figures to image files one after the other through the same kaleido process.
+
+    Args:
+        figures (list of dict): Figures, with their pool references already resolved.
+        image_paths (list): Destination of each figure.
+    """
+    for figure, image_path in zip(figures, image_paths):
+        pio.write_image(figure, image_path, format=image_format, engine='kaleido', validate=False)
@@ -1,19 +1,133 @@
+import os
+import tempfile
+import threading
+
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
+
+from process.embedding import (
+    EMBED_MODES, STATIC_IMAGE_FORMATS, FigurePool, bootstrap_script, bytes_data_uri, chart_payload_html, image_data_uri,
+    optimize_image, plotly_runtime_tag, static_image_html
+)
+
+template_dir = os.path.join(os.path.dirname(__file__), 'templates')
+# Template bytecode is cached outside the package, which may be installed read-only.
+# REPORT_TEMPLATE_CACHE_DIR moves the cache, and an empty value disables it
+template_cache_dir = os.getenv('REPORT_TEMPLATE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'report_template_cache'))
+
+_template_environment = None
+_template_environment_lock = threading.Lock()
+
+def get_template_environment():
+    """
+    Returns the Jinja2 environment shared by every report of the process.
+
+    Templates are compiled on first use and kept in memory for the life of the process. Their
+    bytecode is also cached in template_cache_dir, so new processes skip the compilation step as well.
+    """
+    global _template_environment
+
+    with _template_environment_lock:
+        if _template_environment is None:
+            bytecode_cache = None
+            if template_cache_dir:
+                os.makedirs(template_cache_dir, exist_ok=True)
+                bytecode_cache = FileSystemBytecodeCache(template_cache_dir)
+
+            _template_environment = Environment(
+                loader=FileSystemLoader(template_dir),
+                bytecode_cache=bytecode_cache,
+                auto_reload=False,
+                trim_blocks=True
+            )
+    return _template_environment
+
+def set_template_cache_dir(cache_dir):
+    """
+    Moves the bytecode cache of the report templates to cache_dir, or disables it if cache_dir is None.
+    Templates already compiled by this process are compiled again on their next use.
+    """
+    global _template_environment, template_cache_dir
+
+    with _template_environment_lock:
+        template_cache_dir = cache_dir
+        _template_environment = None
+
 class ReportGenerator:
-    def __init__(self, report_title, author_name, created_date, visualizer):
+    def __init__(self, report_title, author_name, created_date, visualizer, embed_mode='cdn', lazy_charts=False, chart_placeholders=True
+                 , image_format='png', image_max_width=None, image_dir=None):
+        """
+        Args:
+            embed_mode (str): How charts are embedded in the report.
+                              'cdn' embeds each chart's own HTML fragment.
+                              'shared' loads a single Plotly runtime from the CDN and embeds compact figure payloads
+                              with binary-encoded arrays, shared between charts that plot the same data.
+                              'inline' is like 'shared' but inlines the runtime so the report works offline.
+                              'static' shows each chart's exported image and loads no Plotly runtime.
+            lazy_charts (bool): Draw each chart only when it scrolls into view, charts above the fold first.
+                                Requires the 'shared' or 'inline' embed mode.
+            chart_placeholders (bool): With lazy_charts, show the chart's PNG until the interactive chart is drawn.
+            image_format (str): With the 'static' embed mode, 'png' or 'webp'. Conversion requires Pillow.
+            image_max_width (int): With the 'static' embed mode, downscale wider images to this width in pixels.
+            image_dir (str): With the 'static' embed mode, write the images to this directory and link them instead
+                             of embedding them. The report must then be saved in the parent directory of image_dir.
+        """
+        if embed_mode not in EMBED_MODES:
+            raise ValueError(f'''Unsupported embed mode. Supported modes: {EMBED_MODES}.''')
+
+        if lazy_charts and embed_mode not in ['shared', 'inline']:
+            raise ValueError("Lazy charts require the 'shared' or 'inline' embed mode.")
+
+        if image_format not in STATIC_IMAGE_FORMATS:
+            raise ValueError(f'''Unsupported image format. Supported formats: {STATIC_IMAGE_FORMATS}.''')
+
         self.report_title = report_title
         self.author_name = author_name
         self.created_date = created_date
         self.visualizer = visualizer
+        self.embed_mode = embed_mode
+        self.lazy_charts = lazy_charts
+        self.chart_placeholders = chart_placeholders
+        self.image_format = image_format
+        self.image_max_width = image_max_width
+        self.image_dir = image_dir
+        self.figure_pool = FigurePool()
+
+    def generate_static_chart_body(self, chart_id, chart_info):
+        image_path = chart_info.get('file_path')
+        if not image_path or not os.path.exists(image_path):
+            return '<p class="chart-description">Chart image not available.</p>'
+
+        data, image_format = optimize_image(image_path, self.image_format, self.image_max_width)
+
+        if self.image_dir is None:
+            return static_image_html(bytes_data_uri(data, f'image/{image_format}'), chart_info['title'])
+
+        os.makedirs(self.image_dir, exist_ok=True)
+        file_name = f'{chart_id}.{image_format}'
+        with open(os.path.join(self.image_dir, file_name), 'wb') as file:
+            file.write(data)
+
+        return static_image_html(f'{os.path.basename(os.path.normpath(self.image_dir))}/{file_name}', chart_info['title'])
+
+    def generate_chart_body(self, chart_id, chart_info):
+        if self.embed_mode == 'cdn':
+            return chart_info['html']
+
+        if self.embed_mode == 'static':
+            return self.generate_static_chart_body(chart_id, chart_info)
+
+        placeholder_image = None
+        if self.lazy_charts and self.chart_placeholders:
+            placeholder_image = image_data_uri(chart_info.get('file_path'))
+
+        payload = self.figure_pool.encode(chart_info['figure_json'])
+        return chart_payload_html(f'plot-{chart_id}', payload, placeholder_image)
+
+    def get_section_macros(self):
+        return get_template_environment().get_template('sections.html.j2').module
 
     def generate_footer(self):
-        return '''
-            <div class="footer">
-                <div style="display: flex; justify-content: space-between; align-items: center; width: 100%; border-top: 1px solid #ccc; font-size: 12px;">
-                    <p>Generated by Report Generator</p>
-                    <p>&copy; 2024 Gridly. All rights reserved.</p>
-                </div>
-            </div>
-        '''
+        return str(self.get_section_macros().footer())
 
     def format_text(self, text, format_type='paragraph'):
         if format_type == 'list':
@@ -25,8 +139,6 @@ class ReportGenerator:
             return f'<p>{text}</p>'
 
     def generate_single_chart_html(self, chart_title, chart_description):
-        html = ''
-
         chart_info = self.visualizer.get_chart_by_title(chart_title)
         chart_id = self.visualizer.get_chart_id_by_title(chart_title)
 
@@ -37,14 +149,9 @@ class ReportGenerator:
         
         formatted_description = self.format_text(description_text, format_type=description_format)
 
-        html += f'''
-            <h3> {chart_info['title']} </h3>
-            <div id="{chart_id}"; class="chart-container">
-                {chart_info['html']}
-            </div>
-            {formatted_description}
-        '''
-        return html
+        return str(self.get_section_macros().single_chart(
+            chart_info['title'], chart_id, self.generate_chart_body(chart_id, chart_info), formatted_description
+        ))
 
     def generate_dual_chart_html(self, chart_titles, chart_descriptions=None):
         if len(chart_titles) != 2:
@@ -52,32 +159,18 @@ class ReportGenerator:
         
         chart_info_1 = self.visualizer.get_chart_by_title(chart_titles[0])
         chart_info_2 = self.visualizer.get_chart_by_title(chart_titles[1])
+        chart_id_1 = self.visualizer.get_chart_id_by_title(chart_titles[0])
+        chart_id_2 = self.visualizer.get_chart_id_by_title(chart_titles[1])
 
         description_1 = chart_descriptions.get(chart_titles[0], 'This is a sample chart comment') if chart_descriptions else 'No description provided'
         description_2 = chart_descriptions.get(chart_titles[1], 'This is a sample chart comment') if chart_descriptions else 'No description provided'
 
-        dual_chart_html = f'''
-            <h3>Sample Side-by-Side Charts</h3>
-            <div style="display: flex; justify-content: space-between; overflow: visible;">
-                <div class="dual-chart-container" >
-                    <h4>{chart_info_1.get("title", "No Title")}</h4>
-                    {chart_info_1['html']}
-                    <p class="chart-description">{description_1}</p>
-                </div>
-                <div class="dual-chart-container" >
-                    <h4>{chart_info_2.get("title", "No Title")}</h4>
-                    {chart_info_2['html']}
-                    <p class="chart-description">{description_2}</p>
-                </div>
-            </div>
-        '''
-
-        return dual_chart_html 
+        return str(self.get_section_macros().dual_chart([
+            {'title': chart_info_1.get("title", "No Title"), 'body': self.generate_chart_body(chart_id_1, chart_info_1), 'description': description_1},
+            {'title': chart_info_2.get("title", "No Title"), 'body': self.generate_chart_body(chart_id_2, chart_info_2), 'description': description_2}
+        ]))
 
-    
     def generate_summary_table_html(self, table_title, table_description):
-        html = ''
-
         table_info = self.visualizer.get_summary_table_by_title(table_title)
         table_id = self.visualizer.get_summary_table_id_by_title(table_title)
 
@@ -88,15 +181,9 @@ class ReportGenerator:
         
         formatted_description = self.format_text(description_text, format_type=description_format)        
 
-        html += f'''
-            <h3>{table_info.get("title", "No Title")}</h3>
-            <div id="{table_id}" class="table-container">
-                {table_info['html']}
-            </div>
-            {formatted_description}
-        '''
-
-        return html
+        return str(self.get_section_macros().summary_table(
+            table_info.get("title", "No Title"), table_id, table_info['html'], formatted_description
+        ))
 
     def generate_tabbed_layout(self, tabs):
         tab_headers = '<div class="tab-headers">'
@@ -137,91 +224,47 @@ class ReportGenerator:
         return grid_html
     
 
+    def report_context(self, single_chart_titles=None, dual_charts_titles=None, chart_descriptions=None, table_titles=None, table_descriptions=None):
+        # Sections are generators so a streamed report only holds one section in memory at a time
+        single_charts = (self.generate_single_chart_html(title, chart_descriptions) for title in single_chart_titles or [])
+        dual_charts = (self.generate_dual_chart_html(list(chart_pair), chart_descriptions) for chart_pair in dual_charts_titles or [])
+        tables = (self.generate_summary_table_html(title, table_descriptions) for title in table_titles or [])
+
+        # Each report gets its own pool so it only carries the data of its own charts
+        self.figure_pool = FigurePool()
+
+        if self.embed_mode == 'cdn':
+            plotly_script = '<script src="https://cdn.plot.ly/plotly-latest.min.js"></script>'
+        elif self.embed_mode == 'static':
+            plotly_script = ''
+        else:
+            plotly_script = plotly_runtime_tag(inline=self.embed_mode == 'inline', defer=self.lazy_charts)
+
+        def chart_scripts():
+            # Called by the template after every chart has been rendered, once the pool is complete
+            if self.embed_mode in ['cdn', 'static']:
+                return ''
+            return self.figure_pool.script_tag() + bootstrap_script(lazy=self.lazy_charts)
+
+        return {
+            'report_title': self.report_title,
+            'author_name': self.author_name,
+            'created_date': self.created_date,
+            'plotly_script': plotly_script,
+            'single_charts': single_charts,
+            'dual_charts': dual_charts,
+            'tables': tables,
+            'chart_scripts': chart_scripts
+        }
+
     def generate_html_report(self, single_chart_titles=None, dual_charts_titles=None, chart_descriptions=None, table_titles=None, table_descriptions=None):
-        footer_html = self.generate_footer()
-
-        # Generate HTML for single charts
-        single_charts_html = ''
-        for title in single_chart_titles:
-            single_charts_html += self.generate_single_chart_html(title, chart_descriptions)
-
-        # Generate HTML for dual charts
-        dual_charts_html = ''
-        for chart_pair in dual_charts_titles:
-            dual_charts_html += self.generate_dual_chart_html(list(chart_pair), chart_descriptions)
-
-        tables_html = ''
-        for title in table_titles:
-            tables_html += self.generate_summary_table_html(title, table_descriptions)
-
-        # Basic template, it could be improved
-        html_string = f'''
-        <html>
-            <head>
-                <script src="https://cdn.plot.ly/plotly-latest.min.js"></script>
-                <link rel="stylesheet" href="https://maxcdn.bootstrapcdn.com/bootstrap/3.3.1/css/bootstrap.min.css">
-                <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/5.15.1/css/all.min.css">
-                <style>
-                    body, html {{ 
-                        height: 100%; 
-                        margin: 10; 
-                        padding: 10; 
-                        font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-                    }}               
-                    .chart-container {{ width: 80%; height: auto; margin: 20px auto; padding: 20px;}}
-                    .table-container {{ width: 80%; height: auto; margin: 20px; }}
-                    
-                    h1, h3, p {{ 
-                        margin: 20px; 
-                        text-align: justify;
-                    }}
-                    
-                    p, li {{ 
-                        font-size: 16px; 
-                        line-height: 1.6;
-                    }}
-
-                    .chart-description {{
-                        font-size: 12px;
-                        font-style: italic;
-                        color: #6c757d;
-                        text-align: center;
-                    }}
-
-                    .dual-chart-container {{
-                        width: 48%;
-                        height: 40%;
-                        margin: 20px;
-                        padding: 20px;
-    
-                    }}
-                
-                    .metadata {{
-                        font-size: 14px;
-                        font-style: italic;
-                        color: #555;
-                        padding: auto;
-                        margin: auto;
-                    }}
-
-                    .metadata p {{
-                        color: #6c757d;
-                        text-align: right !important;
-                    }}
-                </style>
-            </head>
-            <body>
-                <h1><b> {self.report_title} </b></h1>
-                <div class="metadata">
-                    <p>Created on: {self.created_date} | Author: {self.author_name}</p>
-                </div>      
-                    {single_charts_html}
-
-                    {dual_charts_html}
-
-                    {tables_html}
-            </body>
-            {footer_html}
-        </html>
-        '''
-        return html_string
+        template = get_template_environment().get_template('report.html.j2')
+        return template.render(self.report_context(single_chart_titles, dual_charts_titles, chart_descriptions, table_titles, table_descriptions))
+
+    def write_html_report(self, file, single_chart_titles=None, dual_charts_titles=None, chart_descriptions=None, table_titles=None, table_descriptions=None):
+        """
+        Streams the report to a file handle section by section, without building the page in memory.
+        """
+        template = get_template_environment().get_template('report.html.j2')
+        for chunk in template.generate(self.report_context(single_chart_titles, dual_charts_titles, chart_descriptions, table_titles, table_descriptions)):
+            file.write(chunk)
@@ -0,0 +1,135 @@
+"""
+Concurrent Gridly client for several views.
+
+Each view's import, polling and export run as an asyncio task. HTTP calls run in worker
+threads over one pooled session shared by every view, and all of them draw from one
+token bucket matching the Gridly API quota. Polling is ImportJob.wait, run on the loop's
+default executor, so waiting views do not hold the workers sending requests. A failing
+view is reported in the results without cancelling the others.
+"""
+
+import os, sys
+sys.path.insert(1, '/'.join(os.path.realpath(__file__).split('/')[0:-2]))
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from process.gridly_features import *
+from process.rate_limit import *
+
+# Requests per second allowed across all views. Adjust to the quota of the Gridly plan.
+GRIDLY_REQUESTS_PER_SECOND = 10
+
+
+class AsyncGridlyClient:
+    """
+    Args:
+        api_key (str): Gridly API key, shared by every view.
+        base_url (str): Gridly API URL, e.g. of another region or of a local mock server.
+        requests_per_second (float): Global rate limit of the client.
+        max_connections (int): Size of the connection pool, and number of requests in flight.
+    """
+    def __init__(self, api_key, base_url=BASE_URL, requests_per_second=GRIDLY_REQUESTS_PER_SECOND, max_connections=10
+                 , timeout=DEFAULT_TIMEOUT, compress_requests=False):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.compress_requests = compress_requests
+        self.rate_limiter = TokenBucket(requests_per_second)
+        # Retries of the session draw from the same bucket as first attempts
+        self.session = create_session(pool_maxsize=max_connections, rate_limiter=self.rate_limiter)
+        self.executor = ThreadPoolExecutor(max_workers=max_connections)
+        self.features = {}
+
+    def feature(self, view_id):
+        """
+        Returns the GridlyFeature of a view, sharing the client's session and rate limiter.
+        """
+        if view_id not in self.features:
+            self.features[view_id] = GridlyFeature(view_id, self.api_key, base_url=self.base_url, session=self.session, timeout=self.timeout
+                                                   , compress_requests=self.compress_requests, rate_limiter=self.rate_limiter)
+        return self.features[view_id]
+
+    async def _call(self, function, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, lambda: function(*args, **kwargs))
+
+    async def sync_view(self, view_id, records, **kwargs):
+        return await self._call(self.feature(view_id).sync_records, records, **kwargs)
+
+    async def import_view(self, view_id, file_path, import_request):
+        return await self._call(self.feature(view_id).import_file, file_path, import_request)
+
+    async def export_view(self, view_id, export_file_path, **kwargs):
+        return await self._call(self.feature(view_id).export_file, export_file_path, **kwargs)
+
+    async def wait(self, job, column_ids=None, timeout=600, initial_delay=1, max_delay=30, backoff=2):
+        """
+        Runs ImportJob.wait in a thread of the loop's default executor.
+        """
+        return await asyncio.to_thread(job.wait, column_ids=column_ids, timeout=timeout, initial_delay=initial_delay
+                                       , max_delay=max_delay, backoff=backoff)
+
+    async def localize_view(self, view_id, export_file_path, records=None, file_path=None, import_request=None
+                            , column_ids=None, columns=None, snapshot_path=None, timeout=900):
+        """
+        Sends a view its source text, waits for its translations and exports them.
+
+        Args:
+            records (dict): Records to sync, as taken by GridlyFeature.sync_records. Otherwise file_path and
+                            import_request are imported with GridlyFeature.import_file.
+            column_ids (list): Gridly columns to wait on, e.g. the target language columns.
+            columns (list): Columns kept in the export, as taken by GridlyFeature.export_file.
+
+        Returns:
+            dict: The export path and the seconds spent sending, waiting and exporting.
+        """
+        timings = {}
+
+        start_time = time.perf_counter()
+        if records is not None:
+            job = await self.sync_view(view_id, records, snapshot_path=snapshot_path)
+        else:
+            job = await self.import_view(view_id, file_path, import_request)
+        timings['send'] = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        await self.wait(job, column_ids=column_ids, timeout=timeout)
+        timings['wait'] = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        path = await self.export_view(view_id, export_file_path, columns=columns)
+        timings['export'] = time.perf_counter() - start_time
+
+        return {'path': path, 'timings': timings}
+
+    async def localize_views(self, views):
+        """
+        Runs localize_view for several views concurrently.
+
+        Args:
+            views (dict): localize_view arguments keyed by view ID.
+
+        Returns:
+            dict: The result of each view, or the exception it failed with, keyed by view ID.
+        """
+        results = await asyncio.gather(*[self.localize_view(view_id, **options) for view_id, options in views.items()], return_exceptions=True)
+
+        for view_id, result in zip(views, results):
+            if isinstance(result, Exception):
+                print(f'''Gridly view {view_id} failed: {result}''')
+            else:
+                steps = ', '.join(f'{step} {elapsed:.2f}s' for step, elapsed in result['timings'].items())
+                print(f'''Gridly view {view_id} exported to {result['path']} ({steps})''')
+        return dict(zip(views, results))
+
+    def run(self, views):
+        """
+        Blocking entry point of localize_views.
+        """
+        return asyncio.run(self.localize_views(views))
+
+    def close(self):
+        self.executor.shutdown()
+        self.session.close()
@@ -1,61 +1,446 @@
 import requests
 import json
 import csv
-from io import StringIO
+import gzip
+import io
+import os
+import random
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 BASE_URL = 'https://eu-central-1.api.gridly.com/v1'
 
+# Seconds to open a connection and to wait for a response
+DEFAULT_TIMEOUT = (5, 120)
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Request bodies below this size are not worth compressing
+COMPRESSION_THRESHOLD = 1024
+
+# Number of latest requests kept for latency_stats
+LATENCY_HISTORY = 1000
+
+# Special column ID of the Gridly record ID in column mappings
+RECORD_ID_COLUMN = '_recordId'
+
+RECORDS_PAGE_SIZE = 1000
+
+# Records per create, update or delete request
+RECORD_BATCH_SIZE = 500
+
+EXPORT_CHUNK_SIZE = 1 << 16
+
+def backoff_delay(attempt, initial_delay=1, max_delay=30, backoff=2):
+    """
+    Exponential backoff with full jitter: a delay drawn uniformly between 0 and min(max_delay, initial_delay * backoff ** attempt).
+    """
+    return random.uniform(0, min(max_delay, initial_delay * backoff ** attempt))
+
+class ImportJob:
+    """
+    Handle of a file import, which Gridly accepts with 202 and applies asynchronously, or of a record sync.
+
+    The import is complete once every record of the imported file can be read back from the view. Records are
+    identified by the column the first file column is mapped to, or by their record ID.
+    """
+    def __init__(self, feature, key_column_id, keys):
+        self.feature = feature
+        self.key_column_id = key_column_id
+        self.keys = set(keys)
+        self.submitted_at = time.time()
+
+    def _record_key(self, record):
+        if self.key_column_id == RECORD_ID_COLUMN:
+            return record.get('id')
+        for cell in record.get('cells', []):
+            if cell.get('columnId') == self.key_column_id:
+                return cell.get('value')
+        return None
+
+    def pending(self, column_ids=None):
+        """
+        Returns the keys of the imported records that are not in the view yet or, with column_ids, whose cells
+        in any of those columns are still empty.
+        """
+        pending = set(self.keys)
+
+        requested_columns = list(column_ids or [])
+        if self.key_column_id != RECORD_ID_COLUMN:
+            requested_columns.insert(0, self.key_column_id)
+
+        for record in self.feature.get_records(column_ids=requested_columns):
+            key = self._record_key(record)
+            if key not in pending:
+                continue
+            values = {cell.get('columnId'): cell.get('value') for cell in record.get('cells', [])}
+            if all(str(values.get(column_id) or '').strip() for column_id in column_ids or []):
+                pending.discard(key)
+        return pending
+
+    def wait(self, column_ids=None, timeout=600, initial_delay=1, max_delay=30, backoff=2):
+        """
+        Polls the view until the import is complete or, with column_ids, until every imported record has a value
+        in those columns (e.g. the target language columns filled by machine translation).
+
+        Polls are spaced by backoff_delay, and never go past the deadline.
+
+        Args:
+            column_ids (list): Optional Gridly column IDs that must be filled for every imported record.
+            timeout (float): Overall deadline in seconds, counted from this call.
+
+        Returns:
+            float: Seconds spent waiting.
+
+        Raises:
+            TimeoutError: If the condition is not met before the deadline.
+        """
+        start_time = time.monotonic()
+        deadline = start_time + timeout
+        attempt = 0
+
+        while True:
+            pending = self.pending(column_ids)
+            if not pending:
+                elapsed = time.monotonic() - start_time
+                print(f'Gridly import of {len(self.keys)} records completed after {attempt + 1} polls ({elapsed:.1f}s)')
+                return elapsed
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f'''Gridly import not completed after {timeout}s: {len(pending)} of {len(self.keys)} records pending''')
+
+            time.sleep(min(remaining, backoff_delay(attempt, initial_delay, max_delay, backoff)))
+            attempt += 1
+
+class GridlyRetry(Retry):
+    """
+    Retries idempotent requests on 429 and 5xx responses, and any request on 429, which Gridly rejects before
+    processing it. Waits follow Retry-After when the response has one, exponential backoff otherwise.
+
+    Retries are sent by urllib3 without going back through GridlyFeature, so with a rate_limiter every retry
+    also waits for a token after its backoff, like the first attempt does.
+    """
+    def __init__(self, *args, rate_limiter=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rate_limiter = rate_limiter
+
+    def new(self, **kwargs):
+        # urllib3 makes a new Retry for every attempt from a fixed list of arguments
+        retry = super().new(**kwargs)
+        retry.rate_limiter = self.rate_limiter
+        return retry
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if status_code == 429 and self.total:
+            return True
+        return super().is_retry(method, status_code, has_retry_after)
+
+    def sleep(self, response=None):
+        super().sleep(response)
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+
+def create_session(max_retries=5, backoff_factor=0.5, pool_maxsize=10, rate_limiter=None):
+    """
+    Creates a session keeping up to pool_maxsize connections alive per host, which GridlyFeature instances
+    can share.
+
+    Args:
+        rate_limiter (TokenBucket): Optional limiter the retries of the session wait on. Pass the limiter of the
+                                    GridlyFeature instances using the session.
+    """
+    retry = GridlyRetry(total=max_retries, backoff_factor=backoff_factor, status_forcelist=RETRY_STATUSES
+                        , respect_retry_after_header=True, raise_on_status=False, rate_limiter=rate_limiter)
+    adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize, max_retries=retry)
+
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['Accept-Encoding'] = 'gzip, deflate'
+    return session
+
 class GridlyFeature:
-    def __init__(self, view_id, api_key):
+    """
+    Client of a Gridly view.
+
+    Args:
+        base_url (str): Gridly API URL, e.g. of another region or of a local mock server.
+        session (requests.Session): Session to share with other clients. Defaults to a new one from create_session,
+                                    whose retries also wait on rate_limiter.
+        timeout (float or tuple): Connect and read timeouts in seconds.
+        compress_requests (bool): Send JSON request bodies, i.e. record syncs, gzip-compressed. File imports are
+                                  multipart uploads and are always sent uncompressed.
+        rate_limiter (TokenBucket): Optional limiter every request waits on, e.g. shared by the clients of several views.
+    """
+    def __init__(self, view_id, api_key, base_url=BASE_URL, session=None, timeout=DEFAULT_TIMEOUT, compress_requests=False, rate_limiter=None):
         self.view_id = view_id
         self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.session = session or create_session(rate_limiter=rate_limiter)
+        self.timeout = timeout
+        self.compress_requests = compress_requests
+        self.rate_limiter = rate_limiter
+        self.latencies = deque(maxlen=LATENCY_HISTORY)
 
-    def get_columns_from_view(self):
-        url = f'''{BASE_URL}/{self.view_id}'''
+    def _request(self, method, path, json_body=None, **kwargs):
         headers = {
             'Authorization': f'ApiKey {self.api_key}'
         }
-        response = requests.request('GET', url, headers=headers)
+
+        if json_body is not None:
+            kwargs['data'] = json.dumps(json_body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+            if self.compress_requests and len(kwargs['data']) >= COMPRESSION_THRESHOLD:
+                kwargs['data'] = gzip.compress(kwargs['data'])
+                headers['Content-Encoding'] = 'gzip'
+
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+
+        start_time = time.perf_counter()
+        response = self.session.request(method, f'''{self.base_url}{path}''', headers=headers, timeout=self.timeout, **kwargs)
+        self.latencies.append({
+            'method': method,
+            'path': path,
+            'status': response.status_code,
+            'seconds': time.perf_counter() - start_time
+        })
+        return response
+
+    def latency_stats(self):
+        """
+        Summarizes the latency of the latest requests, retries included, per method and path.
+
+        Returns:
+            dict: Count, mean, median, 95th percentile and max seconds keyed by (method, path).
+        """
+        by_endpoint = {}
+        for latency in self.latencies:
+            by_endpoint.setdefault((latency['method'], latency['path']), []).append(latency['seconds'])
+
+        stats = {}
+        for endpoint, seconds in by_endpoint.items():
+            seconds = sorted(seconds)
+            stats[endpoint] = {
+                'count': len(seconds),
+                'mean': sum(seconds) / len(seconds),
+                'p50': seconds[len(seconds) // 2],
+                'p95': seconds[min(len(seconds) - 1, int(len(seconds) * 0.95))],
+                'max': seconds[-1]
+            }
+        return stats
+
+    def get_columns_from_view(self):
+        response = self._request('GET', f'''/views/{self.view_id}''')
 
         return [col['id'] for col in response.json()['columns']]
     
+    def get_records(self, column_ids=None, page_size=RECORDS_PAGE_SIZE):
+        """
+        Yields the records of the view, one page at a time.
 
-    def import_file(self, file_path, import_request):
-        headers = {
-            'Authorization': f'ApiKey {self.api_key}'
+        Args:
+            column_ids (list): Optional IDs of the columns whose cells are returned.
+        """
+        offset = 0
+
+        while True:
+            params = {'page': json.dumps({'offset': offset, 'limit': page_size})}
+            if column_ids:
+                params['columnIds'] = ','.join(column_ids)
+
+            response = self._request('GET', f'''/views/{self.view_id}/records''', params=params)
+            if response.status_code != 200:
+                raise Exception(f'''Error: {response.text}''')
+
+            records = response.json()
+            yield from records
+
+            offset += len(records)
+            total = response.headers.get('X-Total-Count')
+            if len(records) < page_size or (total is not None and offset >= int(total)):
+                return
+
+    def count_records(self):
+        """
+        Returns the number of records of the view, read from a one-record page, or None if Gridly does not
+        report it.
+        """
+        params = {'page': json.dumps({'offset': 0, 'limit': 1})}
+        response = self._request('GET', f'''/views/{self.view_id}/records''', params=params)
+        if response.status_code != 200:
+            raise Exception(f'''Error: {response.text}''')
+
+        total = response.headers.get('X-Total-Count')
+        return int(total) if total is not None else None
+
+    def _read_view(self, column_ids):
+        return {
+            record['id']: {cell['columnId']: cell.get('value') for cell in record.get('cells', []) if cell.get('columnId') in column_ids}
+            for record in self.get_records(column_ids=column_ids)
         }
 
+    def _record_batch(self, method, body):
+        response = self._request(method, f'''/views/{self.view_id}/records''', json_body=body)
+        if response.status_code not in (200, 201, 204):
+            raise Exception(f'''Error: {response.text}''')
+        return len(body['ids']) if method == 'DELETE' else len(body)
+
+    @staticmethod
+    def _record_changes(records, current, remove_missing):
+        added = [{'id': record_id, 'cells': [{'columnId': column_id, 'value': value} for column_id, value in cells.items()]}
+                 for record_id, cells in records.items() if record_id not in current]
+        changed = []
+        for record_id, cells in records.items():
+            changed_cells = [{'columnId': column_id, 'value': value} for column_id, value in cells.items()
+                             if record_id in current and current[record_id].get(column_id) != value]
+            if changed_cells:
+                changed.append({'id': record_id, 'cells': changed_cells})
+        removed = [record_id for record_id in current if record_id not in records] if remove_missing else []
+        return added, changed, removed
+
+    def _send_changes(self, added, changed, removed, batch_size, max_workers):
+        batches = [('POST', added[start:start + batch_size]) for start in range(0, len(added), batch_size)]
+        batches += [('PATCH', changed[start:start + batch_size]) for start in range(0, len(changed), batch_size)]
+        batches += [('DELETE', {'ids': removed[start:start + batch_size]}) for start in range(0, len(removed), batch_size)]
+
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for future in [executor.submit(self._record_batch, method, body) for method, body in batches]:
+                future.result()
+
+        print(f'Gridly sync: {len(added)} added, {len(changed)} changed, {len(removed)} removed in {len(batches)} requests'
+              f' ({time.perf_counter() - start_time:.2f}s)')
+
+    def sync_records(self, records, snapshot_path=None, remove_missing=True, batch_size=RECORD_BATCH_SIZE, max_workers=4):
+        """
+        Brings the view to records by sending only the records added, changed or removed since its last known
+        state, through the record API in concurrent batches.
+
+        Args:
+            records (dict): Cell values keyed by record ID, then by column ID.
+            snapshot_path (str): Optional JSON file holding the state of the view after the previous sync, which
+                                 saves reading the whole view. The view is read from Gridly instead when the file does
+                                 not exist, when its record count differs from the view's, or when a batch sent from
+                                 it fails, e.g. because a record it lists was deleted in Gridly. The file is rewritten
+                                 after every successful sync.
+            remove_missing (bool): Delete the records of the view that are not in records. Pass False when records
+                                   only holds the records to add or update.
+            batch_size (int): Records per request.
+            max_workers (int): Number of requests in flight.
+
+        Returns:
+            ImportJob: Handle to wait on the translation of the added and changed records.
+        """
+        column_ids = sorted({column_id for cells in records.values() for column_id in cells})
+
+        current = None
+        if snapshot_path and os.path.exists(snapshot_path):
+            with open(snapshot_path, 'r', encoding='utf-8') as f:
+                current = json.load(f)
+
+            count = self.count_records()
+            if count is not None and count != len(current):
+                print(f'Gridly sync: the snapshot lists {len(current)} records but the view has {count}, reading the view')
+                current = None
+
+        # IDs of the records to wait on, including those sent from the snapshot before falling back to the view
+        sent_ids = []
+
+        if current is not None:
+            added, changed, removed = self._record_changes(records, current, remove_missing)
+            sent_ids += [record['id'] for record in added + changed]
+            try:
+                self._send_changes(added, changed, removed, batch_size, max_workers)
+            except Exception as e:
+                # Batches already applied match the view now, so only what still differs is sent again
+                print(f'Gridly sync from the snapshot failed ({e}), reading the view')
+                current = None
+
+        if current is None:
+            current = self._read_view(column_ids)
+            added, changed, removed = self._record_changes(records, current, remove_missing)
+            sent_ids += [record['id'] for record in added + changed]
+            self._send_changes(added, changed, removed, batch_size, max_workers)
+
+        if snapshot_path:
+            current = {record_id: cells for record_id, cells in current.items() if record_id not in removed}
+            for record_id, cells in records.items():
+                current[record_id] = {**current.get(record_id, {}), **cells}
+            with open(snapshot_path, 'w', encoding='utf-8') as f:
+                json.dump(current, f)
+
+        return ImportJob(self, RECORD_ID_COLUMN, sent_ids)
+
+    def import_file(self, file_path, import_request):
+        """
+        Starts importing a CSV file into the view.
+
+        Returns:
+            ImportJob: Handle to wait on the completion of the import.
+        """
         data = {
             'importRequest': json.dumps(import_request),
         }
 
-        files = {'file': open(file_path, 'rb')}
+        # Records are identified by the column the first file column is mapped to
+        key_column_id = next((mapping['columnId'] for mapping in import_request.get('columnMappings', []) if mapping.get('fileColumnIndex') == 0), RECORD_ID_COLUMN)
+        with open(file_path, 'r', newline='', encoding='utf-8') as f:
+            rows = csv.reader(f)
+            if import_request.get('withHeader'):
+                next(rows, None)
+            keys = [row[0] for row in rows if row]
 
-        url = f'''{BASE_URL}/views/{self.view_id}/import'''
-
-        response = requests.post(url, headers=headers, files=files, data=data)
+        with open(file_path, 'rb') as f:
+            response = self._request('POST', f'''/views/{self.view_id}/import''', files={'file': f}, data=data)
 
         if response.status_code != 202:
             raise Exception(f'''Error: {response.text}''')
         else:
-            return 'Done!'
+            return ImportJob(self, key_column_id, keys)
         
-    def export_file(self, export_file_path):
-        headers = {
-            'Authorization': f'ApiKey {self.api_key}'
-        }
-        url = f'''{BASE_URL}/views/{self.view_id}/export'''
-        
-        response = requests.get(url=url, headers=headers)
-
-        reader = csv.reader(StringIO(response.text))
+    def export_file(self, export_file_path, columns=None, column_ids=None, chunk_size=EXPORT_CHUNK_SIZE):
+        """
+        Streams the export of the view to a CSV file, so large views are never held in memory.
 
-        with open(export_file_path, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerows(reader)
+        Args:
+            columns (list): Optional names of the columns to keep, e.g. ['id', 'French']. Rows are then parsed
+                            and written one at a time; otherwise the response body is written as it arrives.
+            column_ids (list): Optional IDs of the columns Gridly should export.
+            chunk_size (int): Bytes read from the response at a time.
+        """
+        params = {'columnIds': ','.join(column_ids)} if column_ids else None
+        response = self._request('GET', f'''/views/{self.view_id}/export''', params=params, stream=True)
 
-            
+        with response:
+            if response.status_code != 200:
+                raise Exception(f'''Error: {response.text}''')
 
+            if columns is None:
+                with open(export_file_path, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        f.write(chunk)
+                return export_file_path
 
+            # The text wrapper reads past the end of the body, which must not close the response first
+            response.raw.decode_content = True
+            response.raw.auto_close = False
+            reader = csv.reader(io.TextIOWrapper(response.raw, encoding='utf-8-sig', newline=''))
+            header = next(reader, [])
 
+            kept = [index for index, name in enumerate(header) if name in columns]
+            for name in columns:
+                if name not in header:
+                    print(f"Warning: {name} column not found in export.")
 
+            with open(export_file_path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow([header[index] for index in kept])
+                for row in reader:
+                    writer.writerow([row[index] if index < len(row) else '' for index in kept])
+        return export_file_path
@@ -0,0 +1,190 @@
+"""
+Runs the steps of a report run as a graph of stages.
+
+Each stage names the values it takes and the values it produces. A stage starts as soon
+as all of its inputs exist, so stages that do not depend on each other overlap, e.g.
+loading sample files during the warehouse query. Stages run on a thread pool, or on a
+process pool for CPU-bound work whose function, inputs and outputs can be pickled. The
+process pool is only started once a process stage is ready. Stage functions run
+concurrently, so they should not share mutable state such as one Processor.
+
+After a run, timing_report shows when each stage started and finished, and which chain
+of stages, the critical path, determined the total time.
+"""
+
+import os, sys
+sys.path.insert(1, '/'.join(os.path.realpath(__file__).split('/')[0:-2]))
+
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from process.workers import process_pool_context
+
+EXECUTORS = ['thread', 'process']
+
+
+def _run_stage(function, inputs):
+    # Timed in the worker, so the time spent queued for a free worker is not counted as running.
+    # Wall-clock time is comparable between processes.
+    start_time = time.time()
+    result = function(**inputs)
+    return result, start_time, time.time()
+
+
+class Stage:
+    def __init__(self, name, function, inputs=(), outputs=(), executor='thread'):
+        """
+        Args:
+            name (str): Name of the stage, unique in its pipeline.
+            function (callable): Called with the inputs as keyword arguments. With one output it returns the
+                                 value, with several a tuple of values in the order of outputs.
+            inputs (list): Names of the values the stage takes.
+            outputs (list): Names of the values the stage produces.
+            executor (str): 'thread' or 'process'.
+        """
+        if executor not in EXECUTORS:
+            raise ValueError(f'''Unsupported executor '{executor}'. Supported executors are: {', '.join(EXECUTORS)}''')
+
+        self.name = name
+        self.function = function
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.executor = executor
+
+
+class Pipeline:
+    def __init__(self, max_threads=4, max_processes=None):
+        """
+        Args:
+            max_threads (int): Number of thread stages running at the same time.
+            max_processes (int): Number of process stages running at the same time. Defaults to the number of CPUs.
+        """
+        self.max_threads = max_threads
+        self.max_processes = max_processes
+        self.stages = {}
+        self.timings = {}
+        self.producers = {}
+
+    def add_stage(self, name, function, inputs=(), outputs=(), executor='thread'):
+        if name in self.stages:
+            raise ValueError(f'''A stage named '{name}' already exists.''')
+        self.stages[name] = Stage(name, function, inputs, outputs, executor)
+        return self.stages[name]
+
+    def validate(self, initial=()):
+        """
+        Maps every value to the stage producing it, and checks that every input is produced exactly once
+        and that stages do not depend on each other in a cycle.
+        """
+        producers = {}
+        for stage in self.stages.values():
+            for output in stage.outputs:
+                if output in producers or output in initial:
+                    raise ValueError(f'''Value '{output}' is produced more than once.''')
+                producers[output] = stage.name
+
+        for stage in self.stages.values():
+            missing = [value for value in stage.inputs if value not in producers and value not in initial]
+            if missing:
+                raise ValueError(f'''Stage '{stage.name}' takes values no stage produces: {', '.join(missing)}''')
+
+        # Kahn's algorithm: stages left over once no stage is ready are part of a cycle
+        available = set(initial)
+        remaining = dict(self.stages)
+        while remaining:
+            ready = [name for name, stage in remaining.items() if all(value in available for value in stage.inputs)]
+            if not ready:
+                raise ValueError(f'''Stages depend on each other in a cycle: {', '.join(remaining)}''')
+            for name in ready:
+                available.update(remaining.pop(name).outputs)
+
+        return producers
+
+    def run(self, initial=None):
+        """
+        Runs every stage once its inputs exist.
+
+        Args:
+            initial (dict): Values available before any stage runs.
+
+        Returns:
+            dict: All values, the initial ones and those produced by the stages.
+        """
+        values = dict(initial or {})
+        self.producers = self.validate(values)
+        self.timings = {}
+
+        executors = {'thread': ThreadPoolExecutor(max_workers=self.max_threads, thread_name_prefix='stage')}
+
+        pending = dict(self.stages)
+        running = {}
+        start_time = time.time()
+
+        try:
+            while pending or running:
+                for name in [name for name, stage in pending.items() if all(value in values for value in stage.inputs)]:
+                    stage = pending.pop(name)
+                    self.timings[name] = {'ready': time.time() - start_time}
+                    if stage.executor not in executors:
+                        executors[stage.executor] = ProcessPoolExecutor(max_workers=self.max_processes, mp_context=process_pool_context())
+                    future = executors[stage.executor].submit(_run_stage, stage.function, {value: values[value] for value in stage.inputs})
+                    running[future] = stage
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage = running.pop(future)
+
+                    try:
+                        result, stage_start, stage_end = future.result()
+                    except Exception:
+                        print(f'''Stage '{stage.name}' failed''')
+                        raise
+                    self.timings[stage.name].update({'start': stage_start - start_time, 'end': stage_end - start_time})
+
+                    if len(stage.outputs) == 1:
+                        values[stage.outputs[0]] = result
+                    elif stage.outputs:
+                        if not isinstance(result, (tuple, list)) or len(result) != len(stage.outputs):
+                            count = len(result) if isinstance(result, (tuple, list)) else 1
+                            raise ValueError(f'''Stage '{stage.name}' returned {count} values for its {len(stage.outputs)} outputs: {', '.join(stage.outputs)}''')
+                        values.update(zip(stage.outputs, result))
+                    print(f'''Stage '{stage.name}' done in {self.timings[stage.name]['end'] - self.timings[stage.name]['start']:.2f}s''')
+        finally:
+            for executor in executors.values():
+                executor.shutdown(wait=True, cancel_futures=True)
+
+        return values
+
+    def critical_path(self):
+        """
+        Returns the names of the stages on the critical path of the last run, first to last: starting from the
+        stage that finished last, each step goes back to the input producer that finished last.
+        """
+        finished = [name for name, timing in self.timings.items() if 'end' in timing]
+        if not finished:
+            return []
+
+        path = [max(finished, key=lambda name: self.timings[name]['end'])]
+
+        while True:
+            inputs = [self.producers[value] for value in self.stages[path[-1]].inputs if value in self.producers]
+            if not inputs:
+                return path[::-1]
+            path.append(max(inputs, key=lambda name: self.timings[name]['end']))
+
+    def timing_report(self):
+        """
+        Formats the start, duration and wait of every stage of the last run, the critical path marked with '*'.
+        The wait is the time a stage spent ready but not started, waiting for a free worker.
+        """
+        critical_path = self.critical_path()
+        finished = {name: timing for name, timing in self.timings.items() if 'end' in timing}
+        total = max((timing['end'] for timing in finished.values()), default=0)
+
+        lines = [f'''{'':2}{'stage':<24} {'start (s)':>10} {'duration (s)':>13} {'wait (s)':>9}''']
+        for name, timing in sorted(finished.items(), key=lambda item: item[1]['start']):
+            lines.append(f'''{'*' if name in critical_path else '':2}{name:<24} {timing['start']:>10.2f} {timing['end'] - timing['start']:>13.2f} {timing['start'] - timing['ready']:>9.2f}''')
+
+        critical_time = sum(self.timings[name]['end'] - self.timings[name]['start'] for name in critical_path)
+        lines.append(f'''Total {total:.2f}s, critical path {' -> '.join(critical_path)} ({critical_time:.2f}s)''')
+        return '\n'.join(lines)
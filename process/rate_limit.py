@@ -0,0 +1,50 @@
+"""
+Token bucket rate limiting shared by threads and asyncio tasks.
+
+A bucket refills at a fixed rate up to its capacity. reserve takes a token and returns
+how long the caller has to wait before using it, so blocking code can time.sleep on it
+and coroutines can asyncio.sleep on it while drawing from the same bucket.
+"""
+
+import threading
+import time
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        """
+        Args:
+            rate (float): Tokens added per second.
+            capacity (float): Maximum number of tokens, i.e. the largest burst. Defaults to rate, at least 1.
+        """
+        if rate <= 0:
+            raise ValueError('rate must be positive.')
+
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1, rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens=1):
+        """
+        Takes tokens from the bucket, going into debt if it is short.
+
+        Returns:
+            float: Seconds to wait before the reserved tokens may be used.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            self.tokens -= tokens
+            return max(0.0, -self.tokens / self.rate)
+
+    def acquire(self, tokens=1):
+        """
+        Blocks until tokens may be used.
+        """
+        delay = self.reserve(tokens)
+        if delay:
+            time.sleep(delay)
+        return delay
@@ -0,0 +1,231 @@
+"""
+Data reduction helpers used by DataVisualizer to keep figures small when datasets are large.
+"""
+
+import numpy as np
+import pandas as pd
+
+DOWNSAMPLING_METHODS = ['lttb', 'minmax']
+
+
+def _numeric_axis(values):
+    # LTTB works on distances along the x-axis, so dates are mapped to nanoseconds, NaT
+    # becoming NaN as in _binning_axis, and non-numeric values to their position in the series
+    if pd.api.types.is_datetime64_any_dtype(values) or pd.api.types.is_numeric_dtype(values):
+        return _binning_axis(values, 'x')[0]
+    return np.arange(len(values), dtype=float)
+
+
+def _binning_axis(values, axis):
+    # Dates are binned on their nanoseconds, NaT becoming NaN. Returns the values and whether they are dates
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        if getattr(values.dt, 'tz', None) is not None:
+            values = values.dt.tz_convert(None)
+        numeric = values.astype('int64').to_numpy(dtype=float)
+        numeric[values.isna().to_numpy()] = np.nan
+        return numeric, True
+    if pd.api.types.is_numeric_dtype(values):
+        return values.to_numpy(dtype=float, na_value=np.nan), False
+    raise ValueError(f'''Cannot bin the {axis} values: expected numbers or dates, got {values.dtype}.''')
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Selects points with the Largest-Triangle-Three-Buckets algorithm.
+
+    The first and last points are always kept. The points in between are split into
+    n_out - 2 buckets, and from each bucket the point forming the largest triangle with
+    the previously selected point and the average of the next bucket is kept.
+
+    Args:
+        x (np.ndarray): Sorted x values.
+        y (np.ndarray): y values.
+        n_out (int): Number of points to keep.
+
+    Returns:
+        np.ndarray: Positions of the selected points, in ascending order.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+
+        if i == n_out - 3:
+            avg_x, avg_y = x[-1], y[-1]
+        else:
+            next_end = edges[i + 2]
+            avg_x = x[end:next_end].mean()
+            avg_y = y[end:next_end].mean()
+
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        indices[i + 1] = a
+
+    return indices
+
+
+def minmax_indices(y, n_out):
+    """
+    Selects the minimum and maximum of each bucket, which preserves spikes exactly.
+
+    Args:
+        y (np.ndarray): y values.
+        n_out (int): Number of points to keep (two per bucket).
+
+    Returns:
+        np.ndarray: Positions of the selected points, in ascending order.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 4:
+        return np.arange(n)
+
+    edges = np.linspace(0, n, n_out // 2 + 1).astype(np.int64)
+    indices = [0, n - 1]
+    for start, end in zip(edges[:-1], edges[1:]):
+        bucket = y[start:end]
+        indices.append(start + int(np.argmin(bucket)))
+        indices.append(start + int(np.argmax(bucket)))
+
+    return np.unique(indices)
+
+
+def downsample_series(dataframe, x, y, max_points, method='lttb'):
+    """
+    Reduces a line chart dataset to roughly max_points rows while preserving its shape.
+
+    Each y column is downsampled independently with its share of the budget, and the
+    union of the selected rows is returned so all series stay aligned on the same x values.
+
+    Args:
+        dataframe (pd.DataFrame): The dataset to plot.
+        x (str): The x-axis column. The index is used if None.
+        y (str or list): One or several y-axis columns. All numeric columns other than x are used if None.
+        max_points (int): Point budget for the whole chart.
+        method (str): 'lttb' or 'minmax'.
+
+    Returns:
+        pd.DataFrame: The selected rows, sorted by x.
+    """
+    if method not in DOWNSAMPLING_METHODS:
+        raise ValueError(f'''Unsupported downsampling method. Supported methods: {DOWNSAMPLING_METHODS}.''')
+
+    if len(dataframe) <= max_points:
+        return dataframe
+
+    if x is not None and not dataframe[x].is_monotonic_increasing:
+        dataframe = dataframe.sort_values(by=x, kind='stable')
+
+    x_values = _numeric_axis(dataframe[x] if x is not None else dataframe.index.to_series())
+    if y is None:
+        y_columns = [col for col in dataframe.columns if col != x and pd.api.types.is_numeric_dtype(dataframe[col])]
+    else:
+        y_columns = [y] if isinstance(y, str) else list(y)
+    budget = max(max_points // len(y_columns), 4)
+
+    selected = []
+    for column in y_columns:
+        # Points with a missing x or y are not drawn, so they are left out of the selection
+        y_values = dataframe[column].to_numpy(dtype=float, na_value=np.nan)
+        valid = np.flatnonzero(~(np.isnan(x_values) | np.isnan(y_values)))
+
+        if method == 'lttb':
+            chosen = lttb_indices(x_values[valid], y_values[valid], budget)
+        else:
+            chosen = minmax_indices(y_values[valid], budget)
+
+        selected.append(valid[chosen])
+
+    return dataframe.iloc[np.unique(np.concatenate(selected))]
+
+
+def bin_2d(x, y, weights=None, bins=100):
+    """
+    Aggregates scatter points into a regular 2D grid.
+
+    Args:
+        x (array-like): x values, numbers or dates.
+        y (array-like): y values, numbers or dates.
+        weights (array-like): Optional weight per point, e.g. the bubble size. Bins hold
+                              the sum of the weights instead of the point count.
+        bins (int or tuple): Number of bins along each axis, or (x_bins, y_bins).
+
+    Returns:
+        tuple: (z, x_centers, y_centers) where z[i, j] is the total for the cell at
+               y_centers[i], x_centers[j], ready to be passed to a heatmap. Centers of date
+               axes are dates.
+
+    Raises:
+        ValueError: If x or y is neither numeric nor dates.
+    """
+    x, x_dates = _binning_axis(x, 'x')
+    y, y_dates = _binning_axis(y, 'y')
+    valid = ~(np.isnan(x) | np.isnan(y))
+
+    if weights is not None:
+        weights = np.asarray(weights, dtype=float)
+        valid &= ~np.isnan(weights)
+        weights = weights[valid]
+
+    counts, x_edges, y_edges = np.histogram2d(x[valid], y[valid], bins=bins, weights=weights)
+
+    x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+    y_centers = (y_edges[:-1] + y_edges[1:]) / 2
+
+    if x_dates:
+        x_centers = x_centers.astype('int64').astype('datetime64[ns]')
+    if y_dates:
+        y_centers = y_centers.astype('int64').astype('datetime64[ns]')
+
+    return counts.T, x_centers, y_centers
+
+
+def top_n_with_other(dataframe, category, values, n, other_label='Other'):
+    """
+    Keeps the n largest categories and rolls every other category into a single row.
+
+    Rows are first summed per category, so the totals of the kept categories and of the
+    'Other' row are exact whatever the input cardinality. The top n are found with a
+    partial sort, which is linear in the number of categories. A category already named
+    other_label is never kept on its own, its rows are part of the rolled-up row.
+
+    Args:
+        dataframe (pd.DataFrame): The dataset to plot.
+        category (str): The category column.
+        values (str or list): One or several value columns. Categories are ranked by their total.
+        n (int): Number of categories to keep.
+        other_label (str): Category name of the rolled-up row.
+
+    Returns:
+        pd.DataFrame: At most n + 1 rows, the kept categories by decreasing total followed by 'Other'.
+    """
+    value_columns = [values] if isinstance(values, str) else list(values)
+
+    if dataframe[category].nunique(dropna=False) <= n:
+        return dataframe
+
+    grouped = dataframe.groupby(category, sort=False, dropna=False)[value_columns].sum()
+    totals = grouped.to_numpy(dtype=float, na_value=0).sum(axis=1)
+
+    # An existing other_label category is ranked last, so it is merged into the rolled-up row
+    candidates = np.flatnonzero(grouped.index != other_label)
+    top = candidates[np.argpartition(-totals[candidates], n - 1)[:n]]
+    top = top[np.argsort(-totals[top], kind='stable')]
+
+    rest = np.ones(len(grouped), dtype=bool)
+    rest[top] = False
+
+    other = grouped.iloc[rest].sum().to_frame().T
+    other.index = [other_label]
+
+    result = pd.concat([grouped.iloc[top], other])
+    result.index.name = category
+    return result.reset_index()
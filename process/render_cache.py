@@ -0,0 +1,224 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+cache_dir = os.path.join(os.path.dirname(__file__), 'data/cache/')
+
+INDEX_FILE = 'index.json'
+HTML_FILE = 'fragment.html'
+IMAGE_FILE = 'chart.png'
+META_FILE = 'meta.json'
+FIGURE_FILE = 'figure.json'
+
+
+def fingerprint_dataframe(dataframe):
+    """
+    Computes a content fingerprint of a dataframe.
+
+    The fingerprint covers column names, dtypes, index and every cell value, so two
+    dataframes share a fingerprint only if they would render the same chart.
+    """
+    hasher = hashlib.sha256()
+    hasher.update(json.dumps([str(col) for col in dataframe.columns]).encode('utf-8'))
+    hasher.update(json.dumps([str(dtype) for dtype in dataframe.dtypes]).encode('utf-8'))
+    hasher.update(pd.util.hash_pandas_object(dataframe, index=True).values.tobytes())
+    return hasher.hexdigest()
+
+
+def make_cache_key(kind, dataframe, params):
+    """
+    Builds a cache key from the dataset fingerprint and the render parameters.
+
+    Args:
+        kind (str): Artifact kind, e.g. 'chart' or 'summary_table'.
+        dataframe (pd.DataFrame): The dataset the artifact is rendered from.
+        params (dict): Every parameter that affects the rendered output.
+    """
+    hasher = hashlib.sha256()
+    hasher.update(kind.encode('utf-8'))
+    hasher.update(fingerprint_dataframe(dataframe).encode('utf-8'))
+    hasher.update(json.dumps(params, sort_keys=True, default=str).encode('utf-8'))
+    return hasher.hexdigest()
+
+
+class RenderCache:
+    """
+    Persistent, content-addressed cache for rendered chart and table artifacts.
+
+    Each entry lives in its own directory named after its key and holds the HTML
+    fragment and, for charts, the exported PNG and the figure JSON. An index file keeps entries in
+    least-recently-used order so the cache can be bounded by entry count and size.
+    The cache can be shared by threads rendering charts concurrently.
+
+    Hits only update the recency in memory. The index is written when entries are added or
+    evicted, and by flush or close, so a fully cached run does not rewrite it on every hit.
+    """
+
+    def __init__(self, cache_dir=cache_dir, max_entries=256, max_bytes=None):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.RLock()
+        self.index_changed = False
+
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+        self.index = self._load_index()
+
+    def _index_path(self):
+        return os.path.join(self.cache_dir, INDEX_FILE)
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def _load_index(self):
+        index = OrderedDict()
+        try:
+            with open(self._index_path(), 'r', encoding='utf-8') as file:
+                entries = json.load(file)
+        except (OSError, ValueError):
+            return index
+
+        for entry in entries:
+            if os.path.isdir(self._entry_dir(entry['key'])):
+                index[entry['key']] = entry
+        return index
+
+    def _save_index(self):
+        tmp_path = self._index_path() + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(list(self.index.values()), file)
+        os.replace(tmp_path, self._index_path())
+        self.index_changed = False
+
+    def flush(self):
+        """
+        Writes the recency of the entries read since the index was last written.
+        """
+        with self.lock:
+            if self.index_changed:
+                self._save_index()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get(self, key):
+        """
+        Returns the cached artifacts for a key, or None on a miss.
+
+        The result is a dict with the HTML fragment under 'html', the path of the
+        cached PNG under 'image_path' (None for artifacts without an image), the figure
+        JSON under 'figure_json' (None if not stored) and any metadata stored alongside
+        the artifact under 'meta'.
+        """
+        with self.lock:
+            return self._get(key)
+
+    def _get(self, key):
+        entry = self.index.get(key)
+        html_path = os.path.join(self._entry_dir(key), HTML_FILE)
+
+        if entry is None or not os.path.exists(html_path):
+            self.misses += 1
+            return None
+
+        with open(html_path, 'r', encoding='utf-8') as file:
+            html = file.read()
+
+        image_path = os.path.join(self._entry_dir(key), IMAGE_FILE)
+
+        meta = {}
+        meta_path = os.path.join(self._entry_dir(key), META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path, 'r', encoding='utf-8') as file:
+                meta = json.load(file)
+
+        figure_json = None
+        figure_path = os.path.join(self._entry_dir(key), FIGURE_FILE)
+        if os.path.exists(figure_path):
+            with open(figure_path, 'r', encoding='utf-8') as file:
+                figure_json = file.read()
+
+        entry['last_access'] = time.time()
+        self.index.move_to_end(key)
+        self.index_changed = True
+        self.hits += 1
+
+        return {
+            'html': html,
+            'image_path': image_path if os.path.exists(image_path) else None,
+            'figure_json': figure_json,
+            'meta': meta
+        }
+
+    def put(self, key, html, image_path=None, meta=None, figure_json=None):
+        """
+        Stores an HTML fragment, an optional PNG, an optional figure JSON and optional
+        JSON-serializable metadata under a key, evicting the least recently used entries
+        if the cache grows past its bounds.
+        """
+        with self.lock:
+            self._put(key, html, image_path, meta, figure_json)
+
+    def _put(self, key, html, image_path=None, meta=None, figure_json=None):
+        entry_dir = self._entry_dir(key)
+        if not os.path.exists(entry_dir):
+            os.makedirs(entry_dir)
+
+        with open(os.path.join(entry_dir, HTML_FILE), 'w', encoding='utf-8') as file:
+            file.write(html)
+
+        if image_path:
+            shutil.copyfile(image_path, os.path.join(entry_dir, IMAGE_FILE))
+
+        if meta:
+            with open(os.path.join(entry_dir, META_FILE), 'w', encoding='utf-8') as file:
+                json.dump(meta, file)
+
+        if figure_json:
+            with open(os.path.join(entry_dir, FIGURE_FILE), 'w', encoding='utf-8') as file:
+                file.write(figure_json)
+
+        size = sum(os.path.getsize(os.path.join(entry_dir, name)) for name in os.listdir(entry_dir))
+
+        self.index[key] = {'key': key, 'size': size, 'last_access': time.time()}
+        self.index.move_to_end(key)
+        self._evict()
+        self._save_index()
+
+    def _evict(self):
+        def over_budget():
+            if self.max_entries is not None and len(self.index) > self.max_entries:
+                return True
+            if self.max_bytes is not None and sum(entry['size'] for entry in self.index.values()) > self.max_bytes:
+                return True
+            return False
+
+        while self.index and over_budget():
+            key, _ = self.index.popitem(last=False)
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+    def clear(self):
+        with self.lock:
+            self._clear()
+
+    def _clear(self):
+        for key in list(self.index):
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+        self.index.clear()
+        self._save_index()
@@ -3,14 +3,50 @@ import logging
 import os, sys
 sys.path.insert(1, '/'.join(os.path.realpath(__file__).split('/')[0:-2]))
 
+from concurrent.futures import ThreadPoolExecutor
+
 from constants.configs import *
+from process.rate_limit import *
 from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
+from slack_sdk.http_retry.builtin_handlers import RateLimitErrorRetryHandler
+
+# Requests per second of each Slack Web API rate limit tier
+SLACK_TIER_RATES = {
+    1: 1 / 60,
+    2: 20 / 60,
+    3: 50 / 60,
+    4: 100 / 60
+}
+
+# files_upload_v2 calls files.getUploadURLExternal once per file, then files.completeUploadExternal once
+FILE_UPLOAD_TIER = 4
+
+# Files shared by one files_upload_v2 call
+MAX_FILES_PER_UPLOAD = 10
+
+# Retries of a request answered with 429, each after the Retry-After delay
+MAX_RATE_LIMIT_RETRIES = 3
 
 class SlackClient:
-    def __init__(self):
-        token = os.getenv('SLACK_APP_TOKEN')
-        self.client = WebClient(token=token)
+    """
+    Args:
+        token (str): Slack token. Defaults to the SLACK_APP_TOKEN environment variable.
+        client (WebClient): Optional client to use instead of one created from token and base_url. A rate limit
+                            retry handler is added to it unless it already has one.
+        base_url (str): Optional Slack API URL, e.g. of a local stub server.
+    """
+    def __init__(self, token=None, client=None, base_url=None):
+        token = token or os.getenv('SLACK_APP_TOKEN')
+        if client is None:
+            client = WebClient(token=token, base_url=base_url) if base_url else WebClient(token=token)
+        self.client = client
+        # A shared client keeps the handler added by the first SlackClient wrapping it
+        if not any(isinstance(handler, RateLimitErrorRetryHandler) for handler in self.client.retry_handlers):
+            self.client.retry_handlers.append(RateLimitErrorRetryHandler(max_retry_count=MAX_RATE_LIMIT_RETRIES))
+
+        # Slack limits each method per workspace and per minute, so one bucket per tier is shared by every channel
+        self.rate_limiters = {tier: TokenBucket(rate, capacity=max(1, rate * 60)) for tier, rate in SLACK_TIER_RATES.items()}
     
 
     def post_message(self, channel_id, message):
@@ -51,6 +87,71 @@ class SlackClient:
             logging.error(f"Error uploading file: {e.message}")
             return None
 
+    def upload_files(self, channel_id, file_paths, initial_comment=None):
+        """
+        Shares files in a channel with as few files_upload_v2 calls as possible, the message as the initial
+        comment of the first one.
+
+        Returns:
+            dict: 'file_ids', the IDs of the uploaded files, and 'error', the error that stopped the upload or None.
+                  Files uploaded before an error keep their IDs.
+        """
+        file_ids = []
+
+        for start in range(0, len(file_paths), MAX_FILES_PER_UPLOAD):
+            batch = file_paths[start:start + MAX_FILES_PER_UPLOAD]
+            file_uploads = [{'file': path, 'filename': os.path.basename(path), 'title': os.path.basename(path)} for path in batch]
+            self.rate_limiters[FILE_UPLOAD_TIER].acquire(len(batch) + 1)
+
+            try:
+                response = self.client.files_upload_v2(
+                    channel=channel_id,
+                    file_uploads=file_uploads,
+                    initial_comment=initial_comment if start == 0 else None
+                )
+            except Exception as e:
+                logging.error(f"Error uploading files to {channel_id}: {e}")
+                return {'file_ids': file_ids, 'error': str(e)}
+
+            file_ids += [file['id'] for file in response['files']]
+
+        return {'file_ids': file_ids, 'error': None}
+
+    def _deliver(self, channel_id, file_paths, message):
+        if file_paths:
+            return self.upload_files(channel_id, file_paths, message)
+
+        # Without files the message is posted on its own
+        if message and self.post_message(channel_id, message) is None:
+            return {'file_ids': [], 'error': f'Error posting message to {channel_id}'}
+        return {'file_ids': [], 'error': None}
+
+    def deliver_reports(self, files_by_channel, message=None, max_workers=4):
+        """
+        Shares each channel's files, with the message, in every channel concurrently. A channel without files
+        gets the message alone, and a channel failing does not stop the others.
+
+        Args:
+            files_by_channel (dict): File paths keyed by channel ID.
+            message (str): Optional message posted with the files.
+            max_workers (int): Number of channels delivered at the same time.
+
+        Returns:
+            dict: The result of upload_files of each channel, keyed by channel ID.
+        """
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {channel_id: executor.submit(self._deliver, channel_id, list(file_paths or []), message)
+                       for channel_id, file_paths in files_by_channel.items()}
+
+            deliveries = {}
+            for channel_id, future in futures.items():
+                try:
+                    deliveries[channel_id] = future.result()
+                except Exception as e:
+                    logging.error(f"Error delivering reports to {channel_id}: {e}")
+                    deliveries[channel_id] = {'file_ids': [], 'error': str(e)}
+            return deliveries
+
     def delete_file(self, file_id):
         try:
             response = self.client.files_delete(
@@ -0,0 +1,275 @@
+"""
+Lightweight HTML renderer for summary tables.
+
+The pandas Styler writes an inline style for every highlighted cell and formats cells one
+at a time, which gets slow for tables with thousands of rows. This renderer formats and
+escapes whole columns at once, highlights cells with CSS classes declared once per table,
+and never modifies the dataframe it is given. Data bars are placed and formatted exactly
+like those of Styler.bar, so both renderers draw the same tables.
+"""
+
+import hashlib
+import html
+
+import numpy as np
+import pandas as pd
+
+# Default bar color of Styler.bar
+DEFAULT_BAR_COLOR = '#d65f5f'
+
+# Replacements of html.escape, '&' first so the entities are not escaped again
+_HTML_ESCAPES = [('&', '&amp;'), ('<', '&lt;'), ('>', '&gt;'), ('"', '&quot;'), ("'", '&#x27;')]
+
+
+def _format_numbers(values, rounded_by):
+    # Vectorized equivalent of '{:,.Nf}'.format, the Styler format of numeric columns. The
+    # digits are computed on integers and written right aligned into a character matrix, whose
+    # rows are then read as strings. Scaling can misplace values next to a rounding tie, which
+    # printf rounds on their exact binary value, so those and the values too large for exact
+    # integers are formatted one at a time
+    scaled = np.abs(values) * 10.0 ** rounded_by
+    with np.errstate(invalid='ignore'):
+        exact = (scaled < 2 ** 53) & (np.abs(scaled - np.floor(scaled) - 0.5) > np.maximum(scaled, 1) * 1e-12)
+    integer, fraction = np.divmod(np.where(exact, np.rint(scaled), 0).astype(np.int64), 10 ** rounded_by)
+
+    n_digits = 1 + sum((integer >= 10 ** k).astype(np.int64) for k in range(1, 16))
+    max_digits = n_digits.max()
+    point = 1 + max_digits + (max_digits - 1) // 3
+    chars = np.full((len(values), point + (rounded_by + 1 if rounded_by else 0)), ord(' '), dtype=np.uint32)
+
+    for k in range(max_digits):
+        column = point - 1 - k - k // 3
+        chars[:, column] = np.where(k < n_digits, ord('0') + integer % 10, ord(' '))
+        integer //= 10
+        if k % 3 == 2:
+            chars[:, column - 1] = np.where(k + 1 < n_digits, ord(','), ord(' '))
+
+    # printf keeps the sign of negative values rounded to zero, e.g. '-0'
+    negative = np.flatnonzero(np.signbit(values) & exact)
+    chars[negative, point - 1 - n_digits[negative] - (n_digits[negative] - 1) // 3] = ord('-')
+
+    if rounded_by:
+        chars[:, point] = ord('.')
+        for k in range(rounded_by):
+            chars[:, point + rounded_by - k] = ord('0') + fraction % 10
+            fraction //= 10
+
+    formatted = np.char.lstrip(chars.view(f'U{chars.shape[1]}').ravel()).astype(object)
+    formatted[~exact] = [f'{{:,.{rounded_by}f}}'.format(value) for value in values[~exact]]
+    return formatted
+
+
+def _format_column(series, rounded_by):
+    if pd.api.types.is_bool_dtype(series):
+        return series.astype(str).to_numpy(dtype=object)
+
+    missing = series.isna().to_numpy()
+    formatted = np.full(len(series), '', dtype=object)
+
+    if pd.api.types.is_numeric_dtype(series):
+        values = series.to_numpy(dtype=float, na_value=np.nan)[~missing]
+        if len(values):
+            formatted[~missing] = _format_numbers(values, rounded_by)
+    elif pd.api.types.is_datetime64_any_dtype(series):
+        formatted[~missing] = series[~missing].dt.strftime('%Y-%m-%d').to_numpy(dtype=object)
+    else:
+        # Missing values, e.g. None in object columns, render as empty cells like in the Styler
+        text = series[~missing].astype(str).to_numpy(dtype=str)
+        for character, entity in _HTML_ESCAPES:
+            text = np.char.replace(text, character, entity)
+        formatted[~missing] = text
+
+    return formatted
+
+
+def _bar_extents(series):
+    # Styler.bar with align='mid': bars grow from zero, the left edge if every value is
+    # positive and the right edge if every value is negative. Returns the start and end of
+    # each bar as fractions of the cell width, NaN for missing values
+    values = pd.to_numeric(series, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    if not np.isfinite(values).any():
+        return np.full(len(values), np.nan), np.full(len(values), np.nan)
+
+    left, right = np.nanmin(values), np.nanmax(values)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if left >= 0:
+            start = np.zeros(len(values))
+            end = values / right
+        elif right <= 0:
+            start = (values - left) / -left
+            end = np.ones(len(values))
+        else:
+            position = (values - left) / (right - left)
+            zero = -left / (right - left)
+            start = np.where(values < 0, position, zero)
+            end = np.where(values < 0, zero, position)
+
+    missing = np.isnan(values)
+    start[missing] = np.nan
+    end[missing] = np.nan
+    return start, end
+
+
+def _bar_css(start, end, color):
+    # Same gradient as Styler.bar, so the rendered bars are identical
+    css = 'background: linear-gradient(90deg,'
+    if start > 0:
+        css += f' transparent {start * 100:.1f}%, {color} {start * 100:.1f}%,'
+    return css + f' {color} {end * 100:.1f}%, transparent {end * 100:.1f}%)'
+
+
+def _bar_classes(columns, color, n_rows):
+    """
+    Assigns every highlighted cell a bar class, cells with the same bar sharing a class.
+
+    Args:
+        columns (dict): Highlighted columns keyed by name. Bars are scaled on the whole columns, as in Styler.bar.
+        color (str): Color of the bars.
+        n_rows (int): Number of rows rendered, the first ones of the columns.
+
+    Returns:
+        tuple: (classes, rules) where classes maps each column name to the class of each of its
+               cells, and rules maps each bar class to its CSS.
+    """
+    classes = {}
+    rules = {}
+
+    for name, series in columns.items():
+        start, end = _bar_extents(series)
+        start, end = start[:n_rows], end[:n_rows]
+        drawn = end > start
+        cell_classes = np.full(len(start), 'bar', dtype=object)
+
+        if drawn.any():
+            extents, positions = np.unique(np.column_stack([start[drawn], end[drawn]]), axis=0, return_inverse=True)
+            names = []
+            for bar_start, bar_end in extents:
+                css = _bar_css(bar_start, bar_end, color)
+                rules.setdefault(css, f'bar-{len(rules)}')
+                names.append('bar ' + rules[css])
+            cell_classes[drawn] = np.array(names, dtype=object)[positions.ravel()]
+
+        classes[name] = cell_classes
+
+    return classes, {bar_class: css for css, bar_class in rules.items()}
+
+
+def _table_styles(table_id, highlight_text_color, bar_rules, page_size):
+    rules = [
+        f'#{table_id} th {{ padding: 10px; text-align: center; }}',
+        f'#{table_id} td {{ padding: 8px; }}',
+        f'#{table_id} td.highlight {{ color: {highlight_text_color}; }}',
+        f'#{table_id} td.bar {{ width: 10em; }}'
+    ]
+
+    for bar_class, css in bar_rules.items():
+        rules.append(f'#{table_id} td.{bar_class} {{ {css}; }}')
+
+    if page_size:
+        # Rows past the first page stay hidden until the pager script takes over
+        rules.append(f'#{table_id}.paginated tbody tr:nth-child(n+{page_size + 1}) {{ display: none; }}')
+
+    return '<style>' + '\n'.join(rules) + '</style>'
+
+
+def _pager(table_id, page_size, n_rows):
+    n_pages = -(-n_rows // page_size)
+    return f'''
+        <div class="table-pager" id="{table_id}-pager">
+            <button type="button" data-step="-1">&laquo;</button>
+            <span class="table-page-label">1 / {n_pages}</span>
+            <button type="button" data-step="1">&raquo;</button>
+        </div>
+        <script type="text/javascript">
+        (function () {{
+            var table = document.getElementById("{table_id}");
+            var pager = document.getElementById("{table_id}-pager");
+            var label = pager.querySelector(".table-page-label");
+            var rows = table.tBodies[0].rows;
+            var pageSize = {page_size}, pageCount = {n_pages}, page = 0;
+
+            function show(newPage) {{
+                page = Math.max(0, Math.min(pageCount - 1, newPage));
+                for (var i = 0; i < rows.length; i++) {{
+                    rows[i].style.display = (i >= page * pageSize && i < (page + 1) * pageSize) ? "" : "none";
+                }}
+                table.classList.remove("paginated");
+                label.textContent = (page + 1) + " / " + pageCount;
+            }}
+
+            var buttons = pager.querySelectorAll("button");
+            for (var j = 0; j < buttons.length; j++) {{
+                buttons[j].addEventListener("click", function (event) {{
+                    show(page + parseInt(event.currentTarget.getAttribute("data-step"), 10));
+                }});
+            }}
+        }})();
+        </script>
+    '''
+
+
+def render_table_html(dataframe, highlight_columns=None, highlight_column_color=None, highlight_text_color='#FFFFFF',
+                      rounded_by=0, max_rows=None, page_size=None, table_id=None):
+    """
+    Renders a dataframe as an HTML table without going through the pandas Styler.
+
+    Args:
+        dataframe (pd.DataFrame): The table to render. It is not modified.
+        highlight_columns (list): Columns drawn with data bars and the highlight text color.
+        highlight_column_color (str): Color of the data bars. Defaults to the Styler.bar color.
+        highlight_text_color (str): Text color of the highlighted columns.
+        rounded_by (int): Number of decimals of numeric columns.
+        max_rows (int): Only render the first max_rows rows, with a note giving the full row count.
+        page_size (int): Show the rows page by page, page_size rows at a time.
+        table_id (str): HTML ID of the table. Defaults to one derived from the rendered contents, so the
+                        same table always renders to the same HTML.
+
+    Returns:
+        str: The table HTML, including its scoped stylesheet and pager.
+    """
+    highlight_columns = [col for col in highlight_columns or [] if col in dataframe.columns]
+    n_total = len(dataframe)
+    n_rows = min(n_total, max_rows) if max_rows is not None else n_total
+
+    bar_classes, bar_rules = _bar_classes({col: dataframe[col] for col in highlight_columns}, highlight_column_color or DEFAULT_BAR_COLOR, n_rows)
+    dataframe = dataframe.iloc[:n_rows]
+
+    header = ''.join(f'<th>{html.escape(str(col))}</th>' for col in dataframe.columns)
+
+    row_html = pd.Series('<tr>', index=range(len(dataframe)), dtype=object)
+    for col in dataframe.columns:
+        cells = _format_column(dataframe[col], rounded_by)
+
+        if col in bar_classes:
+            row_html = row_html + ('<td class="highlight ' + bar_classes[col] + '">') + cells + '</td>'
+        else:
+            row_html = row_html + '<td>' + cells + '</td>'
+
+    body = '\n'.join((row_html + '</tr>').tolist())
+
+    paginated = page_size is not None and len(dataframe) > page_size
+
+    if table_id is None:
+        hasher = hashlib.sha256()
+        for part in [header, body, highlight_text_color, str(sorted(bar_rules.items())), str(page_size if paginated else None), str(n_total)]:
+            hasher.update(part.encode('utf-8'))
+        table_id = f'table-{hasher.hexdigest()[:12]}'
+
+    table_classes = 'table table-striped' + (' paginated' if paginated else '')
+
+    table_html = f'''{_table_styles(table_id, highlight_text_color, bar_rules, page_size if paginated else None)}
+        <table id="{table_id}" class="{table_classes}">
+            <thead><tr>{header}</tr></thead>
+            <tbody>
+{body}
+            </tbody>
+        </table>'''
+
+    if paginated:
+        table_html += _pager(table_id, page_size, len(dataframe))
+
+    if len(dataframe) < n_total:
+        table_html += f'<p class="table-note">Showing the first {len(dataframe):,} of {n_total:,} rows.</p>'
+
+    return table_html
@@ -1,9 +1,272 @@
-import os 
+import os, sys
+sys.path.insert(1, '/'.join(os.path.realpath(__file__).split('/')[0:-2]))
+
+import hashlib
+import html
+import io
+import json
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
 from bs4 import BeautifulSoup
+from bs4.dammit import EntitySubstitution
+from bs4.formatter import HTMLFormatter
 import uuid
 import pandas as pd
 
-def extract(input, is_file=True, selectors=None):
+from process.embedding import *
+from process.figure_localization import *
+from process.workers import process_pool_context
+
+def normalize_text(text):
+    return ' '.join(text.split())
+
+def segment_id(text, context=None):
+    """
+    Derives a stable segment ID from the normalized text of a segment and an optional context key,
+    so the same text gets the same ID in every run and in every place it appears.
+    """
+    key = normalize_text(text) if context is None else f'{context}\x1f{normalize_text(text)}'
+    return 'seg-' + hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+
+# Elements without content or end tag
+VOID_ELEMENTS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param', 'source', 'track', 'wbr'}
+
+# Start tags that implicitly close an open element, for documents that leave them open
+_P_CLOSERS = {'address', 'article', 'aside', 'blockquote', 'div', 'dl', 'fieldset', 'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6'
+              , 'header', 'hr', 'main', 'nav', 'ol', 'p', 'pre', 'section', 'table', 'ul'}
+IMPLIED_END_TAGS = {
+    'p': _P_CLOSERS,
+    'li': {'li'},
+    'dt': {'dt', 'dd'},
+    'dd': {'dt', 'dd'},
+    'td': {'td', 'th', 'tr'},
+    'th': {'td', 'th', 'tr'},
+    'tr': {'tr'},
+    'option': {'option'}
+}
+
+# Elements whose content is passed through without being read
+RAW_TEXT_ELEMENTS = {'script', 'style'}
+
+EXTRACT_CHUNK_SIZE = 1 << 20
+
+# Matched elements carry their segment ID in this attribute. Elements with the same text share a
+# segment ID, so it cannot be their id, which must stay unique and keeps its original value
+SEGMENT_ID_ATTRIBUTE = 'data-segment-id'
+
+# Chart payloads list the segment IDs of their labels in this attribute, in figure_text_fields order
+SEGMENT_IDS_ATTRIBUTE = 'data-segment-ids'
+
+class SegmentExtractor(HTMLParser):
+    """
+    Single-pass extractor used by extract.
+
+    The document is copied to output as it is parsed, with every matched element given its segment
+    ID in the SEGMENT_ID_ATTRIBUTE attribute. Script and style content is copied without being collected, except for chart
+    payloads whose labels are extracted too. Only the output of matched elements and chart payloads
+    is held back, until their segment IDs are known, so memory grows with the text segments and the
+    largest payload, not with the document.
+    """
+
+    def __init__(self, output, selectors, context=None, chart_labels=True):
+        # Character references are kept as written so unmatched content is copied unchanged
+        super().__init__(convert_charrefs=False)
+        self.output = output
+        self.tags = set(selectors.get('tags', []))
+        self.classes = set(selectors.get('classes', []))
+        self.ids = set(selectors.get('ids', []))
+        self.context = context
+        self.chart_labels = chart_labels
+
+        self.segments = {}
+        self.open_elements = []
+        self.open_segments = []
+        self.pending = []
+        self.text = []
+        self.seen_ids = set()
+        self.in_raw_text = False
+        self.payload = None
+
+    def _matches(self, tag, attrs):
+        if tag in self.tags:
+            return True
+
+        attributes = dict(attrs)
+        if self.classes and not self.classes.isdisjoint((attributes.get('class') or '').split()):
+            return True
+
+        # Like soup.find(id=...), only the first element with a selected ID matches
+        element_id = attributes.get('id')
+        if element_id in self.ids and element_id not in self.seen_ids:
+            self.seen_ids.add(element_id)
+            return True
+        return False
+
+    def _write(self, chunk):
+        if self.open_segments or self.payload is not None:
+            self.pending.append(chunk)
+        else:
+            self.output.write(chunk)
+
+    def _flush_pending(self):
+        if not self.open_segments and self.payload is None:
+            for chunk in self.pending:
+                self.output.write(chunk if isinstance(chunk, str) else self._start_tag(chunk))
+            self.pending = []
+
+    def _flush_text(self):
+        # Text is collected in runs so a string split by character references is stripped as a whole
+        if self.text:
+            string = ''.join(self.text).strip()
+            self.text = []
+            if string:
+                for segment in self.open_segments:
+                    segment['strings'].append(string)
+
+    def _close_segment(self, segment):
+        text = ''.join(segment['strings'])
+        if text:
+            segment['attribute'] = (SEGMENT_ID_ATTRIBUTE, segment_id(text, self.context))
+            self.segments.setdefault(segment['attribute'][1], {'id': segment['attribute'][1], 'content': text})
+        self.open_segments.remove(segment)
+        self._flush_pending()
+
+    def _close_payload(self, payload):
+        try:
+            figure = json.loads(''.join(payload['strings']))
+        except ValueError:
+            figure = None
+
+        if isinstance(figure, dict):
+            fields = figure_text_fields(figure)
+            for _, text in fields:
+                self.segments.setdefault(segment_id(text, self.context), {'id': segment_id(text, self.context), 'content': text})
+            if fields:
+                payload['attribute'] = (SEGMENT_IDS_ATTRIBUTE, ' '.join(segment_id(text, self.context) for _, text in fields))
+
+        self.payload = None
+        self._flush_pending()
+
+    @staticmethod
+    def _start_tag(segment):
+        if segment['attribute'] is None:
+            return segment['raw']
+
+        name, value = segment['attribute']
+        attributes = [(key, item) for key, item in segment['attrs'] if key != name] + [(name, value)]
+        return '<' + segment['tag'] + ''.join(
+            f' {name}' if value is None else f' {name}="{html.escape(value)}"' for name, value in attributes
+        ) + '>'
+
+    def handle_starttag(self, tag, attrs):
+        self._flush_text()
+
+        # Implied end tags are written out, so the output reads the same with any HTML parser
+        while self.open_elements and tag in IMPLIED_END_TAGS.get(self.open_elements[-1][0], ()):
+            self._end_element(*self.open_elements.pop())
+
+        segment = None
+        if tag == 'script' and self.chart_labels and 'chart-payload' in (dict(attrs).get('class') or '').split():
+            segment = {'kind': 'payload', 'tag': tag, 'attrs': attrs, 'raw': self.get_starttag_text(), 'strings': [], 'attribute': None}
+            self.pending.append(segment)
+            self.payload = segment
+        elif tag not in VOID_ELEMENTS and self._matches(tag, attrs):
+            segment = {'kind': 'text', 'tag': tag, 'attrs': attrs, 'raw': self.get_starttag_text(), 'strings': [], 'attribute': None}
+            self.pending.append(segment)
+            self.open_segments.append(segment)
+        else:
+            self._write(self.get_starttag_text())
+
+        if tag not in VOID_ELEMENTS:
+            self.open_elements.append((tag, segment))
+            self.in_raw_text = tag in RAW_TEXT_ELEMENTS
+
+    def handle_startendtag(self, tag, attrs):
+        self._flush_text()
+        self._write(self.get_starttag_text())
+
+    def _end_element(self, tag, segment):
+        self._write(f'</{tag}>')
+        if segment is None:
+            return
+        if segment['kind'] == 'payload':
+            self._close_payload(segment)
+        else:
+            self._close_segment(segment)
+
+    def handle_endtag(self, tag):
+        self._flush_text()
+        self.in_raw_text = False
+
+        open_tags = [open_tag for open_tag, _ in self.open_elements]
+        if tag not in open_tags:
+            self._write(f'</{tag}>')
+            return
+
+        # Elements left open inside the closed one are closed with it
+        position = len(open_tags) - 1 - open_tags[::-1].index(tag)
+        for open_tag, segment in reversed(self.open_elements[position:]):
+            self._end_element(open_tag, segment)
+        del self.open_elements[position:]
+
+    def handle_data(self, data):
+        self._write(data)
+        if self.payload is not None:
+            self.payload['strings'].append(data)
+        elif self.open_segments and not self.in_raw_text:
+            self.text.append(data)
+
+    def handle_entityref(self, name):
+        self.handle_reference(f'&{name};')
+
+    def handle_charref(self, name):
+        self.handle_reference(f'&#{name};')
+
+    def handle_reference(self, reference):
+        self._write(reference)
+        if self.open_segments and not self.in_raw_text:
+            self.text.append(html.unescape(reference))
+
+    def handle_comment(self, data):
+        self._flush_text()
+        self._write(f'<!--{data}-->')
+
+    def handle_decl(self, decl):
+        self._write(f'<!{decl}>')
+
+    def handle_pi(self, data):
+        self._write(f'<?{data}>')
+
+    def unknown_decl(self, data):
+        self._write(f'<![{data}]>')
+
+    def close(self):
+        super().close()
+        self._flush_text()
+        for _, segment in reversed(self.open_elements):
+            if segment is not None and segment['kind'] == 'payload':
+                self._close_payload(segment)
+            elif segment is not None:
+                self._close_segment(segment)
+        self.open_elements = []
+
+def extract_stream(input_file, output_file, selectors, context=None, chart_labels=True):
+    """
+    Extracts text segments from an HTML file object in a single pass, writing the document with
+    the segment IDs set to output_file as it goes.
+
+    Returns:
+        list of dict: List containing dictionaries with unique IDs and text content.
+    """
+    extractor = SegmentExtractor(output_file, selectors, context, chart_labels)
+    for chunk in iter(lambda: input_file.read(EXTRACT_CHUNK_SIZE), ''):
+        extractor.feed(chunk)
+    extractor.close()
+    return list(extractor.segments.values())
+
+def extract(input, is_file=True, selectors=None, return_template=False, context=None, chart_labels=True):
     """
     Extracts text from specified HTML elements identified by CSS selectors.
     
@@ -11,53 +274,42 @@ def extract(input, is_file=True, selectors=None):
         input (str): Either a path to the HTML file or an HTML string.
         is_file (bool): Flag indicating whether the input is a file path (True) or HTML string (False).
         selectors (dict): Dictionary where each key-value pair represents the type ('tag', 'class', 'id') and their respective list of names.
+                          All selectors are evaluated in one pass, and an element matched by several of them is extracted once.
+        return_template (bool): Also return the modified HTML compiled into a SegmentedTemplate.
+        context (str): Optional key hashed with the text, to translate the same text differently in different reports.
+        chart_labels (bool): Also extract the titles, axis titles, legends and hover labels of the chart payloads
+                             embedded by the 'shared' and 'inline' embed modes.
     
     Returns:
-        list of dict: List containing dictionaries with unique IDs and text content.
+        list of dict: List containing dictionaries with unique IDs and text content. Elements with the same
+                      normalized text share one ID and one entry.
     """
 
     if not selectors:
         raise ValueError("The 'selectors' parameter is required and cannot be empty.")
 
-    # Load HTML content from file or string
+    output = io.StringIO()
+
+    # Read HTML content from file or string
     if is_file:
         with open(input, 'r', encoding='utf-8') as file:
-            html_content = file.read()
+            all_data = extract_stream(file, output, selectors, context, chart_labels)
     else:
-        html_content = input
-
-    soup = BeautifulSoup(html_content, 'lxml')
-    all_data = []
-
-    # Process each selector type provided
-    for selector_type, values in selectors.items():
-        if selector_type in ['tags', 'classes', 'ids']:
-            elements = []
-            if selector_type == 'tags':
-                elements = soup.find_all(values)
-            elif selector_type == 'classes':
-                elements = soup.find_all(class_=values)
-            elif selector_type == 'ids':
-                elements = [soup.find(id=value) for value in values if soup.find(id=value)]
-
-            for element in elements:
-                if element:
-                    text = element.get_text(strip=True)
-                    if text:
-                        unique_id = str(uuid.uuid4())
-                        all_data.append({'id': unique_id, 'content': text})
-                        # Add or update the 'id' attribute in the HTML element
-                        element['id'] = unique_id
+        all_data = extract_stream(io.StringIO(input), output, selectors, context, chart_labels)
 
     # Return the data and the modified HTML
-    return all_data, str(soup)
+    modified_html = output.getvalue()
+    if return_template:
+        return all_data, modified_html, SegmentedTemplate(modified_html, [item['id'] for item in all_data])
+    return all_data, modified_html
 
 def save_to_csv(data, file_name):
     df = pd.DataFrame(data)
     df.to_csv(file_name, index=False, encoding='utf-8')
 
 def load_translations_by_language(translated_text_path, target_languages):
-    translations_df = pd.read_csv(translated_text_path)
+    # Only the ID and target language columns are parsed
+    translations_df = pd.read_csv(translated_text_path, usecols=lambda column: column == 'id' or column in target_languages)
     language_dictionaries = {}
     for language in target_languages:
         if language in translations_df.columns:
@@ -67,48 +319,337 @@ def load_translations_by_language(translated_text_path, target_languages):
             print(f"Warning: {language} column not found in CSV.")
     return language_dictionaries
 
-def update_html_with_translations(html_content, translations_dict):
+def index_elements_by_segment_id(soup):
+    """
+    Maps every segment ID of a parsed document to the list of elements carrying it, in a single traversal.
+    """
+    elements_by_id = {}
+    for element in soup.find_all(attrs={SEGMENT_ID_ATTRIBUTE: True}):
+        elements_by_id.setdefault(element[SEGMENT_ID_ATTRIBUTE], []).append(element)
+    return elements_by_id
+
+def payload_fields(payload_text, segment_ids):
+    """
+    Parses a chart payload and pairs its text fields with the segment IDs written by extract.
+
+    Returns:
+        tuple: The figure and its (path, text, segment ID) fields.
+    """
+    figure = json.loads(payload_text)
+    return figure, [(path, text, field_id) for (path, text), field_id in zip(figure_text_fields(figure), segment_ids.split())]
+
+def localize_payload(figure, fields, translations_dict):
+    """
+    Returns the figure with the translations of its labels, and whether any label changed.
+    """
+    texts = {}
+    for _, text, field_id in fields:
+        translation = translations_dict.get(field_id)
+        if translation is not None and pd.notna(translation):
+            texts[text] = str(translation)
+    return localize_figure(figure, [(path, text) for path, text, _ in fields], texts)
+
+def update_html_with_translations(html_content, translations_dict, images=None):
+    """
+    Args:
+        images (dict): Optional image URIs keyed by chart element ID, replacing the chart placeholders.
+    """
     soup = BeautifulSoup(html_content, 'html.parser')
+    elements_by_id = index_elements_by_segment_id(soup)
+    payloads = soup.find_all('script', attrs={SEGMENT_IDS_ATTRIBUTE: True})
+    label_ids = {field_id for payload in payloads for field_id in payload[SEGMENT_IDS_ATTRIBUTE].split()}
 
     # Iterate over each item in the translations dictionary
     for element_id, translation in translations_dict.items():
-        # Find element by ID
-        element = soup.find(id=element_id)
-        if element:
+        # Find the elements of the segment by ID
+        elements = elements_by_id.get(element_id)
+        if elements:
             # Check if translation is not NaN and is a string
             if pd.notna(translation):
-                # Set the text of the element to the translation
-                element.string = str(translation)
+                # Set the text of every occurrence to the translation
+                for element in elements:
+                    element.string = str(translation)
             else:
                 print(f"No valid translation available for element with ID {element_id}. Skipping...")
-        else:
+        elif element_id not in label_ids:
             print(f"Element with ID {element_id} not found in the HTML.")
 
+    # Chart labels are translated in the figure payloads
+    for payload in payloads:
+        figure, changed = localize_payload(*payload_fields(payload.string, payload[SEGMENT_IDS_ATTRIBUTE]), translations_dict)
+        if changed:
+            payload.string = json_script_text(figure)
+
+    for placeholder in soup.find_all('img', class_='chart-placeholder'):
+        if placeholder.parent.get('id') in (images or {}):
+            placeholder['src'] = images[placeholder.parent['id']]
+
     # Convert the modified soup object back to a string
     updated_html_content = str(soup)
     return updated_html_content
 
-def create_translated_html_files(source_html_path, translations_csv_path, output_directory, target_languages):
+class SegmentedTemplate:
+    """
+    An HTML document compiled once into static chunks and translatable slots, so each language
+    is rendered by joining strings instead of parsing and serializing the document again.
+
+    Rendering gives the same output as update_html_with_translations. Every occurrence of a
+    segment is a slot that keeps the original content of its element for languages without a
+    translation, and slots nested in another slot are only used when the outer one is not translated.
+    Chart payloads are parsed once and patched per language, and the source of chart placeholder
+    images is a slot of its own.
+    """
+
+    def __init__(self, html_content, segment_ids):
+        """
+        Args:
+            html_content (str): The source HTML, as written by extract.
+            segment_ids (list): Segment IDs of the elements that can be translated.
+        """
+        soup = BeautifulSoup(html_content, 'html.parser')
+        segment_ids = set(segment_ids)
+        self.source_length = len(html_content)
+
+        def is_slot(element):
+            if element.get(SEGMENT_ID_ATTRIBUTE) in segment_ids:
+                return True
+            if element.has_attr(SEGMENT_IDS_ATTRIBUTE):
+                return not segment_ids.isdisjoint(element[SEGMENT_IDS_ATTRIBUTE].split())
+            # Sources with quotes would be quoted differently, they are left as they are
+            return element.name == 'img' and 'chart-placeholder' in element.get('class', []) and '"' not in element.get('src', '"')
+
+        slot_elements = soup.find_all(is_slot)
+
+        token = uuid.uuid4().hex
+        raw_text_tags = HTMLFormatter.REGISTRY['minimal'].cdata_containing_tags
+        self.slots = []
+
+        # Elements are replaced by a marker from the last one in document order, so the markers of
+        # nested slots are already in place when the content of the slot around them is saved
+        for element in reversed(slot_elements):
+            marker_text = f'{token}:{len(self.slots)};'
+
+            if element.name == 'img':
+                self.slots.append({'image': element.parent.get('id'), 'fallback': EntitySubstitution.substitute_xml(element['src'])})
+                element['src'] = marker_text
+                continue
+
+            slot = {'raw': element.name in raw_text_tags, 'fallback': element.decode_contents()}
+            if element.get(SEGMENT_ID_ATTRIBUTE) in segment_ids:
+                slot['id'] = element[SEGMENT_ID_ATTRIBUTE]
+            else:
+                slot['figure'], slot['fields'] = payload_fields(element.string, element[SEGMENT_IDS_ATTRIBUTE])
+                slot['target'] = element.get('data-target')
+            self.slots.append(slot)
+            element.string = marker_text
+
+        marker = re.compile(f'{token}:(\\d+);')
+        self.parts = self._split(marker, str(soup))
+        for slot in self.slots:
+            slot['fallback'] = self._split(marker, slot['fallback'])
+
+        pool_element = soup.find(id=POOL_ELEMENT_ID)
+        self.pool_text = pool_element.string if pool_element else None
+
+        self.slot_index = {}
+        self.image_index = {}
+        for index, slot in enumerate(self.slots):
+            if 'image' in slot:
+                self.image_index.setdefault(slot['image'], []).append(index)
+            elif 'figure' in slot:
+                for field_id in dict.fromkeys(field_id for _, _, field_id in slot['fields']):
+                    self.slot_index.setdefault(field_id, []).append(index)
+            else:
+                self.slot_index.setdefault(slot['id'], []).append(index)
+
+    @staticmethod
+    def _split(marker, text):
+        # re.split puts the captured slot numbers at odd positions
+        return [int(piece) if position % 2 else piece for position, piece in enumerate(marker.split(text)) if position % 2 or piece]
+
+    def _render_parts(self, parts, translated, output):
+        for part in parts:
+            if isinstance(part, str):
+                output.append(part)
+            elif part in translated:
+                output.append(translated[part])
+            else:
+                self._render_parts(self.slots[part]['fallback'], translated, output)
+
+    def localized_figures(self, translations_dict):
+        """
+        Returns the chart figures whose labels are changed by translations_dict, keyed by slot.
+        """
+        localized = {}
+        for index, slot in enumerate(self.slots):
+            if 'figure' in slot:
+                figure, changed = localize_payload(slot['figure'], slot['fields'], translations_dict)
+                if changed:
+                    localized[index] = figure
+        return localized
+
+    def render(self, translations_dict, images=None, localized=None):
+        """
+        Returns the document with the translations of translations_dict, a dict of segment ID to text.
+
+        Args:
+            images (dict): Optional image URIs keyed by chart element ID, replacing the chart placeholders.
+            localized (dict): The result of localized_figures for translations_dict, if already computed.
+        """
+        translated = {}
+        for element_id, translation in translations_dict.items():
+            indexes = self.slot_index.get(element_id)
+            text_indexes = [index for index in indexes or [] if 'figure' not in self.slots[index]]
+            if not indexes:
+                print(f"Element with ID {element_id} not found in the HTML.")
+            elif pd.notna(translation):
+                text = str(translation)
+                for index in text_indexes:
+                    translated[index] = text if self.slots[index]['raw'] else EntitySubstitution.substitute_xml(text)
+            elif text_indexes:
+                print(f"No valid translation available for element with ID {element_id}. Skipping...")
+
+        if localized is None:
+            localized = self.localized_figures(translations_dict)
+        for index, figure in localized.items():
+            translated[index] = json_script_text(figure)
+
+        for target, image in (images or {}).items():
+            for index in self.image_index.get(target, []):
+                translated[index] = EntitySubstitution.substitute_xml(image)
+
+        output = []
+        self._render_parts(self.parts, translated, output)
+        return ''.join(output)
+
+def export_localized_chart_images(template, translations_by_language, image_dir):
+    """
+    Exports the charts of every language whose labels differ from the source, in one batch.
+
+    Returns:
+        tuple: The localized figures keyed by language and slot, and the image data URIs keyed by
+               language and chart element ID, for SegmentedTemplate.render.
+    """
+    pool = json.loads(template.pool_text) if template.pool_text else {}
+    localized_by_language = {}
+    figures, image_paths, targets = [], [], []
+
+    for language, translations_dict in translations_by_language.items():
+        localized_by_language[language] = template.localized_figures(translations_dict)
+        language_dir = os.path.join(image_dir, language.replace(' ', '_').lower())
+
+        for index, figure in localized_by_language[language].items():
+            target = template.slots[index]['target']
+            os.makedirs(language_dir, exist_ok=True)
+            resolved = resolve_references(figure, pool)
+            figures.append({'data': resolved['data'], 'layout': resolved['layout']})
+            image_paths.append(os.path.join(language_dir, f'{target}.png'))
+            targets.append((language, target))
+
+    start_time = time.perf_counter()
+    export_figure_images(figures, image_paths)
+    print(f'Exported {len(figures)} localized chart images in {time.perf_counter() - start_time:.2f}s')
+
+    images_by_language = {language: {} for language in translations_by_language}
+    for (language, target), image_path in zip(targets, image_paths):
+        images_by_language[language][target] = image_data_uri(image_path)
+    return localized_by_language, images_by_language
+
+# Memory of a worker process before it renders anything, and its peak use per character of the source report
+TRANSLATION_WORKER_BASE_MEMORY = 200 * 1024 ** 2
+TRANSLATION_WORKER_MEMORY_PER_CHAR = 8
+
+# Set in each worker process by _init_translation_worker
+_translation_worker = {}
+
+def _init_translation_worker(template):
+    _translation_worker['template'] = template
+
+def _write_translated_report(translations_dict, images, localized, output_html_path, template=None):
+    start_time = time.perf_counter()
+    template = template or _translation_worker['template']
+
+    with open(output_html_path, 'w', encoding='utf-8') as file:
+        file.write(template.render(translations_dict, images, localized))
+    return time.perf_counter() - start_time
+
+def available_memory():
+    """
+    Returns the physical memory available to new processes in bytes, or None where it cannot be read.
+    """
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+def translation_worker_count(template, n_languages, max_workers=None):
+    """
+    Number of processes rendering translated reports: max_workers (the CPU count by default), at most one
+    per language, and no more than the available memory can hold.
+    """
+    workers = min(max_workers or os.cpu_count() or 1, n_languages)
+
+    memory = available_memory()
+    if memory is not None:
+        per_worker = TRANSLATION_WORKER_BASE_MEMORY + TRANSLATION_WORKER_MEMORY_PER_CHAR * template.source_length
+        workers = min(workers, memory // per_worker)
+    return max(1, workers)
+
+def create_translated_html_files(source_html_path, translations_csv_path, output_directory, target_languages, template=None, image_dir=None
+                                 , max_workers=1):
+    """
+    Args:
+        image_dir (str): Optional directory receiving the chart images of each language whose chart labels were
+                         translated. The images also replace the chart placeholders of the translated reports.
+        max_workers (int): Number of processes rendering the languages. 1 renders them in this process, None uses
+                           up to one process per CPU. Either way the count is capped by the available memory.
+
+    Returns:
+        list: Paths of the translated reports, in the order of target_languages.
+    """
     # Load translations for all specified languages
     translations_by_language = load_translations_by_language(translations_csv_path, target_languages)
     
-    # Read the source HTML file
-    with open(source_html_path, 'r', encoding='utf-8') as file:
-        html_content = file.read()
+    # Compile the source HTML once, unless extract already did
+    if template is None:
+        with open(source_html_path, 'r', encoding='utf-8') as file:
+            html_content = file.read()
+
+        segment_ids = {element_id for translations_dict in translations_by_language.values() for element_id in translations_dict}
+        template = SegmentedTemplate(html_content, segment_ids)
     
-    paths = []
-    # Generate a translated HTML file for each target language
-    for language, translations_dict in translations_by_language.items():
-        updated_html_content = update_html_with_translations(html_content, translations_dict)
-        output_html_path = os.path.join(output_directory, f'{language.replace(' ', '_').lower()}_report.html')
-        
-        paths.append(output_html_path)
+    localized_by_language, images_by_language = {}, {}
+    if image_dir is not None:
+        localized_by_language, images_by_language = export_localized_chart_images(template, translations_by_language, image_dir)
+
+    paths = {}
+    for language in translations_by_language:
+        paths[language] = os.path.join(output_directory, f'{language.replace(' ', '_').lower()}_report.html')
+
+    workers = translation_worker_count(template, len(translations_by_language), max_workers)
+    start_time = time.perf_counter()
+
+    if workers == 1:
+        # Generate a translated HTML file for each target language
+        timings = {
+            language: _write_translated_report(translations_dict, images_by_language.get(language), localized_by_language.get(language), paths[language], template)
+            for language, translations_dict in translations_by_language.items()
+        }
+    else:
+        # The template is sent to each worker once, and each language's translations to one worker
+        # This runs in a pipeline stage thread, so the workers are only forked from a single-threaded parent
+        with ProcessPoolExecutor(max_workers=workers, mp_context=process_pool_context()
+                                 , initializer=_init_translation_worker, initargs=(template,)) as executor:
+            futures = {
+                language: executor.submit(_write_translated_report, translations_dict, images_by_language.get(language), localized_by_language.get(language), paths[language])
+                for language, translations_dict in translations_by_language.items()
+            }
+            timings = {language: future.result() for language, future in futures.items()}
 
-        with open(output_html_path, 'w', encoding='utf-8') as file:
-            file.write(updated_html_content)
-        
-        print(f"Translated HTML file for {language} has been saved to {output_html_path}")
+    for language, output_html_path in paths.items():
+        print(f"Translated HTML file for {language} has been saved to {output_html_path} ({timings[language]:.2f}s)")
+    print(f'Rendered {len(paths)} languages with {workers} process(es) in {time.perf_counter() - start_time:.2f}s')
 
-    return paths
+    return list(paths.values())
 
 
@@ -0,0 +1,157 @@
+"""
+Local translation memory.
+
+Translations exported from Gridly are stored in a SQLite file keyed by segment ID and
+language. Segment IDs are hashes of the normalized source text, so a string translated in
+an earlier report is found again in every later one and only new strings need to go
+through Gridly.
+"""
+
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+db_path = os.path.join(os.path.dirname(__file__), 'data/translation_memory.sqlite')
+
+# Stays below SQLite's limit on the number of query parameters
+LOOKUP_BATCH_SIZE = 500
+
+
+class TranslationMemory:
+    def __init__(self, db_path=db_path):
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+
+        if os.path.dirname(self.db_path) and not os.path.exists(os.path.dirname(self.db_path)):
+            os.makedirs(os.path.dirname(self.db_path))
+
+        with self._connect() as connection:
+            connection.execute('''
+                CREATE TABLE IF NOT EXISTS translations (
+                    segment_id TEXT NOT NULL,
+                    language TEXT NOT NULL,
+                    source_text TEXT,
+                    translation TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (segment_id, language)
+                )
+            ''')
+
+    @contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self.db_path)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def lookup(self, segment_ids, languages):
+        """
+        Returns the known translations of segment_ids in languages, as a dict keyed by (segment ID, language).
+        """
+        segment_ids = list(dict.fromkeys(segment_ids))
+        languages = list(languages)
+        found = {}
+
+        if not segment_ids or not languages:
+            return found
+
+        with self._connect() as connection:
+            for start in range(0, len(segment_ids), LOOKUP_BATCH_SIZE):
+                batch = segment_ids[start:start + LOOKUP_BATCH_SIZE]
+                rows = connection.execute(
+                    f'''SELECT segment_id, language, translation FROM translations
+                        WHERE language IN ({', '.join('?' * len(languages))}) AND segment_id IN ({', '.join('?' * len(batch))})''',
+                    languages + batch
+                )
+                for segment_id, language, translation in rows:
+                    found[(segment_id, language)] = translation
+        return found
+
+    def resolve(self, segments, languages):
+        """
+        Finds the extracted segments that still need a translation and reports the hit and miss rates.
+
+        Args:
+            segments (list of dict): Segments as returned by extract, with 'id' and 'content'.
+            languages (list): Target languages.
+
+        Returns:
+            list of dict: The segments missing a translation in at least one language.
+        """
+        found = self.lookup([segment['id'] for segment in segments], languages)
+        missing = [segment for segment in segments if any((segment['id'], language) not in found for language in languages)]
+
+        hits = len(found)
+        misses = len(segments) * len(languages) - hits
+        self.hits += hits
+        self.misses += misses
+
+        total = hits + misses
+        hit_rate = hits / total if total else 0
+        print(f'Translation memory: {hits} hits, {misses} misses ({hit_rate:.0%} hit rate), {len(missing)} of {len(segments)} segments to translate')
+        return missing
+
+    def store(self, translations, segments=None):
+        """
+        Adds or updates translations.
+
+        Args:
+            translations (dict): Translations keyed by (segment ID, language). Empty translations are ignored.
+            segments (list of dict): Optional extracted segments, to keep the source text next to the translations.
+
+        Returns:
+            int: The number of translations stored.
+        """
+        source_texts = {segment['id']: segment['content'] for segment in segments or []}
+        now = time.time()
+        rows = [
+            (segment_id, language, source_texts.get(segment_id), str(translation), now)
+            for (segment_id, language), translation in translations.items()
+            if pd.notna(translation) and str(translation).strip()
+        ]
+
+        with self._connect() as connection:
+            connection.executemany('''
+                INSERT INTO translations (segment_id, language, source_text, translation, updated_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (segment_id, language) DO UPDATE SET
+                    translation = excluded.translation,
+                    source_text = COALESCE(excluded.source_text, translations.source_text),
+                    updated_at = excluded.updated_at
+            ''', rows)
+        return len(rows)
+
+    def store_export(self, export_file_path, languages, segments=None):
+        """
+        Adds the translations of a Gridly export, a CSV with an 'id' column and one column per language.
+        """
+        export_df = pd.read_csv(export_file_path, dtype=str, usecols=lambda column: column == 'id' or column in languages)
+        translations = {}
+
+        for language in languages:
+            if language in export_df.columns:
+                translations.update({(segment_id, language): translation for segment_id, translation in zip(export_df['id'], export_df[language])})
+            else:
+                print(f"Warning: {language} column not found in CSV.")
+
+        stored = self.store(translations, segments)
+        print(f'Translation memory: stored {stored} translations from {export_file_path}')
+        return stored
+
+    def write_translations(self, segments, languages, file_name):
+        """
+        Writes the translations of segments to a CSV with the columns of a Gridly export, so it can be
+        used in its place by create_translated_html_files. Unknown translations are left empty.
+        """
+        found = self.lookup([segment['id'] for segment in segments], languages)
+        df = pd.DataFrame([
+            {'id': segment['id'], 'content': segment['content'], **{language: found.get((segment['id'], language)) for language in languages}}
+            for segment in segments
+        ], columns=['id', 'content'] + list(languages))
+        df.to_csv(file_name, index=False, encoding='utf-8')
+        return file_name
@@ -1,44 +1,154 @@
 import plotly.io as pio
 import plotly.express as px
+import plotly.graph_objects as go
 import uuid
+import hashlib
 from datetime import datetime
+import json
 import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
 
+from process.render_cache import make_cache_key
+from process.reduction import downsample_series, bin_2d, top_n_with_other
+from process.table_renderer import render_table_html
+
 output_dir = os.path.join(os.path.dirname(__file__), 'data/images/')
 
+# Maximum number of points drawn by a line chart before its series are downsampled
+DEFAULT_POINT_BUDGET = 5000
+
+# Number of rows above which scatter and bubble charts are drawn as a density heatmap
+DEFAULT_DENSITY_THRESHOLD = 100_000
+DEFAULT_DENSITY_BINS = 100
+
+def batch_spec_id(index, spec):
+    """
+    Derives a stable ID for the spec at a given position of a batch.
+    """
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f'data-visualizer:{index}:{json.dumps(spec, sort_keys=True, default=str)}'))
+
 class DataVisualizer:
-    def __init__(self, datasets):
+    def __init__(self, datasets, cache=None):
         self.datasets = datasets
         self.charts = {}
-        self.summary_tables = {}     
+        self.summary_tables = {}
+        self.cache = cache
 
 
     def generate_chart(self, dataset_name, chart_type='line', x=None, y=None, title=None, labels=None, bubble_chart_size=None, custom_styles=None
-                       , output_dir=output_dir):
+                       , output_dir=output_dir, max_points=DEFAULT_POINT_BUDGET, downsampling_method='lttb'
+                       , density_threshold=DEFAULT_DENSITY_THRESHOLD, density_bins=DEFAULT_DENSITY_BINS, category_budget=None):
         """
         Generates an interactive chart using Plotly.
 
         Args:
-            chart_type (str): Type of the chart ('line', 'bar', 'scatter', etc.).
+            chart_type (str): Type of the chart ('line', 'bar', 'scatter', 'heatmap', etc.).
             x (str): The name of the column to be used as x-axis.
             y (str): The name of the column to be used as y-axis.
             title (str): Title of the chart.
             labels (dict): Labels for axes, e.g., {'x':'Date', 'y':'Value'}
             width (int): Width of the chart.
             height (int): Height of the chart.
+            max_points (int): Point budget for line charts. Larger series are downsampled and drawn with WebGL. None disables the budget.
+            downsampling_method (str): Shape-preserving downsampling algorithm, 'lttb' or 'minmax'.
+            density_threshold (int): Number of rows above which scatter and bubble charts are binned into a density heatmap. None disables binning.
+            density_bins (int): Number of bins along each axis of the density heatmap.
+            category_budget (int): Maximum number of categories of bar, stacked bar and pie charts. The largest
+                                   categories are kept and the rest are rolled into an 'Other' category.
         Returns:
             The Plotly figure object for further customization or display.
+
+        Heatmaps take a matrix dataset: every column is an x category and every row a y category.
+        'y' optionally names the column holding the row labels, otherwise the index is used.
+
+        If the visualizer has a render cache and the same dataset contents were already
+        rendered with the same parameters, the cached HTML fragment and PNG are reused
+        and neither Plotly nor kaleido is called.
         """
+        job = self._build_chart(
+            dataset_name, chart_type=chart_type, x=x, y=y, title=title, labels=labels, bubble_chart_size=bubble_chart_size,
+            custom_styles=custom_styles, output_dir=output_dir, max_points=max_points, downsampling_method=downsampling_method,
+            density_threshold=density_threshold, density_bins=density_bins, category_budget=category_budget
+        )
+        self._export_chart_image(job)
+        self._serialize_chart(job)
+        return self._finish_chart(job)
 
+    def _build_chart(self, dataset_name, chart_type='line', x=None, y=None, title=None, labels=None, bubble_chart_size=None, custom_styles=None
+                       , output_dir=output_dir, max_points=DEFAULT_POINT_BUDGET, downsampling_method='lttb'
+                       , density_threshold=DEFAULT_DENSITY_THRESHOLD, density_bins=DEFAULT_DENSITY_BINS, category_budget=None):
+        # Builds the styled figure, or takes the artifacts from the render cache. The returned job is
+        # completed by _export_chart_image, _serialize_chart and _finish_chart, which may run on other threads.
         if dataset_name not in self.datasets:
             raise ValueError(f'''Dataset '{dataset_name}' not found.''')
         
         dataframe = self.datasets[dataset_name]
         fig = None
+
+        # Charts of a batch are built concurrently, so creating the directory must not fail when it already exists
+        os.makedirs(output_dir, exist_ok=True)
+
+        image_path = f'{output_dir}{title}.png'
+
+        cache_key = None
+        if self.cache is not None:
+            cache_key = make_cache_key('chart', dataframe, {
+                'chart_type': chart_type,
+                'x': x,
+                'y': y,
+                'title': title,
+                'labels': labels,
+                'bubble_chart_size': bubble_chart_size,
+                'custom_styles': custom_styles,
+                'max_points': max_points,
+                'downsampling_method': downsampling_method,
+                'density_threshold': density_threshold,
+                'density_bins': density_bins,
+                'category_budget': category_budget
+            })
+            cached = self.cache.get(cache_key)
+            if cached and cached['image_path'] and cached['figure_json']:
+                shutil.copyfile(cached['image_path'], image_path)
+                return {
+                    'fig': None,
+                    'title': title,
+                    'image_path': image_path,
+                    'cache_key': cache_key,
+                    'point_counts': cached['meta'],
+                    'html': cached['html'],
+                    'figure_json': cached['figure_json']
+                }
+
+        point_counts = {'original_points': len(dataframe), 'rendered_points': len(dataframe)}
+
+        if category_budget and chart_type in ['bar', 'stacked_bar', 'pie']:
+            # Pie charts take the category names from 'y' and the values from 'x'
+            category, values = (y, x) if chart_type == 'pie' else (x, y)
+            if category and values:
+                dataframe = top_n_with_other(dataframe, category, values, category_budget)
+                if len(dataframe) < point_counts['original_points']:
+                    point_counts['rendered_points'] = len(dataframe)
+                    print(f"Chart '{title}' kept the top {category_budget:,} categories and rolled up the rest into 'Other'")
         
         if chart_type == 'line':
-            fig = px.line(dataframe, x=x, y=y, labels=labels)
+            render_mode = 'auto'
+            if max_points and len(dataframe) > max_points:
+                dataframe = downsample_series(dataframe, x, y, max_points, method=downsampling_method)
+                point_counts['rendered_points'] = len(dataframe)
+                render_mode = 'webgl'
+                print(f"Chart '{title}' downsampled from {point_counts['original_points']:,} to {point_counts['rendered_points']:,} points")
+
+            fig = px.line(dataframe, x=x, y=y, labels=labels, render_mode=render_mode)
+
+            if render_mode == 'webgl':
+                fig.add_annotation(
+                    text=f"Showing {point_counts['rendered_points']:,} of {point_counts['original_points']:,} points",
+                    xref='paper', yref='paper', x=1, y=1, showarrow=False, font=dict(size=10, color='#6c757d')
+                )
         
         elif chart_type == 'bar':
             fig = px.bar(dataframe, x=x, y=y, labels=labels)
@@ -47,7 +157,12 @@ class DataVisualizer:
             fig = px.bar(dataframe, x=x, y=y, labels=labels, barmode='stack')
         
         elif chart_type == 'scatter':
-            fig = px.scatter(dataframe, x=x, y=y, labels=labels)
+            if density_threshold and len(dataframe) > density_threshold:
+                fig = self._density_heatmap(dataframe, x, y, labels, density_bins)
+                point_counts['rendered_points'] = density_bins * density_bins
+                print(f"Chart '{title}' binned {point_counts['original_points']:,} points into a {density_bins}x{density_bins} density heatmap")
+            else:
+                fig = px.scatter(dataframe, x=x, y=y, labels=labels)
         
         elif chart_type == 'pie':
             if not y:  # Ensure 'y' is provided for pie chart as category names
@@ -57,10 +172,26 @@ class DataVisualizer:
         elif chart_type == 'bubble':
             if not bubble_chart_size:
                 raise ValueError("For bubble charts, 'size' must specify the column for marker size.")
-            fig = px.scatter(dataframe, x=x, y=y, size=bubble_chart_size, labels=labels)
+            if density_threshold and len(dataframe) > density_threshold:
+                fig = self._density_heatmap(dataframe, x, y, labels, density_bins, weights=bubble_chart_size)
+                point_counts['rendered_points'] = density_bins * density_bins
+                print(f"Chart '{title}' binned {point_counts['original_points']:,} points into a {density_bins}x{density_bins} density heatmap")
+            else:
+                fig = px.scatter(dataframe, x=x, y=y, size=bubble_chart_size, labels=labels)
+
+        elif chart_type == 'heatmap':
+            matrix = dataframe.set_index(y) if y else dataframe
+            fig = go.Figure(go.Heatmap(
+                z=matrix.to_numpy(),
+                x=[str(col) for col in matrix.columns],
+                y=[str(row) for row in matrix.index]
+            ))
+            labels = labels or {}
+            fig.update_layout(xaxis_title=labels.get('x'), yaxis_title=labels.get('y'))
+            point_counts['original_points'] = point_counts['rendered_points'] = matrix.size
         
         else:
-            raise ValueError("Unsupported chart type. Supported types: 'line', 'bar', 'scatter', 'pie', 'bubble'.")
+            raise ValueError("Unsupported chart type. Supported types: 'line', 'bar', 'stacked_bar', 'scatter', 'pie', 'bubble', 'heatmap'.")
 
         fig.update_layout(
             plot_bgcolor='rgba(0, 0, 0, 0)',  # Makes plot background transparent
@@ -82,7 +213,10 @@ class DataVisualizer:
         # Apply custom styles if provided
         if custom_styles:
             if 'color' in custom_styles:
-                fig.update_traces(marker_color=custom_styles['color'])
+                if isinstance(fig.data[0], go.Heatmap):
+                    fig.update_traces(colorscale=[[0, '#FFFFFF'], [1, custom_styles['color']]])
+                else:
+                    fig.update_traces(marker_color=custom_styles['color'])
             if 'font_family' in custom_styles:
                 fig.update_layout(font_family=custom_styles['font_family'])
             if 'font_size' in custom_styles:
@@ -91,46 +225,153 @@ class DataVisualizer:
                 fig.update_xaxes(color=custom_styles['axis_color'])
                 fig.update_yaxes(color=custom_styles['axis_color'])
 
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
+        return {
+            'fig': fig,
+            'title': title,
+            'image_path': image_path,
+            'cache_key': cache_key,
+            'point_counts': point_counts,
+            'html': None,
+            'figure_json': None
+        }
+
+    def _export_chart_image(self, job):
+        if job['fig'] is None:  # Served from the render cache
+            return
 
         try:
-            pio.write_image(fig, f'''{output_dir}{title}.png''')
+            pio.write_image(job['fig'], job['image_path'])
             print(f"Image saved successfully")
         except Exception as e:
             print(f"Failed to save image: {e}")
 
-        pio.write_image(fig, file=f'''{output_dir}{title}.png''', format='png', engine='kaleido')
+        pio.write_image(job['fig'], file=job['image_path'], format='png', engine='kaleido')
 
-        chart_html = pio.to_html(fig, full_html=False, include_plotlyjs='cdn', config={'responsive': True})
-        
-        id = str(uuid.uuid4())
+    def _serialize_chart(self, job):
+        if job['fig'] is None:  # Served from the render cache
+            return
+
+        job['html'] = pio.to_html(job['fig'], full_html=False, include_plotlyjs='cdn', config={'responsive': True})
+
+        # Kept so reports can embed the figure data without the per-chart script tags
+        job['figure_json'] = pio.to_json(job['fig'])
+
+    def _finish_chart(self, job, chart_id=None):
+        if job['fig'] is not None and job['cache_key'] is not None:
+            self.cache.put(job['cache_key'], job['html'], job['image_path'], meta=job['point_counts'], figure_json=job['figure_json'])
+
+        return self._register_chart(job['html'], job['figure_json'], job['title'], job['image_path'], job['point_counts'], chart_id)
+
+    def _density_heatmap(self, dataframe, x, y, labels, bins, weights=None):
+        z, x_centers, y_centers = bin_2d(
+            dataframe[x], dataframe[y],
+            weights=dataframe[weights] if weights else None,
+            bins=bins
+        )
+        labels = labels or {}
+
+        fig = go.Figure(go.Heatmap(
+            z=np.where(z > 0, z, np.nan),  # Leave empty cells transparent
+            x=x_centers,
+            y=y_centers,
+            colorbar=dict(title=labels.get(weights, weights) if weights else 'count')
+        ))
+        fig.update_layout(xaxis_title=labels.get('x', x), yaxis_title=labels.get('y', y))
+        return fig
+
+    def _register_chart(self, chart_html, figure_json, title, image_path, point_counts=None, chart_id=None):
+        id = chart_id or str(uuid.uuid4())
 
         self.charts[id] = {
             'html': chart_html,
+            'figure_json': figure_json,
             'title': title,
             'created_at': datetime.now(),
-            'file_path': f'{output_dir}{title}.png'
+            'file_path': image_path,
+            **(point_counts or {})
         }
         return id
 
 
-    def generate_summary_table(self, dataset_name, highlight_columns=None, highlight_column_color=None, highlight_text_color='#FFFFFF', title=None, rounded_by=0):         
-        def apply_styles(value, text_color):
-            return f'color: {text_color};'
+    def generate_summary_table(self, dataset_name, highlight_columns=None, highlight_column_color=None, highlight_text_color='#FFFFFF', title=None, rounded_by=0
+                               , renderer='styler', max_rows=None, page_size=None):
+        """
+        Generates an HTML summary table of a dataset.
+
+        Args:
+            highlight_columns (list): Columns drawn with data bars and the highlight text color.
+            rounded_by (int): Number of decimals of numeric columns.
+            renderer (str): 'styler' renders through the pandas Styler. 'fast' uses the lightweight renderer,
+                            which is much faster on large tables and supports max_rows and page_size.
+            max_rows (int): With the 'fast' renderer, only render the first max_rows rows.
+            page_size (int): With the 'fast' renderer, show the rows page by page.
+        """
+        summary_table = self._render_summary_table(
+            dataset_name, highlight_columns, highlight_column_color, highlight_text_color, rounded_by,
+            renderer=renderer, max_rows=max_rows, page_size=page_size, title=title
+        )
+        return self._register_summary_table(summary_table, title)
 
+    def _render_summary_table(self, dataset_name, highlight_columns=None, highlight_column_color=None, highlight_text_color='#FFFFFF', rounded_by=0
+                              , renderer='styler', max_rows=None, page_size=None, title=None):
         if dataset_name not in self.datasets:
             raise ValueError(f'''Dataset '{dataset_name}' not found.''')
         
         dataframe = self.datasets[dataset_name]
 
+        cache_key = None
+        if self.cache is not None:
+            cache_key = make_cache_key('summary_table', dataframe, {
+                'highlight_columns': highlight_columns,
+                'highlight_column_color': highlight_column_color,
+                'highlight_text_color': highlight_text_color,
+                'rounded_by': rounded_by,
+                'renderer': renderer,
+                'max_rows': max_rows,
+                'page_size': page_size,
+                'title': title
+            })
+            cached = self.cache.get(cache_key)
+            if cached:
+                return cached['html']
+
+        if renderer == 'fast':
+            # A stable ID keeps the HTML identical between runs, and distinct between tables of a report
+            table_id = None
+            if title or cache_key:
+                table_id = 'table-' + hashlib.sha256((title or cache_key).encode('utf-8')).hexdigest()[:12]
+            summary_table = render_table_html(
+                dataframe, highlight_columns, highlight_column_color, highlight_text_color,
+                rounded_by=rounded_by, max_rows=max_rows, page_size=page_size, table_id=table_id
+            )
+        elif renderer == 'styler':
+            summary_table = self._render_styler_table(dataframe, highlight_columns, highlight_column_color, highlight_text_color, rounded_by)
+        else:
+            raise ValueError("Unsupported table renderer. Supported renderers: 'styler', 'fast'.")
+
+        if cache_key is not None:
+            self.cache.put(cache_key, summary_table)
+
+        return summary_table
+
+    def _render_styler_table(self, dataframe, highlight_columns, highlight_column_color, highlight_text_color, rounded_by):
+        def apply_styles(value, text_color):
+            return f'color: {text_color};'
+
         # Format dictionary to specify formatting for each column
         format_dict = {}
+        datetime_columns = {}
         for col in dataframe.columns:
             if pd.api.types.is_numeric_dtype(dataframe[col]):
                 format_dict[col] = f"{{:,.{rounded_by}f}}"  # Formatting for numeric columns
             elif pd.api.types.is_datetime64_any_dtype(dataframe[col]):
-                dataframe[col] = dataframe[col].dt.strftime('%Y-%m-%d')  # Convert datetime columns to string format
+                datetime_columns[col] = dataframe[col].dt.strftime('%Y-%m-%d')  # Convert datetime columns to string format
+
+        # Work on a copy so the shared dataset keeps its datetime columns
+        if datetime_columns:
+            dataframe = dataframe.copy()
+            for col, values in datetime_columns.items():
+                dataframe[col] = values
 
         styled_stats = dataframe.style.format(format_dict) \
                                     .hide(axis='index') \
@@ -141,9 +382,10 @@ class DataVisualizer:
                                     ]) \
                                     .applymap(apply_styles, text_color=highlight_text_color, subset=highlight_columns)
 
-        summary_table = styled_stats.to_html().replace('<table border="1" class="dataframe">', '<table class="table table-striped">')
+        return styled_stats.to_html().replace('<table border="1" class="dataframe">', '<table class="table table-striped">')
 
-        id = str(uuid.uuid4())
+    def _register_summary_table(self, summary_table, title, table_id=None):
+        id = table_id or str(uuid.uuid4())
 
         self.summary_tables[id] = {
             'html': summary_table,
@@ -152,6 +394,80 @@ class DataVisualizer:
         }
         return id
 
+    def generate_batch(self, specs, max_workers=None):
+        """
+        Generates several charts and summary tables concurrently.
+
+        Figures are built and serialized on one thread pool while their PNGs are exported on
+        another, so the construction of a figure overlaps with the kaleido export of the previous ones.
+
+        Args:
+            specs (list of dict): One dict per chart or table. 'kind' is 'chart' (default) or 'summary_table',
+                                  'id' optionally sets the ID the result is registered under, and the remaining
+                                  keys are the arguments of generate_chart or generate_summary_table.
+            max_workers (int): Number of threads building figures and tables. Defaults to the executor default.
+
+        Returns:
+            list: The chart and summary table IDs, in the order of specs. IDs that are not set in a spec are
+                  derived from its position and contents, so the same batch always registers the same IDs.
+        """
+        for spec in specs:
+            if spec.get('kind', 'chart') not in ['chart', 'summary_table']:
+                raise ValueError("Unsupported spec kind. Supported kinds: 'chart', 'summary_table'.")
+
+        ids = [spec.get('id') or batch_spec_id(index, spec) for index, spec in enumerate(specs)]
+        timings = [{} for _ in specs]
+
+        def build(index):
+            kwargs = {key: value for key, value in specs[index].items() if key not in ['kind', 'id']}
+            start_time = time.perf_counter()
+
+            if specs[index].get('kind', 'chart') == 'summary_table':
+                title = kwargs.pop('title', None)
+                html = self._render_summary_table(**kwargs, title=title)
+                timings[index]['build'] = timings[index]['total'] = time.perf_counter() - start_time
+                return {'html': html, 'title': title}
+
+            job = self._build_chart(**kwargs)
+            timings[index]['build'] = time.perf_counter() - start_time
+
+            # Export on the other pool while this thread serializes the figure
+            export = export_pool.submit(timed_export, index, job)
+
+            serialize_start = time.perf_counter()
+            self._serialize_chart(job)
+            timings[index]['serialize'] = time.perf_counter() - serialize_start
+
+            export.result()
+            # Serialization and export overlap, so the total is the elapsed time rather than the sum of the steps
+            timings[index]['total'] = time.perf_counter() - start_time
+            return job
+
+        def timed_export(index, job):
+            start_time = time.perf_counter()
+            self._export_chart_image(job)
+            timings[index]['export'] = time.perf_counter() - start_time
+
+        batch_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='chart-export') as export_pool:
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='chart-build') as build_pool:
+                results = list(build_pool.map(build, range(len(specs))))
+
+        # Registration happens here, in spec order, so the chart and table dicts are only written by one thread
+        for index, (spec, result) in enumerate(zip(specs, results)):
+            if spec.get('kind', 'chart') == 'summary_table':
+                self._register_summary_table(result['html'], result['title'], ids[index])
+                self.summary_tables[ids[index]]['timings'] = timings[index]
+            else:
+                self._finish_chart(result, ids[index])
+                self.charts[ids[index]]['timings'] = timings[index]
+
+            steps = ', '.join(f'{step} {elapsed:.2f}s' for step, elapsed in timings[index].items())
+            print(f"'{spec.get('title')}': {steps}")
+
+        print(f'Generated {len(specs)} charts and tables in {time.perf_counter() - batch_start:.2f}s')
+        return ids
+
     def get_chart_by_id(self, chart_id):
         return self.charts.get(chart_id, {}).get('html')
     
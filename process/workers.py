@@ -0,0 +1,21 @@
+"""
+Start method of the worker process pools.
+
+Forking copies the parent without its other threads, so a lock one of them holds, e.g. in
+a thread pool or in the kaleido process reader, would stay locked in the workers forever.
+Workers are forked only from a single-threaded parent, where they share the parent's
+memory copy-on-write, and started from a forkserver or spawn process otherwise.
+"""
+
+import multiprocessing
+import threading
+
+
+def process_pool_context():
+    """
+    Returns the multiprocessing context of a process pool started now.
+    """
+    start_methods = multiprocessing.get_all_start_methods()
+    if 'fork' in start_methods and threading.active_count() == 1:
+        return multiprocessing.get_context('fork')
+    return multiprocessing.get_context('forkserver' if 'forkserver' in start_methods else 'spawn')
@@ -0,0 +1,270 @@
+"""
+Benchmarks for the report pipeline. Run a single benchmark with
+
+    python src/benchmarks.py <benchmark name>
+
+or all of them by omitting the name.
+"""
+
+import os, sys
+sys.path.insert(1, '/'.join(os.path.realpath(__file__).split('/')[0:-2]))
+
+import gzip
+import re
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from bs4 import BeautifulSoup
+from plotly.offline import get_plotlyjs
+
+from process.visualizer import *
+from process.generator import *
+from process.translation_flow import *
+
+
+def _timed(func, *args, **kwargs):
+    start_time = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start_time
+
+
+def benchmark_line_downsampling(sizes=(10_000, 100_000, 500_000), max_points=DEFAULT_POINT_BUDGET):
+    """
+    Compares the HTML fragment size and render time of a minute-level line chart with
+    and without the point budget.
+    """
+    print(f'''{'points':>10} {'budget':>8} {'rendered':>10} {'html size':>12} {'time (s)':>9}''')
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            np.random.seed(0)
+            dataframe = pd.DataFrame({
+                'timestamp': pd.date_range('2024-01-01', periods=size, freq='min'),
+                'value': np.random.randn(size).cumsum()
+            })
+            visualizer = DataVisualizer({'series': dataframe})
+
+            for budget in (None, max_points):
+                chart_id, elapsed = _timed(
+                    visualizer.generate_chart, 'series', chart_type='line', x='timestamp', y='value',
+                    title=f'series_{size}_{budget}', output_dir=f'{tmp_dir}/', max_points=budget
+                )
+                chart = visualizer.charts[chart_id]
+                print(f'''{size:>10,} {str(budget):>8} {chart['rendered_points']:>10,} {len(chart['html']):>12,} {elapsed:>9.2f}''')
+
+
+def _build_sample_visualizer(output_dir, n_charts=6, n_points=2_000):
+    np.random.seed(0)
+    dataframe = pd.DataFrame({
+        'day': np.arange(n_points),
+        'value': np.random.randn(n_points).cumsum(),
+        'other': np.random.rand(n_points)
+    })
+    visualizer = DataVisualizer({'sample': dataframe})
+    chart_types = ['line', 'scatter', 'bar']
+    for i in range(n_charts):
+        visualizer.generate_chart(
+            'sample', chart_type=chart_types[i % len(chart_types)], x='day', y='value',
+            title=f'chart_{i}', output_dir=f'{output_dir}/'
+        )
+    return visualizer
+
+
+# Reference connection for the load time estimate of benchmark_report_embedding
+REFERENCE_BANDWIDTH = 10_000_000 / 8
+REFERENCE_ROUND_TRIP = 0.05
+
+
+def benchmark_report_embedding(n_charts=6, n_points=2_000):
+    """
+    Compares report size for every embed mode, on charts that share one dataset.
+    Sizes are given raw and gzip-compressed, as served by most web servers.
+
+    Load time is estimated, as no browser is available to measure it: the gzipped report
+    and every Plotly runtime it requests are transferred over a 10 Mbit/s connection with
+    a 50 ms round trip per request. The runtime is counted once per distinct script URL,
+    as a browser fetches it once.
+    """
+    runtime_size = len(gzip.compress(get_plotlyjs().encode('utf-8')))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        visualizer = _build_sample_visualizer(tmp_dir, n_charts, n_points)
+        titles = [chart['title'] for chart in visualizer.list_charts()]
+
+        print(f'''{'mode':>8} {'report bytes':>14} {'gzip bytes':>12} {'runtime tags':>13} {'runtime fetches':>16} {'est. load (s)':>14} {'build (s)':>10}''')
+        for embed_mode in EMBED_MODES:
+            report = ReportGenerator('Benchmark', 'benchmark', '2024-01-01', visualizer, embed_mode=embed_mode)
+            html, elapsed = _timed(report.generate_html_report, titles, [], {}, [], {})
+            size = len(html.encode('utf-8'))
+            compressed = len(gzip.compress(html.encode('utf-8')))
+
+            runtime_urls = re.findall(r'<script[^>]+src="([^"]*plotly[^"]*)"', html)
+            fetches = len(set(runtime_urls))
+            load_time = (1 + fetches) * REFERENCE_ROUND_TRIP + (compressed + fetches * runtime_size) / REFERENCE_BANDWIDTH
+            print(f'''{embed_mode:>8} {size:>14,} {compressed:>12,} {len(runtime_urls):>13} {fetches:>16} {load_time:>14.2f} {elapsed:>10.3f}''')
+
+
+def benchmark_summary_table(sizes=(1_000, 10_000, 100_000)):
+    """
+    Compares the pandas Styler table renderer with the lightweight one.
+    """
+    print(f'''{'rows':>10} {'styler (s)':>11} {'fast (s)':>9} {'speedup':>8} {'styler bytes':>14} {'fast bytes':>12}''')
+
+    for size in sizes:
+        np.random.seed(0)
+        dataframe = pd.DataFrame({
+            'month': pd.date_range('2024-01-01', periods=size, freq='h'),
+            '#_new_users': np.random.randint(0, 50, size),
+            '#_active_users': np.random.randint(0, 500, size),
+            '#_edit_cells': np.random.rand(size) * 1e6
+        })
+        visualizer = DataVisualizer({'activity': dataframe})
+        options = dict(highlight_columns=['#_active_users', '#_edit_cells'], highlight_column_color='#6CABDD')
+
+        styler_id, styler_time = _timed(visualizer.generate_summary_table, 'activity', renderer='styler', **options)
+        fast_id, fast_time = _timed(visualizer.generate_summary_table, 'activity', renderer='fast', **options)
+
+        styler_bytes = len(visualizer.get_summary_table_by_id(styler_id))
+        fast_bytes = len(visualizer.get_summary_table_by_id(fast_id))
+        print(f'''{size:>10,} {styler_time:>11.2f} {fast_time:>9.2f} {styler_time / fast_time:>7.1f}x {styler_bytes:>14,} {fast_bytes:>12,}''')
+
+
+def _sample_segmented_report(n_segments, payload_bytes=2_000_000):
+    # Translatable paragraphs around a large chart payload, as in a report with embedded figures
+    paragraphs = '\n'.join(f'<p data-segment-id="segment-{i}">Source sentence number {i}.</p>' for i in range(n_segments))
+    payload = '<script type="application/json">' + 'x' * payload_bytes + '</script>'
+    return f'<html><body>{payload}<div>{paragraphs}</div></body></html>'
+
+
+def _update_with_find(html_content, translations_dict):
+    # Previous implementation, one tree walk per segment
+    soup = BeautifulSoup(html_content, 'html.parser')
+    for element_id, translation in translations_dict.items():
+        element = soup.find(attrs={SEGMENT_ID_ATTRIBUTE: element_id})
+        if element:
+            element.string = str(translation)
+    return str(soup)
+
+
+def benchmark_translation_update(sizes=(1_000, 10_000, 50_000), baseline_sizes=(1_000,)):
+    """
+    Times update_html_with_translations for growing segment counts. With the ID index the
+    time per segment stays flat. The per-segment tree walk it replaces is only timed for
+    baseline_sizes, as it grows quadratically.
+    """
+    print(f'''{'segments':>10} {'indexed (s)':>12} {'us/segment':>11} {'find (s)':>9}''')
+
+    for size in sizes:
+        html_content = _sample_segmented_report(size)
+        translations = {f'segment-{i}': f'Translated sentence number {i}.' for i in range(size)}
+
+        updated_html, indexed_time = _timed(update_html_with_translations, html_content, translations)
+
+        baseline = '-'
+        if size in baseline_sizes:
+            baseline_html, find_time = _timed(_update_with_find, html_content, translations)
+            assert baseline_html == updated_html
+            baseline = f'{find_time:.2f}'
+
+        print(f'''{size:>10,} {indexed_time:>12.2f} {indexed_time / size * 1e6:>11.1f} {baseline:>9}''')
+
+
+def benchmark_translated_reports(n_segments=2_000, n_languages=10):
+    """
+    Compares rendering every language of a report by parsing it once per language with
+    rendering it from a SegmentedTemplate compiled once.
+    """
+    html_content = _sample_segmented_report(n_segments)
+    segment_ids = [f'segment-{i}' for i in range(n_segments)]
+    languages = {
+        f'language_{language}': {segment_id: f'Sentence {segment_id} in language {language}.' for segment_id in segment_ids}
+        for language in range(n_languages)
+    }
+
+    soup_outputs, soup_time = _timed(lambda: [update_html_with_translations(html_content, translations) for translations in languages.values()])
+
+    template, compile_time = _timed(SegmentedTemplate, html_content, segment_ids)
+    template_outputs, render_time = _timed(lambda: [template.render(translations) for translations in languages.values()])
+    assert template_outputs == soup_outputs
+
+    print(f'''{'languages':>10} {'parse per language (s)':>23} {'compile once (s)':>17} {'render all (s)':>15}''')
+    print(f'''{n_languages:>10} {soup_time:>23.2f} {compile_time:>17.2f} {render_time:>15.3f}''')
+
+
+def benchmark_extract(sizes=(1_000, 10_000, 50_000)):
+    """
+    Times the streaming extractor from file to file and measures its peak memory, on
+    reports with a large chart payload.
+    """
+    selectors = {'tags': ['h3', 'p', 'li'], 'classes': ['metadata']}
+    print(f'''{'segments':>10} {'document bytes':>15} {'time (s)':>9} {'peak memory bytes':>18}''')
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            input_path = os.path.join(tmp_dir, 'report.html')
+            with open(input_path, 'w', encoding='utf-8') as file:
+                file.write(_sample_segmented_report(size))
+
+            def run():
+                with open(input_path, 'r', encoding='utf-8') as input_file, open(os.path.join(tmp_dir, 'source.html'), 'w', encoding='utf-8') as output_file:
+                    extract_stream(input_file, output_file, selectors)
+
+            # Memory is measured in a second run, as tracing slows the extractor down
+            _, elapsed = _timed(run)
+            tracemalloc.start()
+            run()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            print(f'''{size:>10,} {os.path.getsize(input_path):>15,} {elapsed:>9.2f} {peak:>18,}''')
+
+
+def benchmark_parallel_translated_reports(n_segments=20_000, n_languages=8, worker_counts=(1, None)):
+    """
+    Times writing every language of a report in this process and across worker processes.
+    """
+    html_content = _sample_segmented_report(n_segments)
+    segment_ids = [f'segment-{i}' for i in range(n_segments)]
+    languages = [f'language_{language}' for language in range(n_languages)]
+    template = SegmentedTemplate(html_content, segment_ids)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        translations_csv_path = os.path.join(tmp_dir, 'translated_text.csv')
+        pd.DataFrame({'id': segment_ids, **{language: [f'Sentence {segment_id} in {language}.' for segment_id in segment_ids] for language in languages}}
+                     ).to_csv(translations_csv_path, index=False)
+
+        outputs = []
+        for max_workers in worker_counts:
+            output_dir = os.path.join(tmp_dir, f'workers_{max_workers}')
+            os.makedirs(output_dir)
+            paths, elapsed = _timed(create_translated_html_files, None, translations_csv_path, output_dir, languages, template=template, max_workers=max_workers)
+            outputs.append([open(path, encoding='utf-8').read() for path in paths])
+            results.append((max_workers or os.cpu_count(), elapsed))
+
+        assert all(output == outputs[0] for output in outputs)
+
+    print(f'''{'workers':>10} {'time (s)':>9}''')
+    for max_workers, elapsed in results:
+        print(f'''{max_workers:>10} {elapsed:>9.2f}''')
+
+
+BENCHMARKS = {
+    'line_downsampling': benchmark_line_downsampling,
+    'report_embedding': benchmark_report_embedding,
+    'summary_table': benchmark_summary_table,
+    'translation_update': benchmark_translation_update,
+    'translated_reports': benchmark_translated_reports,
+    'extract': benchmark_extract,
+    'parallel_translated_reports': benchmark_parallel_translated_reports
+}
+
+if __name__ == '__main__':
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        print(f'== {name} ==')
+        BENCHMARKS[name]()
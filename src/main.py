@@ -9,17 +9,113 @@ from constants.configs import *
 from connect.redshift_connect import *
 from process.processor import *
 from process.visualizer import *
+from process.render_cache import *
 from process.generator import *  
 from process.translation_flow import *
+from process.translation_memory import *
 from process.gridly_features import *
 from process.slack_client import *
+from process.pipeline import *
 
 base_dir = os.path.join(os.path.dirname(__file__), 'data/sample/')
 
-if __name__ == '__main__':
-    start_time = time.time()
-    print('Start time: {}'.format(datetime.now().strftime('%B %d, %Y %H:%M:%S')))
+output_dir = os.path.join(os.path.dirname(__file__), 'data/output')
+
+# Define column name and desire data type
+active_users_schema = {
+    'user_id': 'str',
+    'date': 'timestamp'
+}
+scatter_plot_schema = {
+    'X': 'float',
+    'Y': 'float'
+}
+
+bubble_chart_schema = {
+    'X': 'float',
+    'Y': 'float',
+    'Size': 'int'
+}
+
+user_activity_schema = {
+    'month': 'datetime',
+    '#_new_users': 'int',
+    'accumulated_new_users': 'int',
+    '#_active_users': 'int',
+    '#_events_occurred': 'int'
+}
+
+# Charts and tables are built concurrently. Each spec takes the arguments of generate_chart or generate_summary_table
+chart_specs = [
+    {
+        'dataset_name': 'active_users',
+        'chart_type': 'bar',
+        'x': 'period',
+        'y': 'active_users',
+        'title': 'Weekly Active Users',
+        'labels': {'x': 'week', 'y': 'active_users'},
+        'custom_styles': {'color': '#6CABDD'}
+    },
+    {
+        'kind': 'summary_table',
+        'dataset_name': 'user_activity',
+        'highlight_columns': ['#_active_users', '#_events_occurred'],
+        'highlight_column_color': '#6CABDD',
+        'highlight_text_color': '#FFFFFF',
+        'title': 'Weekly Active Users Summary Statistics'
+    },
+    # Generate a scatter plot for sales data
+    {
+        'dataset_name': 'scatter_plot',
+        'chart_type': 'scatter',
+        'x': 'X',
+        'y': 'Y',
+        'title': 'Sample Scatter Plot',
+        'labels': {'x': 'Date', 'y': 'Sales'},
+        'custom_styles': {'color': '#6CABDD'}
+    },
+    # Generate a bubble chart for sales data with 'Customer_Count' affecting the bubble size
+    {
+        'dataset_name': 'bubble_chart',
+        'chart_type': 'bubble',
+        'x': 'X',
+        'y': 'Y',
+        'bubble_chart_size': 'Size',
+        'title': 'Sample Bubble Chart',
+        'labels': {'x': 'Date', 'y': 'Sales'},
+        'custom_styles': {'color': '#6CABDD'}
+    }
+]
+
+single_chart_titles = ['Weekly Active Users']
+dual_charts_titles = [('Sample Scatter Plot', 'Sample Bubble Chart')]
+table_titles = ['Weekly Active Users Summary Statistics']
 
+# Extract text and modify the HTML       
+selectors = {
+    'tags': ['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'th', 'li'],
+    'classes': ['metadata'],
+    'ids': ['main-title', 'section-header']
+}    
+
+target_languages = ['French', 'Swedish']
+
+# Sync source text to a Gridly localization grid 
+API_key = 'YOUR GRIDLY API KEY'
+view_id = 'YOUR GRIDLY VIEW ID'
+
+# Gridly columns receiving the fields of the extracted segments, and the translations of target_languages
+column_mappings = {
+    'id': 'column1',
+    'content': 'column2'
+}
+translation_column_ids = ['YOUR FRENCH COLUMN ID', 'YOUR SWEDISH COLUMN ID']
+
+slack_channel_ids = ['YOUR SLACK CHANNEL ID']
+message = 'Hi guys, here are the localized reports for you!'
+
+
+def query_warehouse():
     # Create a connection to the data. In this example, I use AWS Redshift
     redshift = RedshiftConnector(REDSHIFT_CONFIG)
 
@@ -31,37 +127,12 @@ if __name__ == '__main__':
     )
 
     # Data extracted from a DB will return as a dataframe
-    extracted_data = redshift.get_data_from_redshift(query_str)
-
-    # Define column name and desire data type
-    active_users_schema = {
-        'user_id': 'str',
-        'date': 'timestamp'
-    }
-    scatter_plot_schema = {
-        'X': 'float',
-        'Y': 'float'
-    }
-
-    bubble_chart_schema = {
-        'X': 'float',
-        'Y': 'float',
-        'Size': 'int'
-    }
-
-    user_activity_schema = {
-        'month': 'datetime',
-        '#_new_users': 'int',
-        'accumulated_new_users': 'int',
-        '#_active_users': 'int',
-        '#_events_occurred': 'int'
-    }
+    return redshift.get_data_from_redshift(query_str)
 
+def load_sample_files():
+    # Each stage has its own Processor, as stages run at the same time
     data_processor = Processor()
-    
-    # Load data from sources or files
-    data_processor.load_data(extracted_data, 'dataframe', 'active_users')
-    
+
     f1_path = os.path.join(base_dir, 'scatterPlotData.csv')
     f2_path = os.path.join(base_dir, 'BubbleChartData.csv')
     f3_path = os.path.join(base_dir, 'UserActivityData.csv')
@@ -70,12 +141,19 @@ if __name__ == '__main__':
     data_processor.load_data(data_source=f2_path, dataset_type='csv', dataset_name='bubble_chart')
     data_processor.load_data(data_source=f3_path, dataset_type='csv', dataset_name='user_activity')
 
-    # Data type conversion, remove dup and remove records with null values in specific columns
-    data_processor.preprocess_data('active_users', active_users_schema, not_null_col=['user_id'])
     data_processor.preprocess_data('scatter_plot', scatter_plot_schema)
     data_processor.preprocess_data('bubble_chart', bubble_chart_schema)
     data_processor.preprocess_data('user_activity', user_activity_schema)
-   
+
+    return {name: data_processor.get_raw_dataset_by_name(name) for name in ['scatter_plot', 'bubble_chart', 'user_activity']}
+
+def prepare_active_users(extracted_data):
+    data_processor = Processor()
+    data_processor.load_data(extracted_data, 'dataframe', 'active_users')
+
+    # Data type conversion, remove dup and remove records with null values in specific columns
+    data_processor.preprocess_data('active_users', active_users_schema, not_null_col=['user_id'])
+
     # Create simple metrics
     data_processor.basic_aggregation(
         dataset_name='active_users',
@@ -89,63 +167,23 @@ if __name__ == '__main__':
         order_by='asc', 
         rounded_numerical_result_by=0
     )
-    
-    # Process and update datasets if necessary
-    active_users_df = data_processor.get_processed_dataset_by_name('active_users')
-    scatter_plot_df = data_processor.get_raw_dataset_by_name('scatter_plot')
-    bubble_chart_df = data_processor.get_raw_dataset_by_name('bubble_chart')
-    user_activity_df = data_processor.get_raw_dataset_by_name('user_activity')
 
+    return data_processor.get_processed_dataset_by_name('active_users')
+
+def build_charts(active_users_df, sample_datasets):
     combined_datasets = {
         'active_users': active_users_df,
-        'scatter_plot': scatter_plot_df,
-        'bubble_chart': bubble_chart_df,
-        'user_activity': user_activity_df
+        **sample_datasets
     }
 
-    # Create visualization
-    visualizer = DataVisualizer(combined_datasets)
-
-    bar_chart_id = visualizer.generate_chart(
-        dataset_name='active_users', 
-        chart_type='bar', 
-        x='period', 
-        y='active_users', 
-        title='Weekly Active Users', 
-        labels={'x': 'week', 'y': 'active_users'},
-        custom_styles={'color': '#6CABDD'}
-    )
-
-    summary_table_id = visualizer.generate_summary_table(
-        dataset_name='user_activity',
-        highlight_columns=['#_active_users', '#_events_occurred'], 
-        highlight_column_color='#6CABDD', 
-        highlight_text_color='#FFFFFF',
-        title='Weekly Active Users Summary Statistics'
-    )
+    # Create visualization. Charts and tables whose data and parameters are unchanged since the last run are served from the render cache
+    with RenderCache() as cache:
+        visualizer = DataVisualizer(combined_datasets, cache=cache)
+        chart_ids = visualizer.generate_batch(chart_specs)
+    return visualizer, chart_ids
 
-    # Generate a scatter plot for sales data
-    scatter_chart_id = visualizer.generate_chart(
-        dataset_name='scatter_plot',
-        chart_type='scatter',
-        x='X',
-        y='Y',
-        title='Sample Scatter Plot',
-        labels={'x': 'Date', 'y': 'Sales'},
-        custom_styles={'color': '#6CABDD'}
-    )
-
-    # Generate a bubble chart for sales data with 'Customer_Count' affecting the bubble size
-    bubble_chart_id = visualizer.generate_chart(
-        dataset_name='bubble_chart',
-        chart_type='bubble',
-        x='X',
-        y='Y',
-        bubble_chart_size='Size',
-        title='Sample Bubble Chart',
-        labels={'x': 'Date', 'y': 'Sales'},
-        custom_styles={'color': '#6CABDD'}
-    )
+def report_sections(chart_ids):
+    bar_chart_id, summary_table_id, scatter_chart_id, bubble_chart_id = chart_ids
 
     # Define description for each chart and table
     chart_descriptions = {
@@ -162,91 +200,107 @@ if __name__ == '__main__':
         }
     }
 
+    return single_chart_titles, dual_charts_titles, chart_descriptions, table_titles, table_descriptions
+
+def report_generator(visualizer, **options):
     prev_week = (datetime.now() - timedelta(weeks=1)).strftime('%U')
-    
-    # Generate the report
-    report = ReportGenerator(
+
+    return ReportGenerator(
         report_title= f'Sample Report for Week {prev_week}', 
         author_name='Han Nguyen - nhn@gridly.com', 
-        created_date=datetime.now().strftime('%Y-%m-%d'), visualizer=visualizer
+        created_date=datetime.now().strftime('%Y-%m-%d'), visualizer=visualizer,
+        **options
     ) 
 
-    single_chart_titles = ['Weekly Active Users']
-    dual_charts_titles = [('Sample Scatter Plot', 'Sample Bubble Chart')]
-    table_titles = ['Weekly Active Users Summary Statistics']
-
-    html_report = report.generate_html_report(single_chart_titles, dual_charts_titles, chart_descriptions, table_titles, table_descriptions)
+def build_report(visualizer, chart_ids):
+    return report_generator(visualizer, embed_mode='shared').generate_html_report(*report_sections(chart_ids))
 
-    output_dir = os.path.join(os.path.dirname(__file__), 'data/output')
-    
-    if not os.path.exists(output_dir):
-        os.mkdir(output_dir)
+def build_static_report(visualizer, chart_ids):
+    # The static variant shows chart images only, for previews that cannot run Plotly. Its image export overlaps the translation stages
+    static_report = report_generator(visualizer, embed_mode='static', image_format='webp', image_max_width=1000)
+    static_html_report = static_report.generate_html_report(*report_sections(chart_ids))
 
-    # Extract text and modify the HTML       
-    selectors = {
-        'tags': ['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'th', 'li'],
-        'classes': ['metadata'],
-        'ids': ['main-title', 'section-header']
-    }    
+    with open(os.path.join(output_dir, 'source_report_static.html'), 'w', encoding='utf-8') as file:
+        file.write(static_html_report)
+        print('Static report saved to {}'.format(os.path.join(output_dir, 'source_report_static.html')))
+    return os.path.join(output_dir, 'source_report_static.html')
 
+def extract_text(html_report):
     data, modified_html = extract(html_report, selectors=selectors, is_file=False)
     save_to_csv(data, os.path.join(output_dir, 'extracted_text.csv'))
 
     with open(os.path.join(output_dir, 'source_report.html'), 'w', encoding='utf-8') as file:
         file.write(modified_html)
         print('Source report saved to {}'.format(os.path.join(output_dir, 'source_report.html')))
-    
-    # Import source text to a Gridly localization grid 
-    API_key = 'YOUR GRIDLY API KEY'
-    view_id = 'YOUR GRIDLY VIEW ID'
-
-    import_request = {
-        'withHeader': True,
-        'backup': False,
-        'columnMappings':[{
-                'columnId': 'column1',
-                'fileColumnIndex':0
-            }, 
-            {
-                'columnId': 'column2',
-                'fileColumnIndex':1
-            }
-        ]
-    }
+    return data, os.path.join(output_dir, 'source_report.html')
 
-    gridly_feature = GridlyFeature(view_id, API_key)
+def translate_text(data):
+    # Only strings missing from the local translation memory go through Gridly
+    translation_memory = TranslationMemory()
+    missing_data = translation_memory.resolve(data, target_languages)
 
-    try:
-        gridly_feature.import_file(os.path.join(output_dir, 'extracted_text.csv'), import_request)
-    except Exception as e:
-        print(e)
-    
-    print("Waiting for translations to complete...")
-    time.sleep(30)  
-    
-    try:
-        gridly_feature.export_file(os.path.join(output_dir, 'exported_text.csv'))
-    except Exception as e:
-        print(e)
-
-    source_html_path = os.path.join(output_dir, 'source_report.html')
-    translations_csv_path = os.path.join(output_dir, 'exported_text.csv')
-    target_languages = ['French', 'Swedish']
-    
-    paths = create_translated_html_files(source_html_path, translations_csv_path, output_dir, target_languages)
+    gridly_feature = GridlyFeature(view_id, API_key)
 
+    if missing_data:
+        # Only records added or changed since the previous run are sent. The view keeps the records of
+        # earlier runs, which are translated already and no longer in missing_data
+        records = {segment['id']: {column_id: segment[field] for field, column_id in column_mappings.items()} for segment in missing_data}
+
+        try:
+            sync_job = gridly_feature.sync_records(records, snapshot_path=os.path.join(output_dir, 'gridly_snapshot.json'), remove_missing=False)
+
+            print("Waiting for translations to complete...")
+            sync_job.wait(column_ids=translation_column_ids, timeout=900)
+        except Exception as e:
+            print(e)
+        
+        try:
+            gridly_feature.export_file(os.path.join(output_dir, 'exported_text.csv'), columns=['id'] + target_languages)
+            translation_memory.store_export(os.path.join(output_dir, 'exported_text.csv'), target_languages, data)
+        except Exception as e:
+            print(e)
+    else:
+        print('Every string is in the translation memory, skipping Gridly.')
+
+    return translation_memory.write_translations(data, target_languages, os.path.join(output_dir, 'translated_text.csv'))
+
+def translate_reports(source_html_path, translations_csv_path):
+    return create_translated_html_files(source_html_path, translations_csv_path, output_dir, target_languages)
+
+def deliver_reports(report_paths, static_report_path):
+    # The static report goes out with the translated ones, for recipients whose preview cannot run the interactive charts
+    file_paths = list(report_paths) + [static_report_path]
     client = SlackClient()
+    return client.deliver_reports({channel_id: file_paths for channel_id in slack_channel_ids}, message)
+
+
+def build_pipeline():
+    # Stages start as soon as their inputs exist: sample files load during the warehouse query,
+    # and the static report exports its images while the text goes through Gridly
+    pipeline = Pipeline()
+    pipeline.add_stage('query_warehouse', query_warehouse, outputs=['extracted_data'])
+    pipeline.add_stage('load_sample_files', load_sample_files, outputs=['sample_datasets'])
+    pipeline.add_stage('prepare_active_users', prepare_active_users, inputs=['extracted_data'], outputs=['active_users_df'])
+    pipeline.add_stage('build_charts', build_charts, inputs=['active_users_df', 'sample_datasets'], outputs=['visualizer', 'chart_ids'])
+    pipeline.add_stage('build_report', build_report, inputs=['visualizer', 'chart_ids'], outputs=['html_report'])
+    pipeline.add_stage('build_static_report', build_static_report, inputs=['visualizer', 'chart_ids'], outputs=['static_report_path'])
+    pipeline.add_stage('extract_text', extract_text, inputs=['html_report'], outputs=['data', 'source_html_path'])
+    pipeline.add_stage('translate_text', translate_text, inputs=['data'], outputs=['translations_csv_path'])
+    pipeline.add_stage('translate_reports', translate_reports, inputs=['source_html_path', 'translations_csv_path'], outputs=['report_paths'])
+    pipeline.add_stage('deliver_reports', deliver_reports, inputs=['report_paths', 'static_report_path'], outputs=['deliveries'])
+    return pipeline
 
-    files = {
-        'YOUR SLACK CHANNEL ID': paths        
-    }
 
-    message = 'Hi guys, here are the localized reports for you!'
+if __name__ == '__main__':
+    start_time = time.time()
+    print('Start time: {}'.format(datetime.now().strftime('%B %d, %Y %H:%M:%S')))
+
+    if not os.path.exists(output_dir):
+        os.mkdir(output_dir)
 
-    for channel_id, file_paths in files.items():
-        client.post_message(channel_id, message)
-        for path in file_paths:
-            file_id = client.upload_file(channel_id, path)
+    pipeline = build_pipeline()
+    pipeline.run()
+    print(pipeline.timing_report())
 
     print('End time: {}'.format(datetime.now().strftime('%B %d, %Y %H:%M:%S')))
     print('Total time: {}'.format(time.time() - start_time))
\ No newline at end of file
@@ -0,0 +1,244 @@
+"""
+In-memory Gridly API served on a local port, for the tests of the Gridly clients.
+
+Each view holds its records in memory. Cells of the target columns stay empty until
+translate_after seconds after the record was written, like a view waiting on machine
+translation, and imported files only show up import_delay seconds after they were
+accepted. Every request is logged with its time, so tests can check paging, polling
+and rate limits.
+"""
+
+import csv
+import gzip
+import io
+import json
+import re
+import threading
+import time
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class MockGridly:
+    """
+    Args:
+        target_columns (list): Columns filled by the mock translation, e.g. ['fr'].
+        translate_after (float): Seconds after a write until its target cells are filled.
+        import_delay (float): Seconds after an import until its records are visible.
+        failing_views (list): Views answering every request with 404.
+    """
+    def __init__(self, target_columns=(), translate_after=0.0, import_delay=0.0, failing_views=()):
+        self.target_columns = list(target_columns)
+        self.translate_after = translate_after
+        self.import_delay = import_delay
+        self.failing_views = set(failing_views)
+        self.views = {}
+        self.requests = []
+        self.failures = []
+        self.failure_interval = None
+        self.lock = threading.Lock()
+        self.server = None
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.server.server_port}/v1'
+
+    def start(self):
+        mock = self
+
+        class Handler(_Handler):
+            pass
+        Handler.mock = mock
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def fail_next(self, status, count=1, retry_after=None, method=None):
+        """
+        Answers the next count requests, or the next count requests of one method, with status, optionally
+        with a Retry-After header.
+        """
+        with self.lock:
+            self.failures.extend([(status, retry_after, method)] * count)
+
+    def fail_every(self, status, interval, retry_after=None):
+        """
+        Answers every interval-th request with status, optionally with a Retry-After header.
+        """
+        with self.lock:
+            self.failure_interval = (status, interval, retry_after)
+
+    def add_records(self, view_id, records, translated=False):
+        """
+        Puts records, cell values keyed by record ID then column ID, in a view.
+        """
+        written_at = 0.0 if translated else time.monotonic()
+        with self.lock:
+            view = self.views.setdefault(view_id, {})
+            for record_id, cells in records.items():
+                view[record_id] = {'cells': dict(cells), 'written_at': written_at, 'visible_at': 0.0}
+
+    def remove_records(self, view_id, record_ids):
+        with self.lock:
+            for record_id in record_ids:
+                self.views.get(view_id, {}).pop(record_id, None)
+
+    def records(self, view_id):
+        """
+        Returns the cell values of the records of a view as a client reads them, keyed by record ID.
+        """
+        with self.lock:
+            return {record_id: self._cells(record) for record_id, record in self.views.get(view_id, {}).items()
+                    if record['visible_at'] <= time.monotonic()}
+
+    def calls(self, method=None, endpoint=None):
+        """
+        Returns the logged (time, method, view, endpoint, content encoding) requests, optionally of one method and endpoint.
+        """
+        return [call for call in self.requests if (method is None or call[1] == method) and (endpoint is None or call[3] == endpoint)]
+
+    def _cells(self, record):
+        cells = dict(record['cells'])
+        translated = time.monotonic() - record['written_at'] >= self.translate_after
+        for column_id in self.target_columns:
+            if not cells.get(column_id):
+                cells[column_id] = f'''{column_id}: {cells.get('column1', '')}''' if translated else ''
+        return cells
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    mock = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b'', headers=None):
+        if isinstance(body, (list, dict)):
+            body = json.dumps(body).encode('utf-8')
+        elif isinstance(body, str):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        return body
+
+    def _dispatch(self):
+        mock = self.mock
+        url = urlparse(self.path)
+        match = re.match(r'^/v1/views/([^/]+)(?:/(\w+))?$', url.path)
+        body = self._body()
+
+        with mock.lock:
+            mock.requests.append((time.monotonic(), self.command, match and match.group(1), match and match.group(2)
+                                  , self.headers.get('Content-Encoding')))
+            failure = next((failure for failure in mock.failures if failure[2] in (None, self.command)), None)
+            if failure is not None:
+                mock.failures.remove(failure)
+            elif mock.failure_interval and len(mock.requests) % mock.failure_interval[1] == 0:
+                failure = (mock.failure_interval[0], mock.failure_interval[2], None)
+
+        if failure is not None:
+            status, retry_after, _ = failure
+            return self._send(status, 'Injected failure', {'Retry-After': str(retry_after)} if retry_after is not None else None)
+        if match is None:
+            return self._send(404, 'Unknown endpoint')
+
+        view_id, endpoint = match.groups()
+        if view_id in mock.failing_views:
+            return self._send(404, f'View {view_id} not found')
+
+        handler = getattr(self, f'_{self.command.lower()}_{endpoint}', None)
+        if handler is None:
+            return self._send(405, 'Method not allowed')
+        with mock.lock:
+            view = mock.views.setdefault(view_id, {})
+            return handler(view, parse_qs(url.query), body)
+
+    do_GET = do_POST = do_PATCH = do_DELETE = _dispatch
+
+    def _get_records(self, view, query, body):
+        page = json.loads(query['page'][0]) if 'page' in query else {'offset': 0, 'limit': 100}
+        column_ids = query['columnIds'][0].split(',') if 'columnIds' in query else None
+
+        now = time.monotonic()
+        records = [(record_id, self.mock._cells(record)) for record_id, record in view.items() if record['visible_at'] <= now]
+        selected = records[page['offset']:page['offset'] + page['limit']]
+        body = [{'id': record_id, 'cells': [{'columnId': column_id, 'value': value} for column_id, value in cells.items()
+                                            if column_ids is None or column_id in column_ids]}
+                for record_id, cells in selected]
+        return self._send(200, body, {'X-Total-Count': str(len(records))})
+
+    def _post_records(self, view, query, body):
+        records = json.loads(body)
+        duplicates = [record['id'] for record in records if record['id'] in view]
+        if duplicates:
+            return self._send(409, f'''Records already exist: {', '.join(duplicates)}''')
+        for record in records:
+            view[record['id']] = {'cells': {cell['columnId']: cell['value'] for cell in record['cells']}
+                                  , 'written_at': time.monotonic(), 'visible_at': 0.0}
+        return self._send(201, records)
+
+    def _patch_records(self, view, query, body):
+        records = json.loads(body)
+        unknown = [record['id'] for record in records if record['id'] not in view]
+        if unknown:
+            return self._send(404, f'''Records not found: {', '.join(unknown)}''')
+        for record in records:
+            view[record['id']]['cells'].update({cell['columnId']: cell['value'] for cell in record['cells']})
+            view[record['id']]['written_at'] = time.monotonic()
+        return self._send(200, records)
+
+    def _delete_records(self, view, query, body):
+        for record_id in json.loads(body)['ids']:
+            view.pop(record_id, None)
+        return self._send(204)
+
+    def _post_import(self, view, query, body):
+        message = BytesParser().parsebytes(b'Content-Type: ' + self.headers['Content-Type'].encode('utf-8') + b'\r\n\r\n' + body)
+        parts = {part.get_param('name', header='content-disposition'): part.get_payload(decode=True) for part in message.get_payload()}
+        import_request = json.loads(parts['importRequest'])
+
+        rows = list(csv.reader(io.StringIO(parts['file'].decode('utf-8'))))
+        if import_request.get('withHeader'):
+            rows = rows[1:]
+
+        visible_at = time.monotonic() + self.mock.import_delay
+        for row in rows:
+            cells = {mapping['columnId']: row[mapping['fileColumnIndex']] for mapping in import_request['columnMappings']}
+            record_id = cells.pop('_recordId', None) or f'record-{len(view)}'
+            view[record_id] = {'cells': cells, 'written_at': visible_at, 'visible_at': visible_at}
+        return self._send(202)
+
+    def _get_export(self, view, query, body):
+        now = time.monotonic()
+        records = [(record_id, self.mock._cells(record)) for record_id, record in view.items() if record['visible_at'] <= now]
+        column_ids = list(dict.fromkeys(column_id for _, cells in records for column_id in cells))
+
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(['id'] + column_ids)
+        for record_id, cells in records:
+            writer.writerow([record_id] + [cells.get(column_id, '') for column_id in column_ids])
+        return self._send(200, output.getvalue(), {'Content-Type': 'text/csv'})
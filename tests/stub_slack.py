@@ -0,0 +1,122 @@
+"""
+Local stub of the Slack Web API methods used by SlackClient, for tests.
+
+files_upload_v2 asks files.getUploadURLExternal for one upload URL per file, posts each
+file to its URL and shares them with files.completeUploadExternal. chat.postMessage posts
+a message. Channels can be set to fail, and the next calls of a method to be rate limited
+with a Retry-After header.
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class StubSlack:
+    """
+    Args:
+        failing_channels (list): Channels answering with channel_not_found.
+    """
+    def __init__(self, failing_channels=()):
+        self.failing_channels = set(failing_channels)
+        self.calls = []
+        self.shared = []
+        self.messages = []
+        self.rate_limited = {}
+        self.file_count = 0
+        self.lock = threading.Lock()
+        self.server = None
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.server.server_port}/api/'
+
+    def start(self):
+        stub = self
+
+        class Handler(_Handler):
+            pass
+        Handler.stub = stub
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def rate_limit(self, method, count=1, retry_after=1):
+        """
+        Answers the next count calls of a method with 429 and a Retry-After header.
+        """
+        with self.lock:
+            self.rate_limited[method] = (count, retry_after)
+
+    def count(self, method):
+        return sum(1 for call in self.calls if call == method)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    stub = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, headers=None):
+        body = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _params(self, body):
+        if self.headers.get('Content-Type', '').startswith('application/json'):
+            return json.loads(body or b'{}')
+        return {name: values[0] for name, values in parse_qs(body.decode('utf-8')).items()}
+
+    def do_POST(self):
+        stub = self.stub
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        method = self.path.split('?')[0].rsplit('/', 1)[-1]
+        params = self._params(body) if self.path.startswith('/api/') else {}
+
+        with stub.lock:
+            stub.calls.append(method)
+            count, retry_after = stub.rate_limited.get(method, (0, None))
+            if count:
+                stub.rate_limited[method] = (count - 1, retry_after)
+
+        if count:
+            return self._send(429, {'ok': False, 'error': 'ratelimited'}, {'Retry-After': str(retry_after)})
+
+        if self.path.startswith('/upload/'):
+            return self._send(200, {'ok': True})
+
+        if method == 'files.getUploadURLExternal':
+            with stub.lock:
+                stub.file_count += 1
+                file_id = f'F{stub.file_count}'
+            return self._send(200, {'ok': True, 'upload_url': f'http://127.0.0.1:{self.server.server_port}/upload/{file_id}', 'file_id': file_id})
+
+        channel_id = params.get('channel_id') or params.get('channel')
+        if channel_id in stub.failing_channels:
+            return self._send(200, {'ok': False, 'error': 'channel_not_found'})
+
+        if method == 'files.completeUploadExternal':
+            files = json.loads(params['files'])
+            with stub.lock:
+                stub.shared.append((channel_id, [file['id'] for file in files], params.get('initial_comment')))
+            return self._send(200, {'ok': True, 'files': [{'id': file['id'], 'title': file.get('title')} for file in files]})
+
+        if method == 'chat.postMessage':
+            with stub.lock:
+                stub.messages.append((channel_id, params.get('text')))
+            return self._send(200, {'ok': True, 'channel': channel_id, 'ts': '1.000'})
+
+        return self._send(200, {'ok': False, 'error': 'unknown_method'})
@@ -0,0 +1,90 @@
+import base64
+import json
+import unittest
+
+import numpy as np
+
+from process.embedding import *
+
+
+def decode_typed_array(spec):
+    array = np.frombuffer(base64.b64decode(spec['bdata']), dtype='<' + spec['dtype'])
+    if 'shape' in spec:
+        array = array.reshape([int(dim) for dim in spec['shape'].split(',')])
+    return array
+
+
+def decode_payload(payload, pool):
+    # What the report bootstrap script hands to Plotly, with the typed arrays decoded
+    def decode(node):
+        if isinstance(node, dict):
+            if 'bdata' in node:
+                return decode_typed_array(node).tolist()
+            return {key: decode(item) for key, item in node.items()}
+        if isinstance(node, list):
+            return [decode(item) for item in node]
+        return node
+    return decode(resolve_references(payload, pool))
+
+
+class FigurePoolTest(unittest.TestCase):
+    def setUp(self):
+        self.figure = {
+            'data': [{
+                'type': 'scatter',
+                'name': 'users',
+                'x': list(range(20)),
+                'y': [value / 3 for value in range(20)],
+                'text': [f'label {value}' for value in range(20)],
+                'marker': {'size': [1, 2, 3]}
+            }, {
+                'type': 'heatmap',
+                'z': [[float(row * 10 + col) for col in range(10)] for row in range(10)],
+                'customdata': [None, 1.5] * 5
+            }],
+            'layout': {'title': {'text': 'Users'}, 'template': {'layout': {'font': {'size': 12}}}}
+        }
+
+    def test_payload_round_trips_to_the_figure(self):
+        pool = FigurePool()
+        payload = pool.encode(json.dumps(self.figure))
+        decoded = decode_payload(payload, pool.entries)
+
+        self.assertEqual(decoded['data'][0]['x'], self.figure['data'][0]['x'])
+        self.assertEqual(decoded['data'][0]['y'], self.figure['data'][0]['y'])
+        self.assertEqual(decoded['data'][0]['text'], self.figure['data'][0]['text'])
+        self.assertEqual(decoded['data'][1]['z'], self.figure['data'][1]['z'])
+        np.testing.assert_equal(decoded['data'][1]['customdata'], [np.nan, 1.5] * 5)
+        self.assertEqual(decoded['layout'], self.figure['layout'])
+
+    def test_encodes_numeric_arrays_as_typed_arrays(self):
+        pool = FigurePool()
+        payload = pool.encode(json.dumps(self.figure))
+
+        x = pool.entries[payload['data'][0]['x']['$ref']]
+        z = pool.entries[payload['data'][1]['z']['$ref']]
+        self.assertEqual(x['dtype'], 'i4')
+        self.assertEqual((z['dtype'], z['shape']), ('f8', '10,10'))
+        # Arrays shorter than MIN_POOLED_ARRAY_LENGTH stay inline
+        self.assertEqual(payload['data'][0]['marker']['size'], [1, 2, 3])
+
+    def test_shares_identical_arrays_between_figures(self):
+        pool = FigurePool()
+        first = pool.encode(json.dumps(self.figure))
+        second = pool.encode(json.dumps(self.figure))
+
+        self.assertEqual(first, second)
+        # x, y, text, z, customdata and the layout template
+        self.assertEqual(len(pool.entries), 6)
+
+    def test_script_tag_cannot_close_the_script_element(self):
+        pool = FigurePool()
+        pool.encode(json.dumps({'data': [{'text': ['</script>'] * 10}], 'layout': {}}))
+
+        tag = pool.script_tag()
+        self.assertEqual(tag.count('</script>'), 1)
+        self.assertIn('<\\/script>', tag)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import threading
+import unittest
+
+from process.fanout import *
+from process.workers import process_pool_context
+
+
+class SegmentSlugsTest(unittest.TestCase):
+    def test_suffixes_colliding_slugs(self):
+        slugs = segment_slugs(['A/B', 'A_B', 'a b', 'EU'])
+
+        self.assertEqual(slugs, {'A/B': 'a_b', 'A_B': 'a_b_2', 'a b': 'a_b_3', 'EU': 'eu'})
+
+    def test_suffix_does_not_reuse_an_existing_slug(self):
+        slugs = segment_slugs(['a_b_2', 'A/B', 'A_B'])
+
+        self.assertEqual(len(set(slugs.values())), 3)
+
+
+class ProcessPoolContextTest(unittest.TestCase):
+    def test_does_not_fork_from_a_multithreaded_parent(self):
+        release = threading.Event()
+        thread = threading.Thread(target=release.wait)
+        thread.start()
+        try:
+            self.assertNotEqual(process_pool_context().get_start_method(), 'fork')
+        finally:
+            release.set()
+            thread.join()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import copy
+import unittest
+
+from process.figure_localization import *
+
+
+class FigureLocalizationTest(unittest.TestCase):
+    def setUp(self):
+        self.figure = {
+            'data': [
+                {'type': 'bar', 'name': 'Users', 'hovertemplate': 'week=%{x}<br>users=%{y}<extra></extra>', 'x': list(range(50)), 'y': list(range(50))},
+                {'type': 'heatmap', 'z': [[1, 2], [3, 4]], 'colorbar': {'title': {'text': 'count'}}}
+            ],
+            'layout': {
+                'title': {'text': 'Weekly users'},
+                'xaxis': {'title': {'text': 'week'}},
+                'yaxis2': {'title': 'users'},
+                'legend': {'title': {'text': ' '}},
+                'annotations': [{'text': 'Showing 50 of 50 points'}]
+            }
+        }
+        self.source = copy.deepcopy(self.figure)
+
+    def test_lists_the_text_fields(self):
+        self.assertEqual(figure_text_fields(self.figure), [
+            (('layout', 'title', 'text'), 'Weekly users'),
+            (('layout', 'xaxis', 'title', 'text'), 'week'),
+            (('layout', 'yaxis2', 'title'), 'users'),
+            (('layout', 'annotations', 0, 'text'), 'Showing 50 of 50 points'),
+            (('data', 0, 'name'), 'Users'),
+            (('data', 0, 'hovertemplate'), 'week'),
+            (('data', 0, 'hovertemplate'), 'users'),
+            (('data', 1, 'colorbar', 'title', 'text'), 'count')
+        ])
+
+    def test_translates_labels_and_shares_everything_else(self):
+        translations = {'Weekly users': 'Utilisateurs par semaine', 'week': 'semaine', 'users': 'utilisateurs', 'Users': 'Utilisateurs'}
+
+        localized, changed = localize_figure(self.figure, figure_text_fields(self.figure), translations)
+
+        self.assertTrue(changed)
+        self.assertEqual(localized['layout']['title']['text'], 'Utilisateurs par semaine')
+        self.assertEqual(localized['layout']['xaxis']['title']['text'], 'semaine')
+        self.assertEqual(localized['layout']['yaxis2']['title'], 'utilisateurs')
+        self.assertEqual(localized['data'][0]['hovertemplate'], 'semaine=%{x}<br>utilisateurs=%{y}<extra></extra>')
+        self.assertEqual(localized['data'][1]['colorbar']['title']['text'], 'count')
+
+        # Data arrays and untranslated branches are the source objects, and the source is unchanged
+        self.assertIs(localized['data'][0]['x'], self.figure['data'][0]['x'])
+        self.assertIs(localized['data'][1], self.figure['data'][1])
+        self.assertIs(localized['layout']['annotations'], self.figure['layout']['annotations'])
+        self.assertEqual(self.figure, self.source)
+
+    def test_reports_unchanged_figures(self):
+        localized, changed = localize_figure(self.figure, figure_text_fields(self.figure), {'week': 'week', 'Other': 'Autre'})
+
+        self.assertFalse(changed)
+        self.assertEqual(localized, self.figure)
+
+
+if __name__ == '__main__':
+    unittest.main()
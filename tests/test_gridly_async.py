@@ -0,0 +1,66 @@
+import csv
+import os
+import tempfile
+import unittest
+
+from process.gridly_async import *
+from tests.mock_gridly import MockGridly
+
+
+class AsyncGridlyClientTest(unittest.TestCase):
+    def setUp(self):
+        self.mock = MockGridly(target_columns=['fr'], translate_after=0.3, failing_views=['bad']).start()
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.mock.stop()
+        self.temp_dir.cleanup()
+
+    def views(self, view_ids):
+        return {
+            view_id: {
+                'export_file_path': os.path.join(self.temp_dir.name, f'{view_id}.csv'),
+                'records': {f'{view_id}{i}': {'column1': f'{view_id}{i}', 'column2': f'Source text {i}'} for i in range(3)},
+                'column_ids': ['fr'],
+                'columns': ['id', 'fr']
+            }
+            for view_id in view_ids
+        }
+
+    def test_failing_view_does_not_stop_the_others(self):
+        client = AsyncGridlyClient('key', base_url=self.mock.base_url, requests_per_second=50)
+        try:
+            results = client.run(self.views(['a', 'bad', 'b']))
+        finally:
+            client.close()
+
+        self.assertIsInstance(results['bad'], Exception)
+        for view_id in ['a', 'b']:
+            self.assertEqual(set(results[view_id]['timings']), {'send', 'wait', 'export'})
+            with open(results[view_id]['path'], newline='', encoding='utf-8') as f:
+                rows = list(csv.reader(f))
+            self.assertEqual(rows[0], ['id', 'fr'])
+            self.assertEqual(rows[1:], [[f'{view_id}{i}', f'fr: {view_id}{i}'] for i in range(3)])
+
+    def test_requests_and_retries_share_the_rate_limit(self):
+        self.mock.translate_after = 0
+        self.mock.fail_every(429, 3, retry_after=0)
+        client = AsyncGridlyClient('key', base_url=self.mock.base_url, requests_per_second=10)
+        try:
+            results = client.run(self.views(['a', 'b', 'c', 'd', 'e', 'f']))
+        finally:
+            client.close()
+
+        self.assertFalse(any(isinstance(result, Exception) for result in results.values()))
+
+        # A burst of 10 requests, the bucket capacity, then one more per 100 ms, retries included
+        times = sorted(call[0] for call in self.mock.calls())
+        self.assertGreater(len(times), 30)
+        for position in range(len(times)):
+            in_window = sum(1 for time_ in times[position:] if time_ - times[position] < 1)
+            self.assertLessEqual(in_window, 10 + 10 + 2)
+        self.assertGreaterEqual(times[-1] - times[0], (len(times) - 10) / 10 * 0.9)
+
+
+if __name__ == '__main__':
+    unittest.main()
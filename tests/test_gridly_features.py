@@ -0,0 +1,230 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from process.gridly_features import *
+from process.rate_limit import TokenBucket
+from tests.mock_gridly import MockGridly
+
+
+def source_records(count, prefix='s'):
+    return {f'{prefix}{i}': {'column1': f'{prefix}{i}', 'column2': f'Source text {i}'} for i in range(count)}
+
+
+class GridlyFeatureTest(unittest.TestCase):
+    def setUp(self):
+        self.mock = MockGridly(target_columns=['fr']).start()
+        # Short retry backoff, so the tests of retried requests run fast
+        self.feature = GridlyFeature('view', 'key', base_url=self.mock.base_url, session=create_session(backoff_factor=0.01))
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.feature.session.close()
+        self.mock.stop()
+        self.temp_dir.cleanup()
+
+
+class BackoffDelayTest(unittest.TestCase):
+    def test_delay_grows_with_attempts_up_to_max_delay(self):
+        for attempt, limit in [(0, 1), (1, 2), (3, 8), (10, 30)]:
+            delays = [backoff_delay(attempt, initial_delay=1, max_delay=30, backoff=2) for _ in range(200)]
+            self.assertTrue(all(0 <= delay <= limit for delay in delays))
+            self.assertGreater(max(delays), limit / 2)
+
+
+class GetRecordsTest(GridlyFeatureTest):
+    def test_reads_every_page(self):
+        self.mock.add_records('view', source_records(25))
+
+        records = list(self.feature.get_records(page_size=10))
+
+        self.assertEqual([record['id'] for record in records], [f's{i}' for i in range(25)])
+        self.assertEqual(len(self.mock.calls('GET', 'records')), 3)
+
+    def test_stops_at_total_count_without_reading_an_empty_page(self):
+        self.mock.add_records('view', source_records(20))
+
+        records = list(self.feature.get_records(page_size=10))
+
+        self.assertEqual(len(records), 20)
+        self.assertEqual(len(self.mock.calls('GET', 'records')), 2)
+
+    def test_returns_only_requested_columns(self):
+        self.mock.add_records('view', source_records(3))
+
+        records = list(self.feature.get_records(column_ids=['column1']))
+
+        self.assertEqual([[cell['columnId'] for cell in record['cells']] for record in records], [['column1']] * 3)
+
+
+class ImportJobWaitTest(GridlyFeatureTest):
+    def import_sample(self, count=5):
+        path = os.path.join(self.temp_dir.name, 'source.csv')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('id,content\n' + ''.join(f's{i},Source text {i}\n' for i in range(count)))
+        import_request = {'withHeader': True, 'columnMappings': [{'columnId': 'column1', 'fileColumnIndex': 0}
+                                                                 , {'columnId': 'column2', 'fileColumnIndex': 1}]}
+        return self.feature.import_file(path, import_request)
+
+    def test_waits_until_imported_records_are_visible(self):
+        self.mock.import_delay = 0.3
+        job = self.import_sample()
+        self.assertEqual(len(job.pending()), 5)
+
+        elapsed = job.wait(initial_delay=0.05, max_delay=0.1)
+
+        self.assertGreaterEqual(elapsed, 0.2)
+        self.assertEqual(job.pending(), set())
+
+    def test_waits_until_target_columns_are_filled(self):
+        self.mock.translate_after = 0.3
+        job = self.import_sample()
+
+        job.wait(initial_delay=0.05, max_delay=0.1)
+        self.assertEqual(len(job.pending(column_ids=['fr'])), 5)
+
+        job.wait(column_ids=['fr'], initial_delay=0.05, max_delay=0.1)
+        self.assertEqual(job.pending(column_ids=['fr']), set())
+        self.assertGreater(len(self.mock.calls('GET', 'records')), 3)
+
+    def test_polls_less_often_as_the_wait_grows(self):
+        self.mock.translate_after = 1.0
+        job = self.import_sample()
+
+        job.wait(column_ids=['fr'], initial_delay=0.01, max_delay=1, backoff=4)
+
+        # Up to 1 + 4 + 16 + 64 + 256 ms of sleep covers the second the translation takes
+        self.assertLessEqual(len(self.mock.calls('GET', 'records')), 12)
+
+    def test_raises_at_the_deadline(self):
+        self.mock.translate_after = 60
+        job = self.import_sample()
+
+        start_time = time.monotonic()
+        with self.assertRaises(TimeoutError):
+            job.wait(column_ids=['fr'], timeout=0.5, initial_delay=0.1, max_delay=10)
+
+        # The last sleep is cut short at the deadline instead of running its full backoff
+        self.assertLess(time.monotonic() - start_time, 1.0)
+
+
+class RequestTest(GridlyFeatureTest):
+    def test_retries_server_errors_and_rate_limits(self):
+        self.mock.add_records('view', source_records(3))
+        self.mock.fail_next(503)
+        self.mock.fail_next(429, retry_after=0)
+
+        self.assertEqual(len(list(self.feature.get_records())), 3)
+        self.assertEqual(len(self.mock.calls('GET', 'records')), 3)
+
+    def test_retries_rate_limited_writes(self):
+        self.mock.fail_next(429, retry_after=0, method='POST')
+
+        self.feature.sync_records(source_records(3))
+
+        self.assertEqual(len(self.mock.calls('POST', 'records')), 2)
+        self.assertEqual(set(self.mock.records('view')), {'s0', 's1', 's2'})
+
+    def test_retries_wait_on_the_rate_limiter(self):
+        rate_limiter = TokenBucket(20, capacity=1)
+        feature = GridlyFeature('view', 'key', base_url=self.mock.base_url, rate_limiter=rate_limiter
+                                , session=create_session(backoff_factor=0, rate_limiter=rate_limiter))
+        self.mock.add_records('view', source_records(3))
+        self.mock.fail_next(503, count=4)
+
+        self.assertEqual(len(list(feature.get_records())), 3)
+        feature.session.close()
+
+        times = [call[0] for call in self.mock.calls('GET', 'records')]
+        self.assertEqual(len(times), 5)
+        # One token every 50 ms, for the retries as for the first attempt
+        self.assertGreater(min(later - earlier for earlier, later in zip(times, times[1:])), 0.04)
+
+    def test_compresses_json_bodies_only(self):
+        self.feature.compress_requests = True
+        self.feature.sync_records(source_records(50))
+
+        path = os.path.join(self.temp_dir.name, 'source.csv')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('id,content\n' + ''.join(f'f{i},Source text {i}\n' for i in range(50)))
+        self.feature.import_file(path, {'withHeader': True, 'columnMappings': [{'columnId': 'column1', 'fileColumnIndex': 0}]})
+
+        self.assertEqual([call[4] for call in self.mock.calls('POST', 'records')], ['gzip'])
+        self.assertEqual([call[4] for call in self.mock.calls('POST', 'import')], [None])
+        self.assertEqual(len(self.mock.records('view')), 100)
+
+
+
+class SyncRecordsTest(GridlyFeatureTest):
+    def setUp(self):
+        super().setUp()
+        self.snapshot_path = os.path.join(self.temp_dir.name, 'snapshot.json')
+
+    def test_sends_only_changes(self):
+        records = source_records(30)
+        self.feature.sync_records(records, batch_size=10)
+        self.assertEqual(len(self.mock.calls('POST', 'records')), 3)
+
+        records['s1']['column2'] = 'Changed text'
+        del records['s2']
+        records['new'] = {'column1': 'new', 'column2': 'New text'}
+        job = self.feature.sync_records(records, batch_size=10)
+
+        self.assertEqual(job.keys, {'s1', 'new'})
+        self.assertEqual(len(self.mock.calls('PATCH', 'records')), 1)
+        self.assertEqual(len(self.mock.calls('DELETE', 'records')), 1)
+        self.assertEqual({record_id: cells['column2'] for record_id, cells in self.mock.records('view').items()}
+                         , {record_id: cells['column2'] for record_id, cells in records.items()})
+
+    def test_keeps_records_of_earlier_runs_without_remove_missing(self):
+        self.feature.sync_records(source_records(5), snapshot_path=self.snapshot_path)
+
+        self.feature.sync_records(source_records(3, prefix='t'), snapshot_path=self.snapshot_path, remove_missing=False)
+
+        self.assertEqual(len(self.mock.records('view')), 8)
+        self.assertEqual(self.mock.calls('DELETE'), [])
+
+    def test_snapshot_saves_reading_the_view(self):
+        self.feature.sync_records(source_records(30), snapshot_path=self.snapshot_path)
+        reads = len(self.mock.calls('GET', 'records'))
+
+        records = source_records(30)
+        records['s3']['column2'] = 'Changed text'
+        job = self.feature.sync_records(records, snapshot_path=self.snapshot_path)
+
+        # Only the one-record page counting the records of the view
+        self.assertEqual(len(self.mock.calls('GET', 'records')), reads + 1)
+        self.assertEqual(job.keys, {'s3'})
+
+    def test_reads_the_view_when_the_snapshot_misses_records(self):
+        self.feature.sync_records(source_records(5), snapshot_path=self.snapshot_path)
+        self.mock.add_records('view', {'other': {'column1': 'other', 'column2': 'Added in Gridly'}})
+
+        self.feature.sync_records({'other': {'column1': 'other', 'column2': 'Added in Gridly'}}, snapshot_path=self.snapshot_path
+                                  , remove_missing=False)
+
+        # The record added in Gridly is not posted again
+        self.assertEqual(len(self.mock.calls('POST', 'records')), 1)
+        self.assertEqual(len(self.mock.records('view')), 6)
+
+    def test_reads_the_view_when_a_batch_sent_from_the_snapshot_fails(self):
+        self.feature.sync_records(source_records(2), snapshot_path=self.snapshot_path)
+        # Same record count, different records: s0 deleted and s5 added in Gridly
+        self.mock.remove_records('view', ['s0'])
+        self.mock.add_records('view', {'s5': {'column1': 's5', 'column2': 'Added in Gridly'}})
+
+        records = {'s0': {'column1': 's0', 'column2': 'Changed text'}, 's5': {'column1': 's5', 'column2': 'Source text 5'}}
+        job = self.feature.sync_records(records, snapshot_path=self.snapshot_path, remove_missing=False)
+
+        self.assertEqual(job.keys, {'s0', 's5'})
+        self.assertEqual({record_id: cells['column2'] for record_id, cells in self.mock.records('view').items()}
+                         , {'s0': 'Changed text', 's1': 'Source text 1', 's5': 'Source text 5'})
+
+        with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+            self.assertEqual(set(json.load(f)), {'s0', 's1', 's5'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import importlib.util
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from process.render_cache import RenderCache
+
+# constants.configs reads these when main is imported
+os.environ.setdefault('REDSHIFT_PORT', '5439')
+os.environ.setdefault('MYSQL_PORT', '3306')
+
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'src'))
+
+
+@unittest.skipUnless(importlib.util.find_spec('redshift_connector'), 'main.py needs the full set of requirements')
+class MainPipelineTest(unittest.TestCase):
+    """
+    Runs every stage of main.py, with the warehouse query, Gridly and Slack replaced by stubs.
+    """
+    def setUp(self):
+        import main
+        import process.generator
+        self.main = main
+        self.generator = process.generator
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.output_dir = os.path.join(self.temp_dir.name, 'output')
+        os.mkdir(self.output_dir)
+
+        # Keep the chart images and template bytecode out of the source tree
+        self.template_cache_dir = self.generator.template_cache_dir
+        self.generator.set_template_cache_dir(os.path.join(self.temp_dir.name, 'template_cache'))
+        self.chart_specs = [{**spec, 'output_dir': os.path.join(self.temp_dir.name, 'images/')} if spec.get('kind', 'chart') == 'chart' else spec
+                            for spec in main.chart_specs]
+
+        rng = np.random.default_rng(0)
+        pd.DataFrame({'X': rng.random(50), 'Y': rng.random(50)}).to_csv(os.path.join(self.temp_dir.name, 'scatterPlotData.csv'), index=False)
+        pd.DataFrame({'X': rng.random(50), 'Y': rng.random(50), 'Size': rng.integers(1, 9, 50)}) \
+            .to_csv(os.path.join(self.temp_dir.name, 'BubbleChartData.csv'), index=False)
+        pd.DataFrame({
+            'month': pd.date_range('2024-01-01', periods=6, freq='MS'),
+            '#_new_users': range(6),
+            'accumulated_new_users': range(6),
+            '#_active_users': range(6),
+            '#_events_occurred': range(6)
+        }).to_csv(os.path.join(self.temp_dir.name, 'UserActivityData.csv'), index=False)
+
+    def tearDown(self):
+        self.generator.set_template_cache_dir(self.template_cache_dir)
+        self.temp_dir.cleanup()
+
+    def query_warehouse(self):
+        return pd.DataFrame({'user_id': [str(i % 40) for i in range(400)], 'date': pd.date_range('2024-01-01', periods=400, freq='12h')})
+
+    def translate_text(self, data):
+        path = os.path.join(self.output_dir, 'translated_text.csv')
+        pd.DataFrame({
+            'id': [segment['id'] for segment in data],
+            'French': ['FR ' + segment['content'] for segment in data],
+            'Swedish': ['SV ' + segment['content'] for segment in data]
+        }).to_csv(path, index=False)
+        return path
+
+    def test_runs_every_stage(self):
+        stubs = {
+            'base_dir': self.temp_dir.name + '/',
+            'output_dir': self.output_dir,
+            'chart_specs': self.chart_specs,
+            'RenderCache': lambda: RenderCache(cache_dir=os.path.join(self.temp_dir.name, 'cache')),
+            'query_warehouse': self.query_warehouse,
+            'translate_text': self.translate_text,
+            'deliver_reports': lambda report_paths, static_report_path: {'C1': {'file_ids': report_paths + [static_report_path], 'error': None}}
+        }
+        with mock.patch.multiple(self.main, **stubs):
+            pipeline = self.main.build_pipeline()
+            values = pipeline.run()
+
+        self.assertEqual(set(pipeline.timings), set(pipeline.stages))
+        self.assertEqual(len(values['chart_ids']), 4)
+        self.assertTrue(os.path.exists(values['static_report_path']))
+        self.assertTrue(values['data'])
+
+        file_paths = values['deliveries']['C1']['file_ids']
+        self.assertEqual(file_paths, values['report_paths'] + [values['static_report_path']])
+        self.assertEqual(len(values['report_paths']), len(self.main.target_languages))
+        with open(file_paths[0], encoding='utf-8') as f:
+            self.assertIn('FR ', f.read())
+
+        self.assertTrue(os.listdir(os.path.join(self.temp_dir.name, 'images')))
+        self.assertTrue(os.listdir(os.path.join(self.temp_dir.name, 'template_cache')))
+
+
+if __name__ == '__main__':
+    unittest.main()
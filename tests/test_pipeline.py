@@ -0,0 +1,89 @@
+import time
+import unittest
+from unittest import mock
+
+from process.pipeline import *
+
+
+def square(value):
+    return value * value
+
+
+def wait_and_return(value, seconds=0.3):
+    time.sleep(seconds)
+    return value
+
+
+class PipelineTest(unittest.TestCase):
+    def test_passes_values_between_stages(self):
+        pipeline = Pipeline()
+        pipeline.add_stage('split', lambda text: tuple(text.split(',')), inputs=['text'], outputs=['first', 'second'])
+        pipeline.add_stage('join', lambda first, second: second + first, inputs=['first', 'second'], outputs=['joined'])
+
+        values = pipeline.run({'text': 'a,b'})
+
+        self.assertEqual(values['joined'], 'ba')
+        self.assertEqual(pipeline.critical_path(), ['split', 'join'])
+
+    def test_runs_independent_stages_at_the_same_time(self):
+        pipeline = Pipeline(max_threads=2)
+        pipeline.add_stage('query', lambda: wait_and_return(1), outputs=['queried'])
+        pipeline.add_stage('load', lambda: wait_and_return(2), outputs=['loaded'])
+        pipeline.add_stage('combine', lambda queried, loaded: queried + loaded, inputs=['queried', 'loaded'], outputs=['total'])
+
+        start_time = time.perf_counter()
+        values = pipeline.run()
+
+        self.assertEqual(values['total'], 3)
+        self.assertLess(time.perf_counter() - start_time, 0.55)
+        self.assertIn('combine', pipeline.timing_report())
+
+    def test_rejects_a_wrong_number_of_outputs(self):
+        pipeline = Pipeline()
+        pipeline.add_stage('split', lambda: ('a', 'b', 'c'), outputs=['first', 'second'])
+
+        with self.assertRaisesRegex(ValueError, "'split' returned 3 values for its 2 outputs"):
+            pipeline.run()
+
+    def test_rejects_invalid_graphs(self):
+        pipeline = Pipeline()
+        pipeline.add_stage('a', square, inputs=['value'], outputs=['b_value'])
+        pipeline.add_stage('b', square, inputs=['b_value'], outputs=['value'])
+        with self.assertRaisesRegex(ValueError, 'cycle'):
+            pipeline.run()
+
+        pipeline = Pipeline()
+        pipeline.add_stage('a', square, inputs=['missing'], outputs=['result'])
+        with self.assertRaisesRegex(ValueError, 'no stage produces'):
+            pipeline.run()
+
+        pipeline = Pipeline()
+        pipeline.add_stage('a', square, inputs=['value'], outputs=['value'])
+        with self.assertRaisesRegex(ValueError, 'produced more than once'):
+            pipeline.run({'value': 2})
+
+    def test_starts_a_process_pool_only_for_process_stages(self):
+        pipeline = Pipeline()
+        pipeline.add_stage('square', square, inputs=['value'], outputs=['squared'])
+
+        with mock.patch('process.pipeline.ProcessPoolExecutor') as process_pool:
+            self.assertEqual(pipeline.run({'value': 3})['squared'], 9)
+        process_pool.assert_not_called()
+
+    def test_runs_process_stages(self):
+        pipeline = Pipeline(max_processes=1)
+        pipeline.add_stage('square', square, inputs=['value'], outputs=['squared'], executor='process')
+        pipeline.add_stage('add_one', lambda squared: squared + 1, inputs=['squared'], outputs=['result'])
+
+        self.assertEqual(pipeline.run({'value': 3})['result'], 10)
+
+    def test_stage_failure_stops_the_run(self):
+        pipeline = Pipeline()
+        pipeline.add_stage('fail', lambda: 1 / 0, outputs=['never'])
+
+        with self.assertRaises(ZeroDivisionError):
+            pipeline.run()
+
+
+if __name__ == '__main__':
+    unittest.main()
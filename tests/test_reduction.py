@@ -0,0 +1,109 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from process.reduction import *
+
+
+class DownsamplingTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.x = np.arange(10_000, dtype=float)
+        self.y = np.cumsum(rng.normal(size=10_000))
+        # Spikes that a shape-preserving downsampling must keep
+        self.y[1234] = 500
+        self.y[8765] = -500
+
+    def test_lttb_keeps_the_endpoints_and_spikes(self):
+        indices = lttb_indices(self.x, self.y, 500)
+
+        self.assertEqual(len(indices), 500)
+        self.assertEqual((indices[0], indices[-1]), (0, 9999))
+        self.assertTrue(np.all(np.diff(indices) > 0))
+        self.assertIn(1234, indices)
+        self.assertIn(8765, indices)
+
+    def test_minmax_keeps_the_endpoints_and_every_bucket_extremum(self):
+        indices = minmax_indices(self.y, 500)
+
+        self.assertLessEqual(len(indices), 502)
+        self.assertEqual((indices[0], indices[-1]), (0, 9999))
+        self.assertEqual(self.y[indices].max(), self.y.max())
+        self.assertEqual(self.y[indices].min(), self.y.min())
+
+        edges = np.linspace(0, 10_000, 251).astype(np.int64)
+        for start, end in zip(edges[:-1], edges[1:]):
+            self.assertIn(start + np.argmax(self.y[start:end]), indices)
+            self.assertIn(start + np.argmin(self.y[start:end]), indices)
+
+    def test_small_series_are_kept_whole(self):
+        self.assertEqual(list(lttb_indices(self.x[:10], self.y[:10], 20)), list(range(10)))
+        self.assertEqual(list(minmax_indices(self.y[:10], 20)), list(range(10)))
+
+    def test_downsample_series_skips_missing_dates_and_values(self):
+        dataframe = pd.DataFrame({'date': pd.date_range('2024-01-01', periods=10_000, freq='min'), 'value': self.y})
+        dataframe.loc[[0, 5000], 'date'] = pd.NaT
+        dataframe.loc[[9999, 7000], 'value'] = np.nan
+
+        for method in DOWNSAMPLING_METHODS:
+            result = downsample_series(dataframe, 'date', 'value', 500, method=method)
+
+            self.assertLessEqual(len(result), 502)
+            self.assertFalse(result['date'].isna().any())
+            self.assertFalse(result['value'].isna().any())
+            self.assertTrue(result['date'].is_monotonic_increasing)
+            self.assertEqual(result['value'].max(), 500)
+            self.assertEqual(result['date'].iloc[0], pd.Timestamp('2024-01-01 00:01'))
+
+    def test_downsample_series_keeps_multiple_series_aligned(self):
+        dataframe = pd.DataFrame({'x': self.x, 'a': self.y, 'b': -self.y})
+
+        result = downsample_series(dataframe, 'x', ['a', 'b'], 1000)
+
+        self.assertLessEqual(len(result), 1000)
+        self.assertTrue(result['x'].is_monotonic_increasing)
+        pd.testing.assert_series_equal(result['b'], -result['a'], check_names=False)
+
+
+class TopNWithOtherTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.dataframe = pd.DataFrame({
+            'category': rng.choice([f'c{i}' for i in range(50)], 2000),
+            'value': rng.integers(0, 100, 2000),
+            'count': rng.integers(0, 10, 2000)
+        })
+
+    def test_keeps_the_largest_categories_and_exact_totals(self):
+        result = top_n_with_other(self.dataframe, 'category', 'value', 5)
+        totals = self.dataframe.groupby('category')['value'].sum().sort_values(ascending=False, kind='stable')
+
+        self.assertEqual(list(result['category']), list(totals.index[:5]) + ['Other'])
+        self.assertEqual(list(result['value'][:5]), list(totals[:5]))
+        self.assertEqual(result['value'].iloc[-1], totals[5:].sum())
+        self.assertEqual(result['value'].sum(), self.dataframe['value'].sum())
+
+    def test_ranks_on_the_total_of_every_value_column(self):
+        result = top_n_with_other(self.dataframe, 'category', ['value', 'count'], 3)
+
+        self.assertEqual(result[['value', 'count']].sum().tolist(), self.dataframe[['value', 'count']].sum().tolist())
+        kept = result[['value', 'count']].iloc[:3].sum(axis=1)
+        self.assertTrue(kept.is_monotonic_decreasing)
+
+    def test_merges_an_existing_other_category_into_the_rolled_up_row(self):
+        dataframe = pd.DataFrame({'category': ['Other', 'a', 'b', 'c', 'Other'], 'value': [100, 5, 4, 3, 1]})
+
+        result = top_n_with_other(dataframe, 'category', 'value', 2)
+
+        self.assertEqual(list(result['category']), ['a', 'b', 'Other'])
+        self.assertEqual(list(result['value']), [5, 4, 104])
+
+    def test_returns_small_datasets_unchanged(self):
+        dataframe = self.dataframe[self.dataframe['category'].isin(['c1', 'c2'])]
+
+        self.assertIs(top_n_with_other(dataframe, 'category', 'value', 5), dataframe)
+
+
+if __name__ == '__main__':
+    unittest.main()
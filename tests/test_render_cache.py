@@ -0,0 +1,52 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from process.render_cache import *
+
+
+class RenderCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.temp_dir.name, 'cache')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_keys_follow_contents_and_parameters(self):
+        dataframe = pd.DataFrame({'x': [1, 2], 'y': [3, 4]})
+
+        self.assertEqual(make_cache_key('chart', dataframe, {'title': 'a'}), make_cache_key('chart', dataframe.copy(), {'title': 'a'}))
+        self.assertNotEqual(make_cache_key('chart', dataframe, {'title': 'a'}), make_cache_key('chart', dataframe, {'title': 'b'}))
+        self.assertNotEqual(make_cache_key('chart', dataframe, {}), make_cache_key('chart', dataframe.assign(y=[3, 5]), {}))
+
+    def test_hits_write_the_index_once_at_close(self):
+        with RenderCache(self.cache_dir) as cache:
+            for key in 'abc':
+                cache.put(key, f'<div>{key}</div>')
+
+            with mock.patch.object(cache, '_save_index', wraps=cache._save_index) as save_index:
+                for _ in range(100):
+                    self.assertEqual(cache.get('a')['html'], '<div>a</div>')
+                self.assertEqual(save_index.call_count, 0)
+
+        # The recency of the hits survives the cache
+        self.assertEqual(list(RenderCache(self.cache_dir).index), ['b', 'c', 'a'])
+
+    def test_evicts_the_least_recently_used_entries(self):
+        cache = RenderCache(self.cache_dir, max_entries=2)
+        cache.put('a', 'a')
+        cache.put('b', 'b')
+        cache.get('a')
+        cache.put('c', 'c')
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a')['html'], 'a')
+        self.assertEqual(sorted(RenderCache(self.cache_dir).index), ['a', 'c'])
+
+
+if __name__ == '__main__':
+    unittest.main()
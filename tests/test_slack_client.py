@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+
+# constants.configs reads these when slack_client is imported
+os.environ.setdefault('REDSHIFT_PORT', '5439')
+os.environ.setdefault('MYSQL_PORT', '3306')
+
+from process.slack_client import *
+from tests.stub_slack import StubSlack
+
+
+class SlackClientTest(unittest.TestCase):
+    def setUp(self):
+        self.stub = StubSlack(failing_channels=['C_BAD']).start()
+        self.client = SlackClient(token='xoxb-test', base_url=self.stub.base_url)
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.paths = []
+        for index in range(12):
+            self.paths.append(os.path.join(self.temp_dir.name, f'report_{index}.html'))
+            with open(self.paths[-1], 'w', encoding='utf-8') as f:
+                f.write(f'<p>Report {index}</p>')
+
+    def tearDown(self):
+        self.stub.stop()
+        self.temp_dir.cleanup()
+
+    def test_delivers_files_with_the_message_in_batches(self):
+        self.stub.rate_limit('files.completeUploadExternal', retry_after=0)
+
+        deliveries = self.client.deliver_reports({'C1': self.paths, 'C2': self.paths[:1]}, 'Weekly reports')
+
+        self.assertIsNone(deliveries['C1']['error'])
+        self.assertEqual(len(deliveries['C1']['file_ids']), 12)
+        self.assertEqual(len(deliveries['C2']['file_ids']), 1)
+        # Two batches for C1, one for C2, and the rate limited call retried
+        self.assertEqual(self.stub.count('files.completeUploadExternal'), 4)
+        comments = sorted((channel_id, len(file_ids), comment) for channel_id, file_ids, comment in self.stub.shared)
+        self.assertEqual(comments, [('C1', 2, None), ('C1', 10, 'Weekly reports'), ('C2', 1, 'Weekly reports')])
+
+    def test_failing_channel_does_not_stop_the_others(self):
+        deliveries = self.client.deliver_reports({'C_BAD': self.paths[:2], 'C1': self.paths[:2]}, 'Weekly reports')
+
+        self.assertEqual(deliveries['C_BAD']['file_ids'], [])
+        self.assertIn('channel_not_found', deliveries['C_BAD']['error'])
+        self.assertEqual(len(deliveries['C1']['file_ids']), 2)
+        self.assertIsNone(deliveries['C1']['error'])
+
+    def test_keeps_the_ids_uploaded_before_an_error(self):
+        paths = self.paths[:10] + [os.path.join(self.temp_dir.name, 'missing.html')]
+
+        deliveries = self.client.deliver_reports({'C1': paths})
+
+        self.assertEqual(len(deliveries['C1']['file_ids']), 10)
+        self.assertIsNotNone(deliveries['C1']['error'])
+
+    def test_posts_the_message_to_channels_without_files(self):
+        deliveries = self.client.deliver_reports({'C1': [], 'C_BAD': []}, 'No reports this week')
+
+        self.assertEqual(self.stub.messages, [('C1', 'No reports this week')])
+        self.assertEqual(deliveries['C1'], {'file_ids': [], 'error': None})
+        self.assertIsNotNone(deliveries['C_BAD']['error'])
+
+    def test_shared_client_gets_one_retry_handler(self):
+        SlackClient(client=self.client.client)
+        SlackClient(client=self.client.client)
+
+        handlers = [handler for handler in self.client.client.retry_handlers if isinstance(handler, RateLimitErrorRetryHandler)]
+        self.assertEqual(len(handlers), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
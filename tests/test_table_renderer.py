@@ -0,0 +1,44 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from process.table_renderer import *
+from process.table_renderer import _format_column
+
+
+class FormatColumnTest(unittest.TestCase):
+    def test_numbers_match_the_styler_format(self):
+        rng = np.random.default_rng(0)
+        values = np.concatenate([rng.normal(0, 1e6, 2000), rng.normal(0, 1, 2000), rng.integers(-4000, 4000, 2000) / 8
+                                 , [0.5, 2.5, -0.4, -0.0, 2.675, 1.005, 999.5, 999999.5, 1e300, np.inf, -np.inf]])
+
+        for rounded_by in [0, 2, 3]:
+            expected = [f'{{:,.{rounded_by}f}}'.format(value) for value in values]
+            self.assertEqual(list(_format_column(pd.Series(values), rounded_by)), expected)
+
+    def test_missing_values_are_empty(self):
+        self.assertEqual(list(_format_column(pd.Series([1.5, None, np.nan]), 1)), ['1.5', '', ''])
+        self.assertEqual(list(_format_column(pd.Series([3, None], dtype='Int64'), 0)), ['3', ''])
+        self.assertEqual(list(_format_column(pd.Series(['a', None, np.nan], dtype=object), 0)), ['a', '', ''])
+        self.assertEqual(list(_format_column(pd.Series(pd.to_datetime(['2024-01-02', None])), 0)), ['2024-01-02', ''])
+
+    def test_escapes_text(self):
+        self.assertEqual(list(_format_column(pd.Series(['<b>"A" & \'B\'</b>']), 0)), ['&lt;b&gt;&quot;A&quot; &amp; &#x27;B&#x27;&lt;/b&gt;'])
+
+
+class RenderTableHtmlTest(unittest.TestCase):
+    def test_renders_every_row_without_modifying_the_dataframe(self):
+        dataframe = pd.DataFrame({'name': ['a', None, 'c'], 'value': [1000.0, None, -5.0]})
+        before = dataframe.copy()
+
+        table_html = render_table_html(dataframe, highlight_columns=['value'], rounded_by=1)
+
+        self.assertEqual(table_html.count('<tr>'), 4)
+        self.assertIn('1,000.0', table_html)
+        self.assertNotIn('None', table_html)
+        pd.testing.assert_frame_equal(dataframe, before)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+import io
+import json
+import re
+import unittest
+from unittest import mock
+
+from process import translation_flow
+from process.embedding import json_script_tag
+from process.translation_flow import *
+
+SELECTORS = {'tags': ['h1', 'p', 'li'], 'classes': ['note'], 'ids': ['footer']}
+
+SOURCE_HTML = '''<!DOCTYPE html>
+<html><head><title>Report</title><style>p::before { content: "<p>Not text</p>"; }</style></head>
+<body>
+<h1 id="title">Weekly &amp; monthly report</h1>
+<p>Active users grew.</p>
+<div class="note card">Data is <b>preliminary</b>.</div>
+<ul><li>First item<li>Second item</ul>
+<p>Active users grew.</p>
+<script>var html = "<p>Not text</p>";</script>
+<div id="footer">Made by the data team</div><div id="footer">Duplicate footer</div>
+<img src="a.png"><br/>
+</body></html>'''
+
+
+def strip_segment_ids(html_content):
+    return re.sub(f' {SEGMENT_ID_ATTRIBUTE}="[^"]*"', '', html_content)
+
+
+class ExtractTest(unittest.TestCase):
+    def test_extracts_the_text_of_selected_elements(self):
+        data, _ = extract(SOURCE_HTML, is_file=False, selectors=SELECTORS)
+
+        self.assertEqual([segment['content'] for segment in data], [
+            'Weekly & monthly report', 'Active users grew.', 'Data ispreliminary.', 'First item', 'Second item', 'Made by the data team'
+        ])
+        self.assertEqual([segment['id'] for segment in data], [segment_id(segment['content']) for segment in data])
+
+    def test_copies_the_document_and_only_adds_segment_ids(self):
+        _, modified_html = extract(SOURCE_HTML, is_file=False, selectors=SELECTORS)
+
+        # Implied end tags are written out, everything else is copied as it is
+        self.assertEqual(strip_segment_ids(modified_html), SOURCE_HTML.replace('<li>First item<li>', '<li>First item</li><li>')
+                         .replace('Second item</ul>', 'Second item</li></ul>'))
+        self.assertIn('<h1 id="title" data-segment-id=', modified_html)
+        self.assertIn('&amp; monthly', modified_html)
+
+    def test_elements_with_the_same_text_share_a_segment(self):
+        data, modified_html = extract(SOURCE_HTML, is_file=False, selectors=SELECTORS)
+
+        self.assertEqual(len([segment for segment in data if segment['content'] == 'Active users grew.']), 1)
+        self.assertEqual(modified_html.count(f'''{SEGMENT_ID_ATTRIBUTE}="{segment_id('Active users grew.')}"'''), 2)
+
+    def test_context_changes_the_segment_ids(self):
+        data, _ = extract(SOURCE_HTML, is_file=False, selectors=SELECTORS)
+        other, _ = extract(SOURCE_HTML, is_file=False, selectors=SELECTORS, context='other report')
+
+        self.assertEqual([segment['content'] for segment in data], [segment['content'] for segment in other])
+        self.assertTrue({segment['id'] for segment in data}.isdisjoint(segment['id'] for segment in other))
+
+    def test_extracts_chart_labels_of_payloads(self):
+        payload = {'data': [{'name': 'Users', 'hovertemplate': 'week=%{x}<br>users=%{y}'}], 'layout': {'title': {'text': 'Active users'}}}
+        source_html = '<div id="plot-1"></div>' + json_script_tag(payload, 'class="chart-payload" data-target="plot-1"')
+
+        data, modified_html = extract(source_html, is_file=False, selectors={'tags': ['p']})
+
+        self.assertEqual([segment['content'] for segment in data], ['Active users', 'Users', 'week', 'users'])
+        self.assertIn(f'''{SEGMENT_IDS_ATTRIBUTE}="{' '.join(segment['id'] for segment in data)}"''', modified_html)
+
+        data, _ = extract(source_html, is_file=False, selectors={'tags': ['p']}, chart_labels=False)
+        self.assertEqual(data, [])
+
+    def test_chunk_boundaries_do_not_change_the_result(self):
+        expected = extract(SOURCE_HTML, is_file=False, selectors=SELECTORS)
+
+        with mock.patch.object(translation_flow, 'EXTRACT_CHUNK_SIZE', 7):
+            self.assertEqual(extract(SOURCE_HTML, is_file=False, selectors=SELECTORS), expected)
+
+    def test_extract_stream_writes_to_a_file_object(self):
+        output = io.StringIO()
+
+        data = extract_stream(io.StringIO(SOURCE_HTML), output, SELECTORS)
+
+        self.assertEqual((data, output.getvalue()), extract(SOURCE_HTML, is_file=False, selectors=SELECTORS))
+
+    def test_requires_selectors(self):
+        with self.assertRaises(ValueError):
+            extract(SOURCE_HTML, is_file=False)
+
+
+class SegmentedTemplateTest(unittest.TestCase):
+    def setUp(self):
+        payload = {'data': [{'name': 'Users', 'hovertemplate': 'week=%{x}<br>users=%{y}', 'y': list(range(10))}]
+                   , 'layout': {'title': {'text': 'Active users'}}}
+        source_html = SOURCE_HTML.replace('<img src="a.png">', (
+            '<div class="note">Outer <p>Nested text</p></div>'
+            '<div id="plot-1" class="plotly-chart"><img class="chart-placeholder" src="data:image/png;base64,AAAA" alt=""></div>'
+            + json_script_tag(payload, 'class="chart-payload" data-target="plot-1"')
+        ))
+        self.data, self.html, self.template = extract(source_html, is_file=False, selectors=SELECTORS, return_template=True)
+        self.ids = {segment['content']: segment['id'] for segment in self.data}
+
+    def assert_same_render(self, translations, images=None):
+        self.assertEqual(self.template.render(translations, images), update_html_with_translations(self.html, translations, images))
+
+    def test_renders_like_update_html_with_translations(self):
+        self.assert_same_render({segment['id']: 'FR ' + segment['content'] for segment in self.data})
+
+    def test_keeps_the_source_of_missing_and_empty_translations(self):
+        translations = {segment['id']: 'FR ' + segment['content'] for segment in self.data[::2]}
+        translations[self.data[1]['id']] = float('nan')
+        translations['seg-unknown'] = 'Unknown'
+
+        self.assert_same_render(translations)
+        self.assert_same_render({})
+
+    def test_escapes_translations(self):
+        self.assert_same_render({self.ids['Weekly & monthly report']: 'Rapport <hebdo> & "mensuel"'})
+        self.assertIn('Rapport &lt;hebdo&gt; &amp; "mensuel"', self.template.render({self.ids['Weekly & monthly report']: 'Rapport <hebdo> & "mensuel"'}))
+
+    def test_nested_segments_are_used_when_the_outer_one_is_not_translated(self):
+        inner = {self.ids['Nested text']: 'Texte imbriqué'}
+        outer = {**inner, self.ids['OuterNested text']: 'Texte extérieur'}
+
+        self.assert_same_render(inner)
+        self.assert_same_render(outer)
+        self.assertIn('Texte imbriqué', self.template.render(inner))
+        self.assertNotIn('Texte imbriqué', self.template.render(outer))
+
+    def test_localizes_chart_labels_and_placeholders(self):
+        translations = {self.ids['Active users']: 'Utilisateurs actifs', self.ids['week']: 'semaine'}
+        images = {'plot-1': 'data:image/png;base64,BBBB'}
+
+        self.assert_same_render(translations, images)
+        rendered = self.template.render(translations, images)
+        self.assertIn('Utilisateurs actifs', rendered)
+        self.assertIn('semaine=%{x}', rendered)
+        self.assertIn('base64,BBBB', rendered)
+
+
+if __name__ == '__main__':
+    unittest.main()
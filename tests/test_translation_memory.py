@@ -0,0 +1,63 @@
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from process.translation_memory import *
+
+SEGMENTS = [{'id': f'seg-{i}', 'content': f'Text {i}'} for i in range(3)]
+
+
+class TranslationMemoryTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.memory = TranslationMemory(os.path.join(self.temp_dir.name, 'memory.sqlite'))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_resolve_returns_segments_missing_a_language(self):
+        self.memory.store({('seg-0', 'French'): 'Texte 0', ('seg-0', 'Swedish'): 'Text 0 sv', ('seg-1', 'French'): 'Texte 1'}, SEGMENTS)
+
+        missing = self.memory.resolve(SEGMENTS, ['French', 'Swedish'])
+
+        self.assertEqual([segment['id'] for segment in missing], ['seg-1', 'seg-2'])
+        self.assertEqual((self.memory.hits, self.memory.misses), (3, 3))
+
+    def test_store_ignores_empty_translations_and_updates_existing_ones(self):
+        stored = self.memory.store({('seg-0', 'French'): 'Texte', ('seg-1', 'French'): '  ', ('seg-2', 'French'): float('nan')})
+        self.memory.store({('seg-0', 'French'): 'Texte 0'})
+
+        self.assertEqual(stored, 1)
+        self.assertEqual(self.memory.lookup(['seg-0', 'seg-1', 'seg-2'], ['French']), {('seg-0', 'French'): 'Texte 0'})
+
+    def test_lookup_batches_large_requests(self):
+        segment_ids = [f'seg-{i}' for i in range(LOOKUP_BATCH_SIZE * 2 + 1)]
+        self.memory.store({(segment_id, 'French'): segment_id.upper() for segment_id in segment_ids})
+
+        self.assertEqual(len(self.memory.lookup(segment_ids, ['French', 'Swedish'])), len(segment_ids))
+
+    def test_export_round_trip(self):
+        export_path = os.path.join(self.temp_dir.name, 'export.csv')
+        pd.DataFrame({'id': ['seg-0', 'seg-1'], 'French': ['Texte 0', None], 'Swedish': ['Text 0 sv', 'Text 1 sv']}).to_csv(export_path, index=False)
+
+        self.assertEqual(self.memory.store_export(export_path, ['French', 'Swedish'], SEGMENTS), 3)
+
+        translations_path = self.memory.write_translations(SEGMENTS, ['French', 'Swedish'], os.path.join(self.temp_dir.name, 'translations.csv'))
+        translations = pd.read_csv(translations_path)
+        self.assertEqual(list(translations.columns), ['id', 'content', 'French', 'Swedish'])
+        self.assertEqual(translations['French'].tolist()[:1], ['Texte 0'])
+        self.assertTrue(translations['French'][1:].isna().all())
+        self.assertEqual(translations['Swedish'].tolist()[:2], ['Text 0 sv', 'Text 1 sv'])
+
+    def test_translations_persist_between_instances(self):
+        self.memory.store({('seg-0', 'French'): 'Texte 0'})
+
+        memory = TranslationMemory(self.memory.db_path)
+
+        self.assertEqual(memory.resolve(SEGMENTS[:1], ['French']), [])
+
+
+if __name__ == '__main__':
+    unittest.main()